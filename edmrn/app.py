@@ -61,6 +61,7 @@ def _load_hicon_app(path):
     except Exception:
         return None
 from edmrn.optimizer import RouteOptimizer
+from edmrn.survey_dataset import load_survey_dataset, read_csv_columns
 from edmrn.tracker import ThreadSafeRouteManager, RouteTracker, STATUS_VISITED, STATUS_SKIPPED, STATUS_UNVISITED
 from edmrn.journal import JournalMonitor
 from edmrn.overlay import get_overlay_manager
@@ -1516,7 +1517,8 @@ class EDMRN_App:
         route_data = self.route_manager.get_route()
         for route in route_data:
             existing_status[route['name']] = route['status']
-        result = self.route_optimizer.optimize_route(csv_path, jump_range, starting_system_name, existing_status)
+        result = self.route_optimizer.optimize_route(csv_path, jump_range, starting_system_name, existing_status,
+                                                     on_backup_error=lambda folder, e: self.root.after(0, lambda: self._log(f"Backup write failed for {Path(folder).name}: {e}")))
         if not result['success']:
             ErrorDialog(self, "Error", result['error'])
             return
@@ -1920,21 +1922,20 @@ class EDMRN_App:
     
     def _load_csv_systems_for_autocomplete(self, csv_path: str):
         try:
-            import pandas as pd
-            df = pd.read_csv(csv_path)
+            dataset = load_survey_dataset(csv_path)
             
-            if 'System Name' not in df.columns:
+            if not dataset.has_names:
                 return
                 
             required_cols = ['System Name', 'X', 'Y', 'Z']
-            if not all(col in df.columns for col in required_cols):
+            if not dataset.has_coordinates:
                 logger.warning("CSV missing coordinate columns for nearest system calculation")
-                systems = df['System Name'].dropna().unique().tolist()
+                systems = dataset.names.tolist()
                 if hasattr(self, 'start_systems_list'):
                     self.start_systems_list = sorted(systems)
                 return
             
-            systems_df = df[required_cols].drop_duplicates('System Name')
+            systems_df = dataset.systems[required_cols]
             systems = systems_df['System Name'].tolist()
             
             if hasattr(self, 'start_systems_list'):
@@ -1958,8 +1959,7 @@ class EDMRN_App:
             WarningDialog(self, "Warning", "Please select a CSV file first.")
             return
         try:
-            df = pd.read_csv(csv_path, nrows=5)
-            self.available_columns = df.columns.tolist()
+            self.available_columns = read_csv_columns(csv_path)
         except Exception as e:
             ErrorDialog(self, "Error", f"Cannot read CSV: {e}")
             return
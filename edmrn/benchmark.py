@@ -0,0 +1,294 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import psutil
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.spatial import Delaunay, QhullError, cKDTree
+from edmrn.distance_store import benchmark_distance_threads
+from edmrn.logger import get_logger
+from edmrn.optimizer import PATH_MODES, RouteOptimizer
+from edmrn.resource_governor import calibrate_cost_model, load_cost_model, save_cost_model
+from edmrn.survey_dataset import load_survey_dataset
+from edmrn.tsp_solvers import tour_length
+logger = get_logger('Benchmark')
+BENCHMARK_VERSION = 1
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_METHODS = ('matrix', 'candidate', 'cluster')
+DEFAULT_DISTRIBUTIONS = ('uniform', 'nebulae', 'disc')
+DEFAULT_TIME_BUDGET = 10.0
+DEFAULT_CSV_GLOB = 'benchmarks/*.csv'
+METHOD_MAX_POINTS = {'matrix': 10000}
+GALAXY_RADIUS = 45000.0
+DISC_SCALE_LENGTH = 12000.0
+DISC_SCALE_HEIGHT = 300.0
+NEBULA_RADIUS = 150.0
+RSS_SAMPLE_INTERVAL = 0.05
+DEFAULT_THREAD_POINTS = 20000
+
+def uniform_points(n: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.uniform(-GALAXY_RADIUS / 10, GALAXY_RADIUS / 10, size=(n, 3))
+
+def nebula_points(n: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.uniform(-GALAXY_RADIUS / 10, GALAXY_RADIUS / 10, size=(max(1, n // 200), 3))
+    members = rng.integers(0, len(centers), size=n)
+    radii = rng.gamma(2.0, NEBULA_RADIUS / 2.0, size=len(centers))
+    return centers[members] + rng.normal(size=(n, 3)) * radii[members, np.newaxis]
+
+def disc_points(n: int, rng: np.random.Generator) -> np.ndarray:
+    radius = rng.gamma(2.0, DISC_SCALE_LENGTH / 2.0, size=n)
+    angle = rng.uniform(0.0, 2.0 * np.pi, size=n)
+    height = rng.laplace(0.0, DISC_SCALE_HEIGHT, size=n)
+    return np.column_stack((radius * np.cos(angle), height, radius * np.sin(angle)))
+
+DISTRIBUTIONS: Dict[str, Callable[[int, np.random.Generator], np.ndarray]] = {
+    'uniform': uniform_points,
+    'nebulae': nebula_points,
+    'disc': disc_points
+}
+
+def synthetic_points(distribution: str, n: int, seed: int = 0) -> np.ndarray:
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution: {distribution}")
+    rng = np.random.default_rng([seed, n, list(DISTRIBUTIONS).index(distribution)])
+    return np.round(DISTRIBUTIONS[distribution](n, rng) * 32.0) / 32.0
+
+def euclidean_mst_weight(coords: np.ndarray) -> Tuple[float, np.ndarray]:
+    n = len(coords)
+    if n < 2:
+        return 0.0, np.zeros(n, dtype=np.int64)
+    if n <= 4:
+        i, j = np.triu_indices(n, 1)
+    else:
+        simplices = Delaunay(coords).simplices
+        corners = simplices.shape[1]
+        pairs = np.concatenate([simplices[:, [a, b]] for a in range(corners) for b in range(a + 1, corners)])
+        pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+        i, j = pairs[:, 0], pairs[:, 1]
+    weights = np.sqrt(np.sum((coords[i] - coords[j]) ** 2, axis=1))
+    keep = weights > 0
+    graph = coo_matrix((weights[keep], (i[keep], j[keep])), shape=(n, n)).tocsr()
+    tree = minimum_spanning_tree(graph).tocoo()
+    degree = np.bincount(np.concatenate((tree.row, tree.col)), minlength=n)
+    return float(tree.data.sum()), degree
+
+def lower_bounds(coords: np.ndarray) -> Dict[str, Optional[float]]:
+    start = time.perf_counter()
+    try:
+        mst, degree = euclidean_mst_weight(coords)
+    except (QhullError, ValueError) as e:
+        logger.warning(f"Could not triangulate {len(coords)} points for the MST bound: {e}")
+        return {'mst': None, 'one_tree': None, 'bound_time': time.perf_counter() - start}
+    one_tree = mst
+    leaves = np.flatnonzero(degree == 1)
+    if len(coords) > 2 and len(leaves):
+        distances, _ = cKDTree(coords).query(coords[leaves], k=3)
+        one_tree = mst + float(distances[:, 2].max())
+    return {'mst': mst, 'one_tree': one_tree, 'bound_time': time.perf_counter() - start}
+
+class PeakRSSMonitor:
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.baseline = self.sample()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = None
+    def sample(self) -> int:
+        total = 0
+        for proc in [self.process, *self.process.children(recursive=True)]:
+            try:
+                total += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+    def __enter__(self) -> 'PeakRSSMonitor':
+        self._thread = threading.Thread(target=self._run, name='rss-monitor', daemon=True)
+        self._thread.start()
+        return self
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.sample())
+
+def run_case(coords: np.ndarray, method: str, path_mode: str, time_budget: float,
+             bounds: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    optimizer = RouteOptimizer()
+    optimizer.tsp_timeout_seconds = time_budget
+    optimizer._reset_performance_stats()
+    closed = path_mode == 'closed'
+    start = time.perf_counter()
+    with PeakRSSMonitor() as rss:
+        tours = optimizer._solve_route(coords, start, path_mode, solver_mode=method)
+    total_time = time.perf_counter() - start
+    tour = tours['distance']
+    length = tour_length(coords, tour, closed)
+    bound = bounds['one_tree'] if closed else bounds['mst']
+    stats = optimizer._get_performance_stats()
+    return {
+        'method': method,
+        'resolved_method': stats.get('solver_mode'),
+        'distance_method': stats.get('distance_method'),
+        'cluster_count': stats.get('cluster_count'),
+        'valid_tour': sorted(tour) == list(range(len(coords))),
+        'distance_matrix_time': stats.get('distance_matrix_time', 0.0),
+        'tsp_time': stats.get('tsp_time', 0.0),
+        'total_time': total_time,
+        'peak_rss': rss.peak,
+        'peak_rss_delta': rss.peak - rss.baseline,
+        'tour_length': length,
+        'lower_bound': bound,
+        'bound_type': 'one_tree' if closed else 'mst',
+        'gap': (length / bound - 1.0) if bound else None
+    }
+
+def benchmark_datasets(distributions: List[str], sizes: List[int], seed: int,
+                       csv_patterns: List[str]) -> List[Tuple[Dict[str, Any], Callable[[], np.ndarray]]]:
+    datasets = []
+    for distribution in distributions:
+        for n in sizes:
+            datasets.append(({'dataset': f"{distribution}-{n}", 'distribution': distribution, 'n': n, 'seed': seed},
+                             lambda distribution=distribution, n=n: synthetic_points(distribution, n, seed)))
+    paths = sorted({path for pattern in csv_patterns for path in glob.glob(pattern, recursive=True)})
+    for path in paths:
+        datasets.append(({'dataset': Path(path).name, 'distribution': 'csv', 'path': path, 'n': None, 'seed': None},
+                         lambda path=path: load_survey_dataset(path).coords()))
+    return datasets
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmark(distributions: List[str] = DEFAULT_DISTRIBUTIONS, sizes: List[int] = DEFAULT_SIZES,
+                  methods: List[str] = DEFAULT_METHODS, path_mode: str = 'open', time_budget: float = DEFAULT_TIME_BUDGET,
+                  seed: int = 0, csv_patterns: List[str] = (DEFAULT_CSV_GLOB,)) -> Dict[str, Any]:
+    results = []
+    warmup = synthetic_points('uniform', 64, seed)
+    for method in methods:
+        run_case(warmup, method, path_mode, min(1.0, time_budget), lower_bounds(warmup))
+    for meta, load in benchmark_datasets(list(distributions), list(sizes), seed, list(csv_patterns)):
+        coords = np.asarray(load(), dtype=np.float64)
+        meta = dict(meta, n=len(coords), path_mode=path_mode)
+        bounds = lower_bounds(coords)
+        logger.info(f"Benchmark {meta['dataset']}: {len(coords)} points, MST bound {bounds['mst']} in {bounds['bound_time']:.2f}s")
+        for method in methods:
+            if len(coords) > METHOD_MAX_POINTS.get(method, len(coords)):
+                results.append(dict(meta, method=method, skipped=f"over {METHOD_MAX_POINTS[method]} points"))
+                continue
+            try:
+                case = run_case(coords, method, path_mode, time_budget, bounds)
+            except Exception as e:
+                logger.error(f"Benchmark {meta['dataset']} / {method} failed: {e}")
+                results.append(dict(meta, method=method, error=str(e)))
+                continue
+            results.append(dict(meta, bound_time=bounds['bound_time'], **case))
+            gap = f"{case['gap'] * 100:.2f}%" if case['gap'] is not None else 'n/a'
+            print(f"{meta['dataset']:>24} {method:>9}: {case['tour_length']:>14.1f} LY  gap {gap:>8}  "
+                  f"matrix {case['distance_matrix_time']:6.2f}s  tsp {case['tsp_time']:6.2f}s  "
+                  f"rss {case['peak_rss'] / 1024 ** 2:8.1f} MB")
+    return {
+        'version': BENCHMARK_VERSION,
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': {'python': platform.python_version(), 'system': platform.platform(),
+                     'cpu_count': os.cpu_count(), 'memory': psutil.virtual_memory().total},
+        'settings': {'distributions': list(distributions), 'sizes': list(sizes), 'methods': list(methods),
+                     'path_mode': path_mode, 'time_budget': time_budget, 'seed': seed},
+        'results': results
+    }
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def keyed(report):
+        return {(r['dataset'], r['method'], r.get('path_mode')): r for r in report['results'] if 'tour_length' in r}
+    old = keyed(baseline)
+    rows = []
+    for key, new in keyed(current).items():
+        if key not in old:
+            continue
+        before = old[key]
+        rows.append({
+            'dataset': key[0],
+            'method': key[1],
+            'length_change': new['tour_length'] / before['tour_length'] - 1.0 if before['tour_length'] else None,
+            'gap_before': before.get('gap'),
+            'gap_after': new.get('gap'),
+            'time_ratio': new['total_time'] / before['total_time'] if before['total_time'] else None,
+            'rss_ratio': new['peak_rss'] / before['peak_rss'] if before['peak_rss'] else None
+        })
+    return rows
+
+def run_distance_threads(n_points: int, max_threads: int = None, seed: int = 0, output: str = None) -> int:
+    results = benchmark_distance_threads(n_points, max_threads, seed)
+    print(f"Distance kernel, {n_points} points")
+    print(f"{'threads':>8} {'seconds':>9} {'speedup':>8}")
+    for row in results:
+        print(f"{row['threads']:>8} {row['seconds']:>9.2f} {row['speedup']:>7.2f}x")
+    if output:
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'points': n_points, 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+        print(f"Thread scaling results written to {path}")
+    return 0
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m edmrn.benchmark',
+                                     description='Benchmark the route optimizer on synthetic galaxies and survey CSVs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--methods', nargs='+', default=list(DEFAULT_METHODS), choices=('auto', 'matrix', 'candidate', 'cluster'))
+    parser.add_argument('--distributions', nargs='+', default=list(DEFAULT_DISTRIBUTIONS), choices=list(DISTRIBUTIONS))
+    parser.add_argument('--csv', nargs='*', default=[DEFAULT_CSV_GLOB], help='exported survey CSVs or globs to include')
+    parser.add_argument('--path-mode', choices=PATH_MODES, default='open')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help='TSP budget per run in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help='JSON results path (default: benchmark_<revision>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results JSON to compare against')
+    parser.add_argument('--calibrate', action='store_true', help='fit the resource governor cost model to these results')
+    parser.add_argument('--cost-model', default=None, help='cost model path to write (default: the app data folder)')
+    parser.add_argument('--distance-threads', action='store_true',
+                        help='time the distance kernel from 1 to --max-threads threads instead of the solvers')
+    parser.add_argument('--points', type=int, default=DEFAULT_THREAD_POINTS, help='points for --distance-threads')
+    parser.add_argument('--max-threads', type=int, default=None, help='most threads for --distance-threads (default: all cores)')
+    args = parser.parse_args(argv)
+    if args.distance_threads:
+        return run_distance_threads(args.points, args.max_threads, args.seed, args.output)
+    report = run_benchmark(args.distributions, args.sizes, args.methods, args.path_mode, args.time_budget,
+                           args.seed, args.csv)
+    output = Path(args.output or f"benchmark_{report['revision'] or time.strftime('%Y%m%d_%H%M%S')}.json")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report['comparison'] = {'baseline': args.compare, 'rows': compare_results(json.load(f), report)}
+        for row in report['comparison']['rows']:
+            change = f"{row['length_change'] * 100:+.2f}%" if row['length_change'] is not None else 'n/a'
+            ratio = f"x{row['time_ratio']:.2f}" if row['time_ratio'] is not None else 'n/a'
+            print(f"{row['dataset']:>24} {row['method']:>9}: length {change:>8}  time {ratio}")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {output}")
+    if args.calibrate:
+        path = save_cost_model(calibrate_cost_model(report, load_cost_model(args.cost_model)), args.cost_model)
+        model = load_cost_model(path)
+        for method, params in model['methods'].items():
+            print(f"{method:>9}: {params['time_coef']:.3g} * n^{params['time_exponent']:.2f}s, "
+                  f"{params['bytes_per_point'] / 1024:.1f} KB/point, gap {params['gap'] * 100:.2f}%")
+        print(f"Cost model written to {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
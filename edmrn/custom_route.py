@@ -9,6 +9,9 @@ import tkinter as tk
 from tkinter import filedialog
 from typing import List, Dict, Optional, Callable
 from edmrn.logger import get_logger
+from edmrn.distance_store import IncrementalDistanceMatrix
+from edmrn.tsp_solvers import cheapest_insertion, matrix_leg
+from edmrn.solver_registry import RouteProblem
 from edmrn.autocomplete_entry import AutocompleteEntry
 from edmrn.minimap import MiniMapFrame
 from edmrn.gui import InfoDialog, WarningDialog, ErrorDialog
@@ -18,6 +21,7 @@ logger = get_logger('CustomRoute')
 STATUS_CURRENT = 'current'
 STATUS_VISITED = 'visited'
 STATUS_PENDING = 'pending'
+CUSTOM_ROUTE_TSP_TIMEOUT = 10
 
 
 class CustomRouteManager:
@@ -29,7 +33,16 @@ class CustomRouteManager:
         self.is_optimized = False
         self.starting_system = None
         self.ending_system = None
+        self.optimization_mode = 'distance'
+        self.boost_multiplier = 6.0
         self._optimize_lock = threading.Lock()
+        self._edit_lock = threading.RLock()
+        self._distances = IncrementalDistanceMatrix()
+        self._route_order = None
+        self._route_nodes = {}
+        self._fixed_ends = (False, False)
+        self._edit_version = 0
+        self._optimizer = None
 
     def detect_current_system(self) -> Optional[str]:
         try:
@@ -61,48 +74,109 @@ class CustomRouteManager:
         coords = self._fetch_coordinates(name)
         if coords is None:
             return False
-        self.systems.append({
-            'name': name,
-            'x': coords[0],
-            'y': coords[1],
-            'z': coords[2],
-            'added_order': len(self.systems)
-        })
-        self.is_optimized = False
-        return True
+        return self.add_system_direct(name, coords[0], coords[1], coords[2])
 
     def add_system_direct(self, name: str, x: float, y: float, z: float) -> bool:
-        for s in self.systems:
-            if s['name'].lower() == name.lower():
-                return False
-        self.systems.append({
-            'name': name,
-            'x': x,
-            'y': y,
-            'z': z,
-            'added_order': len(self.systems)
-        })
-        self.is_optimized = False
-        return True
+        with self._edit_lock:
+            for s in self.systems:
+                if s['name'].lower() == name.lower():
+                    return False
+            system = {
+                'name': name,
+                'x': x,
+                'y': y,
+                'z': z,
+                'added_order': len(self.systems)
+            }
+            self.systems.append(system)
+            self._edit_version += 1
+            key = name.lower()
+            if self._route_order is not None and key in self._route_nodes:
+                self._invalidate_route()
+            self._distances.add(key, (x, y, z))
+            if self._route_order is not None:
+                self._insert_into_route(key, system)
+            else:
+                self.is_optimized = False
+            return True
 
     def remove_system(self, index: int):
-        if 0 <= index < len(self.systems):
-            self.systems.pop(index)
-            self.is_optimized = False
-            if self.current_index >= len(self.systems):
-                self.current_index = max(0, len(self.systems) - 1)
+        with self._edit_lock:
+            if 0 <= index < len(self.systems):
+                system = self.systems.pop(index)
+                self._edit_version += 1
+                key = system['name'].lower()
+                if self._route_order is not None and self._is_route_end(key):
+                    self._invalidate_route()
+                if key in self._distances:
+                    self._remove_from_route(key)
+                if self._route_order is None:
+                    self.is_optimized = False
+                    if self.current_index >= len(self.systems):
+                        self.current_index = max(0, len(self.systems) - 1)
 
     def clear_systems(self):
-        self.systems.clear()
-        self.optimized_route.clear()
-        self.current_index = 0
-        self.is_optimized = False
+        with self._edit_lock:
+            self.systems.clear()
+            self.optimized_route.clear()
+            self.current_index = 0
+            self.is_optimized = False
+            self._edit_version += 1
+            self._distances.clear()
+            self._invalidate_route()
 
     def move_system(self, from_idx: int, to_idx: int):
-        if 0 <= from_idx < len(self.systems) and 0 <= to_idx < len(self.systems):
-            system = self.systems.pop(from_idx)
-            self.systems.insert(to_idx, system)
-            self.is_optimized = False
+        with self._edit_lock:
+            if 0 <= from_idx < len(self.systems) and 0 <= to_idx < len(self.systems):
+                system = self.systems.pop(from_idx)
+                self.systems.insert(to_idx, system)
+                self._edit_version += 1
+                self._invalidate_route()
+
+    def _invalidate_route(self):
+        self._route_order = None
+        self._route_nodes = {}
+        self.is_optimized = False
+
+    def _is_route_end(self, key: str) -> bool:
+        fixed_start, fixed_end = self._fixed_ends
+        return ((fixed_start and self._distances.key(int(self._route_order[0])) == key) or
+                (fixed_end and self._distances.key(int(self._route_order[-1])) == key))
+
+    def _insert_into_route(self, key: str, system: Dict):
+        slot = self._distances.slot(key)
+        fixed_start, fixed_end = self._fixed_ends
+        order, added = cheapest_insertion(matrix_leg(self._distances.matrix), self._route_order, slot, closed=False,
+                                          fixed_start=fixed_start, fixed_end=fixed_end)
+        position = int(np.flatnonzero(order == slot)[0])
+        self._route_order = order
+        self._route_nodes[key] = system
+        if position <= self.current_index and self.current_index > 0:
+            self.current_index += 1
+        self._build_route(self.optimization_mode, self.boost_multiplier)
+        logger.info(f"Inserted {system['name']} into the custom route at position {position} (+{added:.2f} LY)")
+
+    def _remove_from_route(self, key: str):
+        slot, moved = self._distances.remove(key)
+        if self._route_order is None:
+            return
+        order = self._route_order
+        position = int(np.flatnonzero(order == slot)[0])
+        order = np.delete(order, position)
+        order[order == moved] = slot
+        self._route_order = order
+        self._route_nodes.pop(key, None)
+        if position < self.current_index:
+            self.current_index -= 1
+        self.current_index = min(self.current_index, max(0, len(order) - 1))
+        self._build_route(self.optimization_mode, self.boost_multiplier)
+        logger.info(f"Removed {key} from the custom route; {len(order)} systems remain")
+
+    def _get_optimizer(self):
+        if self._optimizer is None:
+            from edmrn.optimizer import RouteOptimizer
+            self._optimizer = RouteOptimizer()
+        return self._optimizer
 
     def optimize_route(self, mode: str = 'distance', boost_multiplier: float = 6.0) -> bool:
         if len(self.systems) < 1:
@@ -115,7 +189,9 @@ class CustomRouteManager:
             logger.info(f"Starting optimization: {len(self.systems)} systems, mode={mode}")
             start_data = None
             end_data = None
-            middle_systems = list(self.systems)
+            with self._edit_lock:
+                version = self._edit_version
+                middle_systems = list(self.systems)
 
             if self.starting_system:
                 for s in self.systems:
@@ -147,73 +223,49 @@ class CustomRouteManager:
                             'added_order': 999999
                         }
 
-            if middle_systems:
-                logger.info(f"TSP optimization: {len(middle_systems)} middle systems")
-                coords_arr = np.array([[s['x'], s['y'], s['z']] for s in middle_systems])
-                from edmrn.optimizer import RouteOptimizer
-                optimizer = RouteOptimizer()
-                distance_matrix = optimizer.calculate_distance_matrix(coords_arr)
-                permutation, _ = solve_tsp(distance_matrix)
-                ordered_middle = [middle_systems[idx] for idx in permutation]
-                logger.info("TSP optimization completed")
-            else:
-                ordered_middle = []
-
             all_systems = []
             if start_data:
                 all_systems.append(start_data)
-            all_systems.extend(ordered_middle)
+            all_systems.extend(middle_systems)
             if end_data:
                 all_systems.append(end_data)
 
-            logger.info(f"Final route: {len(all_systems)} systems")
-            if len(all_systems) < 2:
-                self.optimized_route = all_systems.copy()
-                if self.optimized_route:
-                    self.optimized_route[0]['distance_from_prev'] = 0
+            with self._edit_lock:
+                keys = [s['name'].lower() for s in all_systems]
+                stale = set(self._distances.keys) - set(keys)
+                if stale:
+                    self._invalidate_route()
+                for key in stale:
+                    self._distances.remove(key)
+                for key, s in zip(keys, all_systems):
+                    coords = (s['x'], s['y'], s['z'])
+                    if key not in self._distances or not np.array_equal(self._distances.coords[self._distances.slot(key)], coords):
+                        self._distances.add(key, coords)
+                distance_matrix = self._distances.submatrix(keys)
+
+            order = list(range(len(all_systems)))
+            if middle_systems:
+                logger.info(f"Open-path optimization: {len(middle_systems)} middle systems")
+                coords_arr = np.array([[s['x'], s['y'], s['z']] for s in all_systems])
+                problem = RouteProblem(
+                    coords_arr,
+                    start_index=0 if start_data else None,
+                    end_index=len(all_systems) - 1 if end_data else None,
+                    distance_matrix=distance_matrix
+                )
+                result = self._get_optimizer().solve(problem, CUSTOM_ROUTE_TSP_TIMEOUT)
+                order = result.tours['distance']
+                logger.info(f"Open-path optimization completed with the {result.solver} solver in {result.elapsed:.2f}s")
+
+            with self._edit_lock:
+                if version != self._edit_version:
+                    logger.warning("Custom route changed during optimization; optimize again to include the edits")
+                    return False
+                self._route_nodes = {keys[idx]: all_systems[idx] for idx in order}
+                self._route_order = np.array([self._distances.slot(keys[idx]) for idx in order], dtype=np.int64)
+                self._fixed_ends = (start_data is not None, end_data is not None)
                 self.current_index = 0
-                self.is_optimized = True
-                self.optimization_mode = mode
-                return True
-
-            self.optimized_route = []
-            logger.info("Calculating distances...")
-            for i in range(len(all_systems)):
-                system = all_systems[i].copy()
-                if i == 0:
-                    system['distance_from_prev'] = 0
-                    system['normal_jumps'] = 0
-                    system['neutron_jumps'] = 0
-                    system['uses_neutron'] = False
-                    self.optimized_route.append(system)
-                else:
-                    prev = all_systems[i - 1]
-                    dx = all_systems[i]['x'] - prev['x']
-                    dy = all_systems[i]['y'] - prev['y']
-                    dz = all_systems[i]['z'] - prev['z']
-                    dist = math.sqrt(dx**2 + dy**2 + dz**2)
-                    system['distance_from_prev'] = round(dist, 2)
-
-                    if mode == 'neutron':
-                        jump_range = self.app.jump_range.get() if hasattr(self.app, 'jump_range') else '70'
-                        try:
-                            jr = float(jump_range)
-                        except:
-                            jr = 70.0
-
-                        normal_jumps = max(1, math.ceil(dist / jr))
-                        neutron_jumps = max(1, math.ceil(dist / (jr * boost_multiplier)))
-                        system['normal_jumps'] = normal_jumps
-                        system['neutron_jumps'] = neutron_jumps
-                        system['uses_neutron'] = normal_jumps > neutron_jumps
-                        system['segment_waypoints'] = [prev['name'], all_systems[i]['name']]
-
-                    self.optimized_route.append(system)
-            logger.info(f"Route calculation completed: {len(self.optimized_route)} systems in optimized_route")
-
-            self.current_index = 0
-            self.is_optimized = True
-            self.optimization_mode = mode
+                self._build_route(mode, boost_multiplier)
             logger.info(f"optimize_route returning True: systems={len(self.systems)}, optimized_route={len(self.optimized_route)}")
             return True
         except Exception as e:
@@ -222,6 +274,45 @@ class CustomRouteManager:
         finally:
             self._optimize_lock.release()
 
+    def _build_route(self, mode: str, boost_multiplier: float):
+        all_systems = [self._route_nodes[self._distances.key(int(slot))] for slot in self._route_order]
+        logger.info(f"Final route: {len(all_systems)} systems")
+        legs = self._distances.matrix[self._route_order[:-1], self._route_order[1:]].tolist()
+        jr = 70.0
+        if mode == 'neutron':
+            jump_range = self.app.jump_range.get() if hasattr(self.app, 'jump_range') else '70'
+            try:
+                jr = float(jump_range)
+            except:
+                jr = 70.0
+        self.optimized_route = []
+        for i in range(len(all_systems)):
+            system = all_systems[i].copy()
+            if i == 0:
+                system['distance_from_prev'] = 0
+                if len(all_systems) > 1:
+                    system['normal_jumps'] = 0
+                    system['neutron_jumps'] = 0
+                    system['uses_neutron'] = False
+            else:
+                prev = all_systems[i - 1]
+                dist = legs[i - 1]
+                system['distance_from_prev'] = round(dist, 2)
+
+                if mode == 'neutron':
+                    normal_jumps = max(1, math.ceil(dist / jr))
+                    neutron_jumps = max(1, math.ceil(dist / (jr * boost_multiplier)))
+                    system['normal_jumps'] = normal_jumps
+                    system['neutron_jumps'] = neutron_jumps
+                    system['uses_neutron'] = normal_jumps > neutron_jumps
+                    system['segment_waypoints'] = [prev['name'], all_systems[i]['name']]
+
+            self.optimized_route.append(system)
+        logger.info(f"Route calculation completed: {len(self.optimized_route)} systems in optimized_route")
+        self.is_optimized = True
+        self.optimization_mode = mode
+        self.boost_multiplier = boost_multiplier
+
     def get_route(self) -> List[Dict]:
         if self.is_optimized and self.optimized_route:
             logger.debug(f"get_route: returning optimized_route ({len(self.optimized_route)} systems)")
@@ -369,29 +460,6 @@ class CustomRouteManager:
         return None
 
 
-def solve_tsp(distance_matrix):
-    n = len(distance_matrix)
-    permutation = [0]
-    total = 0
-    current = 0
-    visited = {0}
-    for _ in range(n - 1):
-        nearest = None
-        nearest_dist = float('inf')
-        for j in range(n):
-            if j not in visited and distance_matrix[current][j] < nearest_dist:
-                nearest = j
-                nearest_dist = distance_matrix[current][j]
-        if nearest is not None:
-            permutation.append(nearest)
-            total += nearest_dist
-            visited.add(nearest)
-            current = nearest
-        else:
-            break
-    return permutation, total
-
-
 class CustomRouteTab:
     def __init__(self, app):
         self.app = app
@@ -0,0 +1,340 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+import numpy as np
+import psutil
+from scipy.spatial.distance import squareform
+from edmrn.logger import get_logger
+logger = get_logger('DistanceStore')
+DISTANCE_DTYPE = np.float32
+BACKINGS = ('auto', 'shared_memory', 'memmap')
+SHARED_MEMORY_RAM_FRACTION = 0.5
+FILL_BLOCK_ELEMENTS = 1 << 22
+DISTANCE_BLOCK_SIZE = 1024
+INCREMENTAL_INITIAL_CAPACITY = 64
+
+def condensed_size(n: int) -> int:
+    return n * (n - 1) // 2
+
+def condensed_index(n: int, i, j):
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    lo = np.minimum(i, j)
+    hi = np.maximum(i, j)
+    return n * lo - lo * (lo + 1) // 2 + hi - lo - 1
+
+def default_thread_count() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+def distance_operands(coords: np.ndarray):
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords):
+        coords = coords - coords.mean(axis=0)
+    sq = np.einsum('ij,ij->i', coords, coords)[:, np.newaxis]
+    ones = np.ones_like(sq)
+    return np.hstack((coords, sq, ones)), np.hstack((-2.0 * coords, ones, sq))
+
+def pairwise_block(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    block = left @ right.T
+    np.maximum(block, 0.0, out=block)
+    return np.sqrt(block, out=block)
+
+def run_distance_blocks(tasks: Sequence, work: Callable[[Any], None], threads: int = None,
+                        progress_callback: Callable[[str, float], None] = None,
+                        cancel_event: threading.Event = None):
+    threads = max(1, threads or default_thread_count())
+    total = max(1, len(tasks))
+    def guarded(task):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        work(task)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='distance') as pool:
+        pending = {pool.submit(guarded, task) for task in tasks}
+        done_count = 0
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+            done_count += len(done)
+            if cancel_event is not None and cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+                logger.info("Distance matrix calculation cancelled by user")
+                raise RuntimeError("Optimization cancelled by user during distance matrix calculation")
+            if progress_callback and done:
+                try:
+                    progress_callback('distance_matrix', done_count / total)
+                except Exception:
+                    pass
+
+def benchmark_distance_threads(n_points: int = 20000, max_threads: int = None, seed: int = 0) -> List[Dict[str, float]]:
+    coords = np.random.default_rng(seed).uniform(-40000, 40000, size=(n_points, 3))
+    max_threads = max_threads or default_thread_count()
+    results = []
+    for threads in sorted({1, *range(2, max_threads + 1, 2), max_threads}):
+        store = CondensedDistanceMatrix.create(n_points, 'shared_memory')
+        try:
+            start = time.perf_counter()
+            store.fill_from_coords(coords, threads=threads)
+            elapsed = time.perf_counter() - start
+        finally:
+            store.release()
+        results.append({'threads': threads, 'seconds': elapsed, 'speedup': results[0]['seconds'] / elapsed if results else 1.0})
+        logger.info(f"Distance kernel, {n_points} points, {threads} threads: {elapsed:.2f}s (x{results[-1]['speedup']:.2f})")
+    return results
+
+def choose_backing(nbytes: int) -> str:
+    try:
+        available = psutil.virtual_memory().available
+    except Exception:
+        return 'shared_memory'
+    if nbytes <= available * SHARED_MEMORY_RAM_FRACTION:
+        return 'shared_memory'
+    logger.info(f"Distance storage needs {nbytes / 1024 ** 3:.2f} GB with {available / 1024 ** 3:.2f} GB free; using a memory-mapped file")
+    return 'memmap'
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+class CondensedDistanceMatrix:
+    def __init__(self, n: int, data: np.ndarray, backing: str, shm: shared_memory.SharedMemory = None,
+                 path: str = None, owner: bool = False):
+        self.n = n
+        self.data = data
+        self.backing = backing
+        self.path = path
+        self._shm = shm
+        self._owner = owner
+    @classmethod
+    def create(cls, n: int, backing: str = 'auto', directory: str = None) -> 'CondensedDistanceMatrix':
+        if backing not in BACKINGS:
+            raise ValueError(f"Unknown distance storage backing: {backing}")
+        size = condensed_size(n)
+        nbytes = max(1, size * np.dtype(DISTANCE_DTYPE).itemsize)
+        if backing == 'auto':
+            backing = choose_backing(nbytes)
+        if backing == 'memmap':
+            path = os.path.join(directory or tempfile.gettempdir(), f"edmrn_distances_{uuid.uuid4().hex}.bin")
+            data = np.memmap(path, dtype=DISTANCE_DTYPE, mode='w+', shape=(max(1, size),))[:size]
+            return cls(n, data, backing, path=path, owner=True)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        data = np.ndarray((size,), dtype=DISTANCE_DTYPE, buffer=shm.buf)
+        return cls(n, data, backing, shm=shm, owner=True)
+    @classmethod
+    def from_coords(cls, coords: np.ndarray, backing: str = 'auto', directory: str = None,
+                    progress_callback: Callable[[str, float], None] = None,
+                    cancel_event: threading.Event = None) -> 'CondensedDistanceMatrix':
+        coords = np.asarray(coords, dtype=np.float64)
+        store = cls.create(coords.shape[0], backing, directory)
+        try:
+            store.fill_from_coords(coords, progress_callback, cancel_event)
+        except Exception:
+            store.release()
+            raise
+        return store
+    @classmethod
+    def attach(cls, descriptor: Dict[str, Any]) -> 'CondensedDistanceMatrix':
+        n = descriptor['n']
+        size = condensed_size(n)
+        if descriptor['backing'] == 'memmap':
+            data = np.memmap(descriptor['path'], dtype=DISTANCE_DTYPE, mode='r', shape=(max(1, size),))[:size]
+            return cls(n, data, 'memmap', path=descriptor['path'])
+        shm = attach_shared_memory(descriptor['name'])
+        data = np.ndarray((size,), dtype=DISTANCE_DTYPE, buffer=shm.buf)
+        return cls(n, data, 'shared_memory', shm=shm)
+    def descriptor(self) -> Dict[str, Any]:
+        if self.backing == 'memmap':
+            return {'n': self.n, 'backing': 'memmap', 'path': self.path}
+        return {'n': self.n, 'backing': 'shared_memory', 'name': self._shm.name}
+    @property
+    def shape(self):
+        return (self.n, self.n)
+    @property
+    def dtype(self):
+        return np.dtype(DISTANCE_DTYPE)
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+    def __len__(self) -> int:
+        return self.n
+    def fill_from_coords(self, coords: np.ndarray, progress_callback: Callable[[str, float], None] = None,
+                         cancel_event: threading.Event = None, block_elements: int = FILL_BLOCK_ELEMENTS,
+                         threads: int = None):
+        n = self.n
+        left, right = distance_operands(coords)
+        bands = []
+        lo = 0
+        while lo < n - 1:
+            hi = min(n - 1, lo + max(1, block_elements // (n - lo)))
+            bands.append((lo, hi))
+            lo = hi
+        def fill_band(band):
+            lo, hi = band
+            block = pairwise_block(left[lo:hi], right[lo:])
+            for i in range(lo, hi):
+                offset = n * i - i * (i + 1) // 2
+                self.data[offset:offset + n - i - 1] = block[i - lo, i - lo + 1:]
+        run_distance_blocks(bands, fill_band, threads, progress_callback, cancel_event)
+    def item(self, i: int, j: int) -> float:
+        if i == j:
+            return 0.0
+        if i > j:
+            i, j = j, i
+        return float(self.data[self.n * i - i * (i + 1) // 2 + j - i - 1])
+    def row(self, i: int) -> np.ndarray:
+        n = self.n
+        out = np.empty(n, dtype=DISTANCE_DTYPE)
+        if i > 0:
+            before = np.arange(i, dtype=np.int64)
+            out[:i] = self.data[n * before - before * (before + 1) // 2 + i - before - 1]
+        out[i] = 0.0
+        offset = n * i - i * (i + 1) // 2
+        out[i + 1:] = self.data[offset:offset + n - i - 1]
+        return out
+    def rows(self, lo: int, hi: int) -> np.ndarray:
+        n = self.n
+        block = np.zeros((hi - lo, n), dtype=DISTANCE_DTYPE)
+        if hi <= lo:
+            return block
+        for i in range(lo, hi):
+            offset = n * i - i * (i + 1) // 2
+            block[i - lo, i + 1:] = self.data[offset:offset + n - i - 1]
+        square = block[:, lo:hi]
+        square += square.T.copy()
+        if lo > 0:
+            columns = np.empty((lo, hi - lo), dtype=DISTANCE_DTYPE)
+            for j in range(lo):
+                start = n * j - j * (j + 1) // 2 + lo - j - 1
+                columns[j] = self.data[start:start + hi - lo]
+            block[:, :lo] = columns.T
+        return block
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            if np.isscalar(i) and np.isscalar(j):
+                return self.item(int(i), int(j))
+            i = np.asarray(i, dtype=np.int64)
+            j = np.asarray(j, dtype=np.int64)
+            same = i == j
+            index = np.where(same, 0, condensed_index(self.n, i, j))
+            return np.where(same, DISTANCE_DTYPE(0), self.data[index])
+        if isinstance(key, slice):
+            lo, hi, step = key.indices(self.n)
+            if step != 1:
+                raise IndexError("Condensed distance rows only support contiguous slices")
+            return self.rows(lo, hi)
+        return self.row(int(key))
+    def __array__(self, dtype=None, copy=None):
+        dense = squareform(np.asarray(self.data), checks=False)
+        return dense if dtype is None else dense.astype(dtype)
+    def map(self, fn: Callable[[np.ndarray], np.ndarray], chunk: int = 1 << 22) -> 'CondensedDistanceMatrix':
+        result = CondensedDistanceMatrix.create(self.n, self.backing, os.path.dirname(self.path) if self.path else None)
+        for lo in range(0, len(self.data), chunk):
+            result.data[lo:lo + chunk] = fn(np.asarray(self.data[lo:lo + chunk]))
+        return result
+    def close(self):
+        self.data = None
+        if self._shm is not None:
+            self._shm.close()
+    def release(self):
+        shm = self._shm
+        path = self.path
+        self.close()
+        if not self._owner:
+            return
+        self._owner = False
+        if shm is not None:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        if path:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove distance file {path}: {e}")
+
+class IncrementalDistanceMatrix:
+    def __init__(self, capacity: int = INCREMENTAL_INITIAL_CAPACITY):
+        capacity = max(1, capacity)
+        self._coords = np.empty((capacity, 3), dtype=np.float64)
+        self._matrix = np.zeros((capacity, capacity), dtype=np.float64)
+        self._keys: List[Hashable] = []
+        self._slots: Dict[Hashable, int] = {}
+    def __len__(self) -> int:
+        return len(self._keys)
+    def __contains__(self, key) -> bool:
+        return key in self._slots
+    @property
+    def keys(self) -> List[Hashable]:
+        return list(self._keys)
+    @property
+    def capacity(self) -> int:
+        return len(self._matrix)
+    @property
+    def matrix(self) -> np.ndarray:
+        n = len(self._keys)
+        return self._matrix[:n, :n]
+    @property
+    def coords(self) -> np.ndarray:
+        return self._coords[:len(self._keys)]
+    def slot(self, key) -> int:
+        return self._slots[key]
+    def key(self, slot: int) -> Hashable:
+        return self._keys[slot]
+    def _reserve(self, size: int):
+        if size <= self.capacity:
+            return
+        capacity = max(size, self.capacity * 2)
+        n = len(self._keys)
+        coords = np.empty((capacity, 3), dtype=np.float64)
+        coords[:n] = self._coords[:n]
+        matrix = np.zeros((capacity, capacity), dtype=np.float64)
+        matrix[:n, :n] = self._matrix[:n, :n]
+        self._coords = coords
+        self._matrix = matrix
+    def add(self, key, coords) -> int:
+        point = np.asarray(coords, dtype=np.float64).reshape(3)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            self._reserve(slot + 1)
+            self._keys.append(key)
+            self._slots[key] = slot
+        n = len(self._keys)
+        self._coords[slot] = point
+        row = np.sqrt(np.sum((self._coords[:n] - point) ** 2, axis=1))
+        row[slot] = 0.0
+        self._matrix[slot, :n] = row
+        self._matrix[:n, slot] = row
+        return slot
+    def remove(self, key) -> Tuple[int, int]:
+        slot = self._slots.pop(key)
+        last = len(self._keys) - 1
+        if slot != last:
+            moved = self._keys[last]
+            self._keys[slot] = moved
+            self._slots[moved] = slot
+            self._coords[slot] = self._coords[last]
+            self._matrix[slot, :last + 1] = self._matrix[last, :last + 1]
+            self._matrix[:last + 1, slot] = self._matrix[:last + 1, last]
+            self._matrix[slot, slot] = 0.0
+        self._keys.pop()
+        return slot, last
+    def submatrix(self, keys: Sequence[Hashable]) -> np.ndarray:
+        slots = np.fromiter((self._slots[key] for key in keys), dtype=np.int64, count=len(keys))
+        return self._matrix[np.ix_(slots, slots)]
+    def clear(self):
+        self._keys.clear()
+        self._slots.clear()
@@ -11,6 +11,7 @@ from datetime import datetime
 from edmrn.config import Paths
 from edmrn.tracker import STATUS_VISITED, STATUS_UNVISITED
 from edmrn.logger import get_logger
+from edmrn.persistence import get_persistence_worker
 from edmrn.gui import SuccessDialog, ErrorDialog, InfoDialog, WarningDialog
 logger = get_logger('FileOperations')
 class FileOperations:
@@ -21,7 +22,7 @@ class FileOperations:
             widget.destroy()
         filename = filedialog.askopenfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv *.csv.gz *.zip"), ("All files", "*.*")]
         )
         if filename:
             self.app.csv_file_path.set(filename)
@@ -175,6 +176,7 @@ class FileOperations:
                 folder = Path(backup_folder_path)
                 if not folder.is_dir():
                     raise ValueError("Selected path is not a folder")
+                get_persistence_worker().flush(folder)
                 
                 self.app._log(f"Reading backup from: {folder.name}")
                 
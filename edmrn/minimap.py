@@ -9,6 +9,7 @@ COLOR_SKIPPED = "#FF5D5D"
 COLOR_PENDING = '#E0E0E0'
 COLOR_ROUTE_LINE = '#FF8C00'
 COLOR_HIGHLIGHT = '#FFD700'
+PREVIEW_MAX_POINTS = 20000
 class MiniMapFrame(ctk.CTkFrame):
     def __init__(self, master, width=480, height=360, on_system_selected=None, **kwargs):
         super().__init__(master, **kwargs)
@@ -211,6 +212,30 @@ class MiniMapFrame(ctk.CTkFrame):
             if self.canvas:
                 self.canvas.draw_idle()
             return False
+    def plot_preview(self, coords, max_points=PREVIEW_MAX_POINTS):
+        if not self.matplotlib_available:
+            return False
+        try:
+            self.clear()
+            coords = np.asarray(coords)
+            if len(coords) < 2:
+                return False
+            step = max(1, int(np.ceil(len(coords) / max_points)))
+            sampled = coords[::step]
+            self._lines = self.ax.plot(
+                sampled[:, 0], sampled[:, 1], sampled[:, 2],
+                c=COLOR_ROUTE_LINE,
+                linewidth=0.8,
+                zorder=1,
+                alpha=0.6
+            )[0]
+            self._adjust_view(sampled[:, 0], sampled[:, 1], sampled[:, 2])
+            if self.canvas:
+                self.canvas.draw_idle()
+            return True
+        except Exception as e:
+            logger.error(f"Preview plot error: {e}")
+            return False
     def _update_scatter_colors(self, route_list):
         if not self.matplotlib_available or not self._scatter:
             return False
@@ -463,6 +488,8 @@ class MiniMapFrameFallback(ctk.CTkFrame):
         ).pack(padx=20, pady=40)
     def plot_route(self, *args, **kwargs):
         pass
+    def plot_preview(self, *args, **kwargs):
+        pass
     def update_system_status(self, *args, **kwargs):
         pass
     def highlight_system(self, *args, **kwargs):
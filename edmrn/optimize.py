@@ -0,0 +1,249 @@
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from edmrn.distance_store import default_thread_count
+from edmrn.logger import get_logger
+from edmrn.optimizer import OBJECTIVES, PATH_MODES, SOLVER_MODES, RouteOptimizer
+from edmrn.persistence import get_persistence_worker
+from edmrn.resource_governor import MAX_TIME_BUDGET
+from edmrn.survey_dataset import BodyList
+logger = get_logger('OptimizeCLI')
+DEFAULT_JUMP_RANGE = 70.0
+JOB_DEADLINE_FACTOR = 4.0
+OUTPUT_FORMATS = ('csv', 'json')
+REPORT_FILE_NAME = 'report.json'
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zip', '.csv.bz2', '.csv.xz', '.zip', '.gz')
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                path_matches = sorted(str(p) for p in Path(path).iterdir() if p.name.lower().endswith(CSV_SUFFIXES))
+            else:
+                path_matches = [path]
+            for match in path_matches:
+                key = os.path.abspath(match)
+                if key not in seen:
+                    seen.add(key)
+                    paths.append(match)
+    return paths
+
+def output_stem(path: str, used: set) -> str:
+    name = Path(path).name
+    for suffix in sorted(CSV_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    stem = name or 'route'
+    counter = 2
+    while stem in used:
+        stem = f"{name}_{counter}"
+        counter += 1
+    used.add(stem)
+    return stem
+
+def to_jsonable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (np.ndarray, BodyList)):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def _configure_logging(verbose: bool):
+    if not verbose:
+        return
+    root = logging.getLogger()
+    if not any(getattr(handler, '_edmrn_cli', False) for handler in root.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'))
+        handler._edmrn_cli = True
+        root.addHandler(handler)
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    _configure_logging(job.get('verbose', False))
+    start = time.time()
+    report = {'input': job['input'], 'stem': job['stem'], 'success': False, 'outputs': {}}
+    optimizer = RouteOptimizer()
+    optimizer.tsp_timeout_seconds = job['time_budget']
+    optimizer.distance_threads = job.get('threads')
+    optimizer.use_route_cache = job.get('use_cache', True)
+    cancel_event = threading.Event()
+    deadline = threading.Timer((job['time_budget'] or MAX_TIME_BUDGET) * JOB_DEADLINE_FACTOR, cancel_event.set)
+    deadline.daemon = True
+    deadline.start()
+    try:
+        result = optimizer.optimize_route(job['input'], job['jump_range'], job.get('start') or '',
+                                          cancel_event=cancel_event, solver_mode=job.get('solver_mode'),
+                                          restarts=job.get('restarts'), objective=job.get('objective'),
+                                          path_mode=job.get('path_mode'))
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    finally:
+        deadline.cancel()
+    report['wall_time'] = time.time() - start
+    report['timed_out'] = cancel_event.is_set()
+    if not result.get('success'):
+        report['error'] = result.get('error', 'Optimization failed')
+        return report
+    output_dir = Path(job['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if 'csv' in job['formats']:
+        csv_path = output_dir / f"{job['stem']}.route.csv"
+        result['optimized_df'].to_csv(csv_path, index=False)
+        report['outputs']['csv'] = str(csv_path)
+    summary = {
+        'num_systems': result['num_systems'],
+        'total_distance': result['total_distance'],
+        'total_jumps': result['total_jumps'],
+        'starting_system': result['starting_system'],
+        'jump_range': job['jump_range']
+    }
+    if 'json' in job['formats']:
+        json_path = output_dir / f"{job['stem']}.route.json"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(to_jsonable(dict(summary, route=result['route_data'])), f, indent=2, ensure_ascii=False)
+        report['outputs']['json'] = str(json_path)
+    report.update(summary)
+    report['success'] = True
+    report['backup_folder'] = result.get('backup_folder')
+    report['backup_written'] = get_persistence_worker().flush(result['backup_folder'])
+    report['performance'] = to_jsonable(result.get('performance_stats', optimizer._get_performance_stats()))
+    return report
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m edmrn.optimize',
+                                     description='Optimize survey routes for one or more CSV files without the GUI.')
+    parser.add_argument('inputs', nargs='+', help='CSV files, directories or glob patterns (quote globs to expand them here)')
+    parser.add_argument('-j', '--jump-range', type=float, default=DEFAULT_JUMP_RANGE, help='ship jump range in LY')
+    parser.add_argument('-s', '--start', default='', help='starting system name')
+    parser.add_argument('-o', '--output-dir', default='routes', help='folder for route files and the report')
+    parser.add_argument('-p', '--jobs', type=int, default=1, help='number of files optimized in parallel')
+    parser.add_argument('-t', '--time-budget', type=float, default=None,
+                        help='TSP time budget per job in seconds (default: planned from the route size); a job is '
+                             f'cancelled after {JOB_DEADLINE_FACTOR:g}x this budget')
+    parser.add_argument('--objective', choices=OBJECTIVES, default=None)
+    parser.add_argument('--path-mode', choices=PATH_MODES, default=None)
+    parser.add_argument('--solver-mode', choices=SOLVER_MODES, default=None)
+    parser.add_argument('--restarts', type=int, default=None)
+    parser.add_argument('--format', dest='formats', default='csv,json',
+                        help='comma-separated route outputs: csv, json')
+    parser.add_argument('--report', default=None, help=f'timing report path (default: <output-dir>/{REPORT_FILE_NAME})')
+    parser.add_argument('--no-cache', action='store_true', help='ignore and do not update the route cache')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log progress to stderr')
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    formats = [fmt.strip().lower() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        parser.error(f"unknown output format: {', '.join(unknown)}")
+    if args.jump_range <= 0:
+        parser.error('jump range must be positive')
+    if args.time_budget is not None and args.time_budget <= 0:
+        parser.error('time budget must be positive')
+    _configure_logging(args.verbose)
+    inputs = expand_inputs(args.inputs)
+    missing = [path for path in inputs if not os.path.isfile(path)]
+    inputs = [path for path in inputs if os.path.isfile(path)]
+    for path in missing:
+        print(f"Skipping missing input: {path}", file=sys.stderr)
+    if not inputs:
+        print("No input files found", file=sys.stderr)
+        return 2
+    jobs_count = max(1, min(args.jobs, len(inputs)))
+    threads = max(1, default_thread_count() // jobs_count)
+    used = set()
+    jobs = [{
+        'input': path,
+        'stem': output_stem(path, used),
+        'output_dir': args.output_dir,
+        'jump_range': args.jump_range,
+        'start': args.start,
+        'time_budget': args.time_budget,
+        'objective': args.objective,
+        'path_mode': args.path_mode,
+        'solver_mode': args.solver_mode,
+        'restarts': args.restarts,
+        'formats': formats,
+        'threads': threads,
+        'use_cache': not args.no_cache,
+        'verbose': args.verbose
+    } for path in inputs]
+    start = time.time()
+    reports = []
+    if jobs_count == 1:
+        for job in jobs:
+            reports.append(run_job(job))
+            _print_job(reports[-1])
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=jobs_count, mp_context=context) as pool:
+            futures = {pool.submit(run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    report = future.result()
+                except Exception as e:
+                    report = {'input': job['input'], 'stem': job['stem'], 'success': False, 'error': str(e), 'outputs': {}}
+                reports.append(report)
+                _print_job(report)
+    order = {job['input']: i for i, job in enumerate(jobs)}
+    reports.sort(key=lambda report: order[report['input']])
+    report_path = Path(args.report) if args.report else Path(args.output_dir) / REPORT_FILE_NAME
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    succeeded = sum(1 for report in reports if report['success'])
+    summary = {
+        'jobs': len(reports),
+        'succeeded': succeeded,
+        'failed': len(reports) - succeeded,
+        'parallel_jobs': jobs_count,
+        'threads_per_job': threads,
+        'wall_time': time.time() - start,
+        'settings': {
+            'jump_range': args.jump_range,
+            'start': args.start,
+            'time_budget': args.time_budget,
+            'objective': args.objective,
+            'path_mode': args.path_mode,
+            'solver_mode': args.solver_mode,
+            'restarts': args.restarts
+        },
+        'missing_inputs': missing,
+        'results': reports
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(to_jsonable(summary), f, indent=2, ensure_ascii=False)
+    print(f"{succeeded}/{len(reports)} routes optimized in {summary['wall_time']:.2f}s; report: {report_path}")
+    return 0 if succeeded == len(reports) and not missing else 1
+
+def _print_job(report: Dict[str, Any]):
+    if report['success']:
+        print(f"OK   {report['input']}: {report['num_systems']} systems, {report['total_distance']:.2f} LY, "
+              f"{report['total_jumps']} jumps in {report['wall_time']:.2f}s")
+    else:
+        print(f"FAIL {report['input']}: {report.get('error')}")
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
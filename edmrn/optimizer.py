@@ -1,27 +1,29 @@
 import math
 import numpy as np
 import pandas as pd
-import json
 from scipy.spatial.distance import cdist
-from python_tsp.heuristics import solve_tsp_lin_kernighan
 from tqdm import tqdm
-import multiprocessing
 import time
 import threading
+from functools import partial
 from typing import Callable, Dict, List, Tuple, Optional, Any
 from pathlib import Path
 from edmrn.logger import get_logger
-from edmrn.utils import atomic_write_json
-
-def _tsp_solve_wrapper(distance_matrix):
-    return solve_tsp_lin_kernighan(distance_matrix, x0=None)
-
-def _tsp_proc_worker(distance_matrix, q):
-    try:
-        result = _tsp_solve_wrapper(distance_matrix)
-        q.put(result)
-    except Exception as e:
-        q.put(('__ERROR__', str(e)))
+from edmrn.tsp_solvers import (BRANCH_AND_BOUND_MAX_NODES, DEFAULT_CANDIDATE_NEIGHBORS, EXACT_TIME_LIMIT,
+                               HELD_KARP_MAX_NODES, build_candidate_graph, candidate_local_search, coords_leg,
+                               hilbert_curve_order, jump_cost_matrix, matrix_candidate_graph, matrix_leg,
+                               matrix_nearest_neighbor_tour, matrix_tour_length, open_path_tour, repair_tour,
+                               rotate_to_start, solve_tsp_candidate, solve_tsp_exact, spatial_partition, tour_length,
+                               vectorized_local_search)
+from edmrn.distance_store import (DISTANCE_BLOCK_SIZE, FILL_BLOCK_ELEMENTS, CondensedDistanceMatrix, default_thread_count, distance_operands,
+                                  pairwise_block, run_distance_blocks)
+from edmrn.persistence import csv_writer, get_persistence_worker, json_writer
+from edmrn.resource_governor import (DEFAULT_TIME_BUDGET, REPRESENTATION_BYTES_PER_PAIR, ResourceGovernor, ResourcePlan,
+                                     get_resource_governor, system_resources)
+from edmrn.route_cache import RouteCache, get_route_cache
+from edmrn.solver_registry import RouteProblem, SolverRegistry, SolverResult, SolverSpec
+from edmrn.survey_dataset import SurveyDataset, find_body_column, load_survey_dataset, read_csv_columns
+from edmrn.solver_worker import SolverPool, SolverWorker, get_solver_pool, get_solver_worker
 logger = get_logger('Optimizer')
 SYSTEM_NAME_COLUMN = 'System Name'
 X_COORD_COLUMN = 'X'
@@ -30,6 +32,21 @@ Z_COORD_COLUMN = 'Z'
 STATUS_VISITED = 'visited'
 STATUS_SKIPPED = 'skipped'
 STATUS_UNVISITED = 'unvisited'
+SOLVER_MODES = ('auto', 'exact', 'matrix', 'candidate', 'cluster')
+OBJECTIVES = ('distance', 'jumps')
+PATH_MODES = ('open', 'closed')
+JUMP_REFINE_BUDGET_FRACTION = 0.5
+CLUSTER_MAX_SIZE = 5000
+CLUSTER_SEAM_WINDOW = 8
+CLUSTER_REPAIR_BUDGET_FRACTION = 0.2
+CLUSTER_MIN_STAGE_BUDGET = 0.05
+IMPROVEMENT_TIME_LIMIT = 5.0
+CONDENSED_DISTANCE_MIN_POINTS = 10000
+HELD_KARP_STATE_SECONDS = 1e-8
+HEURISTIC_CAPABILITIES = frozenset({'open_path', 'fixed_ends', 'jumps', 'time_budget', 'cancel', 'progress'})
+def _release_distances(distance_matrix):
+    if isinstance(distance_matrix, CondensedDistanceMatrix):
+        distance_matrix.release()
 class RouteOptimizer:
     def __init__(self):
         self.system_name_column = SYSTEM_NAME_COLUMN
@@ -37,10 +54,33 @@ class RouteOptimizer:
         self.y_column = Y_COORD_COLUMN
         self.z_column = Z_COORD_COLUMN
         self._cache = {}
+        self.solver_mode = 'auto'
+        self.candidate_neighbors = DEFAULT_CANDIDATE_NEIGHBORS
+        self.cluster_max_size = CLUSTER_MAX_SIZE
+        self.distance_backing = 'auto'
+        self.distance_threads = None
+        self._solver_worker = None
+        self._solver_pool = None
+        self.use_route_cache = True
+        self.write_behind = True
+        self._route_cache = None
+        self.tsp_restarts = 1
+        self.tsp_timeout_seconds = None
+        self.use_resource_governor = True
+        self._resource_governor = None
+        self._resource_plan = None
+        self.solver_registry = self._build_solver_registry()
+        self.objective = 'distance'
+        self.path_mode = 'open'
+        self.compare_path_modes = False
         self._performance_stats = {
             'distance_matrix_time': 0,
             'tsp_time': 0,
-            'processing_time': 0
+            'assembly_time': 0,
+            'processing_time': 0,
+            'solver_mode': None,
+            'objective': None,
+            'path_mode': None
         }
     def _get_performance_stats(self) -> Dict:
         return self._performance_stats.copy()
@@ -48,26 +88,47 @@ class RouteOptimizer:
         self._performance_stats = {
             'distance_matrix_time': 0,
             'tsp_time': 0,
-            'processing_time': 0
+            'assembly_time': 0,
+            'processing_time': 0,
+            'solver_mode': None,
+            'objective': None,
+            'path_mode': None
         }
+    def _get_resource_governor(self) -> ResourceGovernor:
+        if self._resource_governor is None:
+            self._resource_governor = get_resource_governor()
+        return self._resource_governor
+    def plan_resources(self, n_points: int, solver_mode: str = None, restarts: int = 1) -> ResourcePlan:
+        return self._get_resource_governor().plan(n_points, solver_mode or self.solver_mode, self.tsp_timeout_seconds,
+                                                  restarts, self.cluster_max_size, self.distance_threads)
+    def _plan_for(self, n_points: int) -> Optional[ResourcePlan]:
+        if not self.use_resource_governor:
+            return None
+        if self._resource_plan is not None:
+            return self._resource_plan
+        return self.plan_resources(n_points)
+    def _time_budget(self) -> float:
+        if self.tsp_timeout_seconds:
+            return self.tsp_timeout_seconds
+        return self._resource_plan.time_budget if self._resource_plan is not None else DEFAULT_TIME_BUDGET
+    def _distance_threads(self, plan: ResourcePlan = None) -> Optional[int]:
+        return self.distance_threads or (plan.distance_threads if plan is not None else None)
     def calculate_distance_matrix(self, coords: np.ndarray, method: str = 'auto', progress_callback: Callable[[str, float], None] = None, cancel_event: threading.Event = None) -> np.ndarray:
         n = len(coords)
         logger.info(f"Calculating distance matrix for {n} points...")
         start_time = time.time()
         try:
             if method == 'auto':
-                if n <= 2000:
-                    result = self._distance_matrix_scipy(coords)
-                elif n <= 10000:
-                    result = self._distance_matrix_vectorized_optimized(coords)
-                else:
-                    result = self._distance_matrix_chunked_optimized(coords, progress_callback=progress_callback, cancel_event=cancel_event)
-            elif method == 'scipy':
+                method = self.get_recommended_method(n)
+            self._performance_stats['distance_method'] = method
+            if method == 'scipy':
                 result = self._distance_matrix_scipy(coords)
             elif method == 'vectorized':
                 result = self._distance_matrix_vectorized_optimized(coords)
             elif method == 'chunked':
                 result = self._distance_matrix_chunked_optimized(coords, progress_callback=progress_callback, cancel_event=cancel_event)
+            elif method == 'condensed':
+                result = self._distance_matrix_condensed(coords, progress_callback=progress_callback, cancel_event=cancel_event)
             else:
                 raise ValueError(f"Unknown method: {method}")
             elapsed = time.time() - start_time
@@ -87,9 +148,12 @@ class RouteOptimizer:
             return self._distance_matrix_vectorized_optimized(coords)
     def _distance_matrix_vectorized_optimized(self, coords: np.ndarray) -> np.ndarray:
         n = coords.shape[0]
-        required_memory_gb = (n * n * 4) / (1024 ** 3)
-        if required_memory_gb > 2.0:
-            logger.warning(f"Vectorized method would use ~{required_memory_gb:.2f} GB RAM, falling back to chunked method")
+        plan = self._plan_for(n)
+        memory_budget = plan.memory_budget if plan is not None else system_resources()['available_memory'] // 2
+        required_memory = REPRESENTATION_BYTES_PER_PAIR['vectorized'] * n * n
+        if required_memory > memory_budget:
+            logger.warning(f"Vectorized method would use ~{required_memory / 1024 ** 3:.2f} GB RAM of a "
+                           f"{memory_budget / 1024 ** 3:.2f} GB budget, falling back to chunked method")
             return self._distance_matrix_chunked_optimized(coords)
         x = coords[:, 0:1]
         y = coords[:, 1:2]
@@ -105,39 +169,39 @@ class RouteOptimizer:
         return dist.astype(np.float32)
     def _distance_matrix_chunked_optimized(self, coords: np.ndarray, chunk_size: int = None, progress_callback: Callable[[str, float], None] = None, cancel_event: threading.Event = None) -> np.ndarray:
         n = coords.shape[0]
+        plan = self._plan_for(n)
         if chunk_size is None:
-            target_memory_mb = 250
-            chunk_size = int(np.sqrt((target_memory_mb * 1024 * 1024) / (4 * 4)))
-            chunk_size = max(100, min(800, chunk_size))
-        logger.info(f"Using chunked calculation with chunk_size={chunk_size}")
+            chunk_size = plan.chunk_size if plan is not None else DISTANCE_BLOCK_SIZE
+        threads = self._distance_threads(plan) or default_thread_count()
+        logger.info(f"Using blocked calculation with chunk_size={chunk_size} on {threads} threads")
         dist = np.zeros((n, n), dtype=np.float32)
-        total_blocks = ((n + chunk_size - 1) // chunk_size)
-        total_blocks = total_blocks * (total_blocks + 1) // 2
-        blocks_done = 0
-        with tqdm(total=total_blocks, desc="Distance Matrix", unit="block", leave=False) as pbar:
-            for i in range(0, n, chunk_size):
-                i_end = min(i + chunk_size, n)
-                chunk_i = coords[i:i_end]
-                for j in range(i, n, chunk_size):
-                    if cancel_event and cancel_event.is_set():
-                        logger.info("Distance matrix calculation cancelled by user")
-                        raise RuntimeError("Optimization cancelled by user during distance matrix calculation")
-                    j_end = min(j + chunk_size, n)
-                    chunk_j = coords[j:j_end]
-                    diff = chunk_i[:, np.newaxis, :] - chunk_j[np.newaxis, :, :]
-                    block_dist = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
-                    dist[i:i_end, j:j_end] = block_dist
-                    if i != j:
-                        dist[j:j_end, i:i_end] = block_dist.T
-                    blocks_done += 1
-                    pbar.update(1)
-                    if progress_callback:
-                        try:
-                            progress_callback('distance_matrix', blocks_done / total_blocks)
-                        except Exception:
-                            pass
+        left, right = distance_operands(coords)
+        blocks = [(i, j) for i in range(0, n, chunk_size) for j in range(i, n, chunk_size)]
+        def fill_block(block):
+            i, j = block
+            i_end = min(i + chunk_size, n)
+            j_end = min(j + chunk_size, n)
+            block_dist = pairwise_block(left[i:i_end], right[j:j_end])
+            dist[i:i_end, j:j_end] = block_dist
+            if i != j:
+                dist[j:j_end, i:i_end] = block_dist.T
+        run_distance_blocks(blocks, fill_block, threads, progress_callback, cancel_event)
         np.fill_diagonal(dist, 0.0)
         return dist
+    def _distance_matrix_condensed(self, coords: np.ndarray, progress_callback: Callable[[str, float], None] = None, cancel_event: threading.Event = None) -> CondensedDistanceMatrix:
+        plan = self._plan_for(len(coords))
+        backing = self.distance_backing
+        if backing == 'auto' and plan is not None:
+            backing = plan.distance_backing
+        store = CondensedDistanceMatrix.create(len(coords), backing=backing)
+        try:
+            store.fill_from_coords(coords, progress_callback, cancel_event, threads=self._distance_threads(plan),
+                                   block_elements=plan.block_elements if plan is not None else FILL_BLOCK_ELEMENTS)
+        except Exception:
+            store.release()
+            raise
+        logger.info(f"Condensed distances: {store.nbytes / 1024 ** 2:.1f} MB float32 in {store.backing}")
+        return store
     def _distance_matrix_simple(self, coords: np.ndarray, progress_callback: Callable[[str, float], None] = None, cancel_event: threading.Event = None) -> np.ndarray:
         n = coords.shape[0]
         dist = np.zeros((n, n), dtype=np.float32)
@@ -163,62 +227,660 @@ class RouteOptimizer:
                     pass
         return dist
     def _nearest_neighbor_tsp(self, distance_matrix: np.ndarray) -> List[int]:
-        n = distance_matrix.shape[0]
-        if n == 0:
-            return []
-        visited = [False] * n
-        tour = [0]
-        visited[0] = True
-        for _ in range(1, n):
-            last = tour[-1]
-            dists = distance_matrix[last]
-            next_idx = None
-            min_d = float('inf')
-            for i in range(n):
-                if not visited[i] and dists[i] < min_d:
-                    min_d = dists[i]
-                    next_idx = i
-            if next_idx is None:
-                for i in range(n):
-                    if not visited[i]:
-                        next_idx = i
-                        break
-            visited[next_idx] = True
-            tour.append(next_idx)
-        return tour
-    def _solve_tsp_with_timeout(self, distance_matrix: np.ndarray, timeout: float = None) -> Tuple[List[int], float]:
-        if timeout is None:
-            timeout = getattr(self, 'tsp_timeout_seconds', 30)
+        return matrix_nearest_neighbor_tour(distance_matrix).tolist()
+    def improve_route(self, tour: List[int], distance_matrix: np.ndarray = None, coords: np.ndarray = None,
+                      closed: bool = True, start_index: int = None, end_index: int = None,
+                      time_limit: float = IMPROVEMENT_TIME_LIMIT, cancel_event: threading.Event = None,
+                      construction: str = 'nearest_neighbor') -> List[int]:
+        tour = np.asarray(tour, dtype=np.int64)
         start = time.time()
+        if distance_matrix is not None:
+            leg = matrix_leg(distance_matrix)
+            neighbors = matrix_candidate_graph(distance_matrix, self.candidate_neighbors)
+            length = lambda t: matrix_tour_length(distance_matrix, t, closed=closed)
+        else:
+            coords = np.asarray(coords, dtype=np.float64)
+            leg = coords_leg(coords)
+            neighbors = build_candidate_graph(coords, self.candidate_neighbors)
+            length = lambda t: tour_length(coords, t, closed=closed)
+        before = length(tour)
+        improved, moves = vectorized_local_search(leg, tour, neighbors, time_limit=time_limit, cancel_event=cancel_event,
+                                                  closed=closed, fixed_start=closed or start_index is not None,
+                                                  fixed_end=closed or end_index is not None)
+        after = length(improved)
+        elapsed = time.time() - start
+        logger.info(f"Improved {construction} route: {before:.2f} LY -> {after:.2f} LY in {elapsed:.2f}s "
+                    f"({moves['two_opt_moves']} 2-opt, {moves['or_opt_moves']} Or-opt moves)")
+        self._record_improvement(construction, before, after, elapsed, **moves)
+        return improved.tolist()
+    def _record_improvement(self, construction: str, before: float, after: float, elapsed: float, **moves):
+        self._performance_stats['improvement'] = {'construction': construction, 'before': before, 'after': after,
+                                                  'gain': before - after, 'time': elapsed, **moves}
+    def space_filling_curve_route(self, coords: np.ndarray, start_index: int = None) -> np.ndarray:
+        order = hilbert_curve_order(np.asarray(coords, dtype=np.float64))
+        if start_index is None or len(order) < 3:
+            return open_path_tour(order, start_index)
+        p = int(np.flatnonzero(order == start_index)[0])
+        if p == 0:
+            return order
+        if p == len(order) - 1:
+            return order[::-1].copy()
+        jump_back = np.sum((coords[order[0]] - coords[order[p + 1]]) ** 2)
+        jump_forward = np.sum((coords[order[-1]] - coords[order[p - 1]]) ** 2)
+        if jump_back <= jump_forward:
+            return np.concatenate((order[p::-1], order[p + 1:]))
+        return np.concatenate((order[p:], order[p - 1::-1]))
+    def _emit_progress(self, progress_callback: Callable[[str, float], None], stage: str, fraction: float = None, details: Dict[str, Any] = None):
+        if not progress_callback:
+            return
         try:
-            ctx = multiprocessing.get_context('spawn')
-            q = ctx.Queue()
-            p = ctx.Process(target=_tsp_proc_worker, args=(distance_matrix, q))
-            p.start()
-            p.join(timeout)
-            if p.is_alive():
-                logger.warning(f"TSP solver timed out after {timeout}s; terminating worker and falling back to nearest-neighbor heuristic")
-                p.terminate()
-                p.join()
-                start2 = time.time()
-                permutation = self._nearest_neighbor_tsp(distance_matrix)
-                return permutation, time.time() - start2
-            try:
-                result = q.get_nowait()
-            except Exception:
-                logger.error("TSP worker finished but returned no data; falling back to nearest-neighbor heuristic")
-                return self._nearest_neighbor_tsp(distance_matrix), time.time() - start
-            if isinstance(result, tuple):
-                permutation = result[0]
+            if details is None:
+                progress_callback(stage, fraction)
             else:
-                permutation = result
-            elapsed = time.time() - start
-            return permutation, elapsed
+                try:
+                    progress_callback(stage, fraction, details)
+                except TypeError:
+                    progress_callback(stage, fraction)
+        except Exception:
+            pass
+    def _emit_tsp_progress(self, progress_callback: Callable[[str, float], None], start: float, budget: float,
+                           stage: str = 'tsp_progress', fraction: float = None, **details):
+        elapsed = time.time() - start
+        details = {key: value for key, value in details.items() if value is not None}
+        details.update({'elapsed': elapsed, 'budget': budget})
+        if fraction is None and budget:
+            fraction = min(1.0, elapsed / budget)
+        self._emit_progress(progress_callback, stage, fraction, details)
+    def _local_search_progress(self, progress_callback: Callable[[str, float], None], coords: np.ndarray, closed: bool,
+                               budget: float) -> Optional[Callable[[np.ndarray, int, int], None]]:
+        if not progress_callback:
+            return None
+        start = time.time()
+        def on_progress(tour: np.ndarray, steps: int, moves: int):
+            self._emit_tsp_progress(progress_callback, start, budget, best_length=tour_length(coords, tour, closed),
+                                    iterations=steps, moves=moves)
+        return on_progress
+    def _get_solver_worker(self) -> SolverWorker:
+        if self._solver_worker is None:
+            self._solver_worker = get_solver_worker()
+        return self._solver_worker
+    def _solve_tsp_with_timeout(self, distance_matrix: np.ndarray, timeout: float = None,
+                                progress_callback: Callable[[str, float], None] = None,
+                                cancel_event: threading.Event = None,
+                                initial_tour: List[int] = None, closed: bool = True,
+                                start_index: int = None, end_index: int = None) -> Tuple[List[int], float]:
+        if timeout is None:
+            timeout = self._time_budget()
+        start = time.time()
+        search = {'iterations': None, 'moves': None}
+        def on_tour(best_length: float, elapsed: float):
+            logger.debug(f"TSP best tour so far: {best_length:.2f} LY after {elapsed:.2f}s")
+            self._emit_tsp_progress(progress_callback, start, timeout, best_length=best_length, **search)
+        def on_progress(stats: Dict[str, Any]):
+            search.update(iterations=stats['iterations'], moves=stats['moves'])
+            best_length = stats['best_length'] if np.isfinite(stats['best_length']) else None
+            self._emit_tsp_progress(progress_callback, start, timeout, best_length=best_length, **search)
+        try:
+            best_tour, best_length = self._get_solver_worker().solve(distance_matrix, timeout, on_tour=on_tour, cancel_event=cancel_event,
+                                                                       initial_tour=initial_tour, closed=closed,
+                                                                       start_index=start_index, end_index=end_index,
+                                                                       on_progress=on_progress)
         except Exception as e:
-            logger.error(f"TSP solver error: {e}; falling back to nearest-neighbor heuristic")
-            start2 = time.time()
+            logger.error(f"TSP solver error: {e}")
+            best_tour = None
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        if best_tour is not None:
+            logger.info(f"TSP {'tour' if closed else 'path'} length: {best_length:.2f} LY")
+            if not closed:
+                return list(best_tour), time.time() - start
+            return rotate_to_start(best_tour, 0).tolist(), time.time() - start
+        logger.warning("No tour received from TSP worker; falling back to nearest-neighbor heuristic")
+        if not closed:
+            permutation = matrix_nearest_neighbor_tour(distance_matrix, start_index or 0)
+            permutation = open_path_tour(permutation, start_index, end_index)
+        else:
             permutation = self._nearest_neighbor_tsp(distance_matrix)
-            return permutation, time.time() - start2
+        permutation = self.improve_route(permutation, distance_matrix=distance_matrix, closed=closed,
+                                         start_index=start_index, end_index=end_index,
+                                         time_limit=min(IMPROVEMENT_TIME_LIMIT, timeout), cancel_event=cancel_event)
+        return permutation, time.time() - start
+    def _get_solver_pool(self, n_points: int = None) -> SolverPool:
+        if self._solver_pool is None:
+            self._solver_pool = get_solver_pool()
+        plan = self._plan_for(n_points) if n_points else None
+        if plan is not None:
+            self._solver_pool.resize(plan.workers)
+        return self._solver_pool
+    def _solve_tsp_multi_start(self, distance_matrix: np.ndarray, restarts: int, coords: np.ndarray = None, timeout: float = None,
+                               progress_callback: Callable[[str, float], None] = None,
+                               cancel_event: threading.Event = None, closed: bool = True,
+                               start_index: int = None, end_index: int = None) -> Tuple[List[int], float]:
+        if timeout is None:
+            timeout = self._time_budget()
+        start = time.time()
+        best = {'length': None, 'restarts_done': 0}
+        def on_result(result: Dict[str, Any]):
+            logger.info(f"Restart {result['worker']} ({result['strategy']}): {result['initial_length']:.2f} -> {result['length']:.2f} LY in {result['time']:.2f}s")
+            best['restarts_done'] += 1
+            if best['length'] is None or result['length'] < best['length']:
+                best['length'] = result['length']
+            self._emit_tsp_progress(progress_callback, start, timeout, best_length=best['length'],
+                                    restarts_done=best['restarts_done'], restarts=restarts)
+        def on_progress(elapsed: float):
+            self._emit_tsp_progress(progress_callback, start, timeout, best_length=best['length'],
+                                    restarts_done=best['restarts_done'], restarts=restarts)
+        try:
+            results = self._get_solver_pool(len(distance_matrix)).solve_multi_start(distance_matrix, restarts, timeout, coords=coords,
+                                                                on_result=on_result, cancel_event=cancel_event, closed=closed,
+                                                                start_index=start_index, end_index=end_index,
+                                                                on_progress=on_progress)
+        except Exception as e:
+            logger.error(f"Multi-start solver error: {e}")
+            results = []
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        self._performance_stats['multi_start'] = [
+            {key: value for key, value in result.items() if key != 'tour'}
+            for result in sorted(results, key=lambda r: r['worker'])
+        ]
+        if not results:
+            logger.warning("No restart finished; falling back to single solver worker")
+            return self._solve_tsp_with_timeout(distance_matrix, timeout, progress_callback, cancel_event, closed=closed,
+                                                start_index=start_index, end_index=end_index)
+        winner = min(results, key=lambda r: r['length'])
+        self._performance_stats['multi_start_best'] = winner['worker']
+        logger.info(f"Multi-start best: restart {winner['worker']} ({winner['strategy']}) with {winner['length']:.2f} LY out of {len(results)} restarts")
+        return winner['tour'], time.time() - start
+    def resolve_solver_mode(self, n_points: int, solver_mode: str = None) -> str:
+        mode = solver_mode or self.solver_mode or 'auto'
+        if mode == 'auto':
+            problem = RouteProblem(np.zeros((n_points, 3)))
+            return self.solver_registry.select(problem, self._time_budget(), self._memory_budget(n_points)).name
+        self.solver_registry.get(mode)
+        return mode
+    def _solve_tsp_candidate(self, coords: np.ndarray, timeout: float = None, cancel_event: threading.Event = None,
+                             jump_range: float = None, initial_tour: List[int] = None, closed: bool = True,
+                             start_index: int = None, end_index: int = None,
+                             progress_callback: Callable[[str, float], None] = None) -> Tuple[List[int], float]:
+        if timeout is None:
+            timeout = self._time_budget()
+        start = time.time()
+        permutation = solve_tsp_candidate(coords, k=self.candidate_neighbors, time_limit=timeout, cancel_event=cancel_event,
+                                          jump_range=jump_range, initial_tour=initial_tour, closed=closed,
+                                          start_index=start_index, end_index=end_index,
+                                          on_progress=self._local_search_progress(progress_callback, coords, closed, timeout))
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        return permutation, time.time() - start
+    def resolve_objective(self, objective: str = None) -> str:
+        objective = objective or self.objective or 'distance'
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        return objective
+    def resolve_path_mode(self, path_mode: str = None) -> str:
+        path_mode = path_mode or self.path_mode or 'open'
+        if path_mode not in PATH_MODES:
+            raise ValueError(f"Unknown path mode: {path_mode}")
+        return path_mode
+    def _solve_with_candidates(self, coords_array: np.ndarray,
+                               progress_callback: Callable[[str, float], None] = None,
+                               cancel_event: threading.Event = None,
+                               objective: str = 'distance', jump_range: float = None, closed: bool = True,
+                               start_index: int = None, end_index: int = None, timeout: float = None) -> Dict[str, List[int]]:
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user before TSP')
+        if timeout is None:
+            timeout = self._time_budget()
+        self._emit_progress(progress_callback, 'tsp_start', None)
+        logger.info(f"Starting candidate-neighbor TSP solver for {len(coords_array)} nodes (k={self.candidate_neighbors}, budget {timeout:.1f}s)")
+        path = {'closed': closed, 'start_index': start_index, 'end_index': end_index}
+        permutation_opt, tsp_elapsed = self._solve_tsp_candidate(coords_array, timeout=timeout, cancel_event=cancel_event,
+                                                                 progress_callback=progress_callback, **path)
+        tours = {'distance': permutation_opt}
+        if objective == 'jumps':
+            logger.info(f"Refining candidate tour for jump count (jump range {jump_range} LY)")
+            tours['jumps'], jump_elapsed = self._solve_tsp_candidate(coords_array, timeout=timeout * JUMP_REFINE_BUDGET_FRACTION, cancel_event=cancel_event,
+                                                                      jump_range=jump_range, initial_tour=permutation_opt,
+                                                                      progress_callback=progress_callback, **path)
+            tsp_elapsed += jump_elapsed
+        self._performance_stats['tsp_time'] = tsp_elapsed
+        logger.info(f"Candidate TSP solver completed in {tsp_elapsed:.2f}s")
+        self._emit_progress(progress_callback, 'tsp_done', 1.0)
+        return tours
+    def _solve_with_clusters(self, coords_array: np.ndarray,
+                             progress_callback: Callable[[str, float], None] = None,
+                             cancel_event: threading.Event = None,
+                             objective: str = 'distance', jump_range: float = None, closed: bool = True,
+                             start_index: int = None, end_index: int = None, timeout: float = None) -> Dict[str, List[int]]:
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user before TSP')
+        self._emit_progress(progress_callback, 'tsp_start', None)
+        if timeout is None:
+            timeout = self._time_budget()
+        deadline = time.time() + timeout
+        def remaining() -> float:
+            return max(CLUSTER_MIN_STAGE_BUDGET, deadline - time.time())
+        n = len(coords_array)
+        if closed:
+            start_index = end_index = None
+        if end_index == start_index:
+            end_index = None
+        stage_times = {}
+        stage_start = time.time()
+        clusters = spatial_partition(coords_array, self.cluster_max_size)
+        if start_index is not None and end_index is not None and len(clusters) > 1:
+            for cluster, members in enumerate(clusters):
+                if np.any(members == start_index) and np.any(members == end_index):
+                    clusters[cluster] = members[members != end_index]
+                    clusters.append(np.array([end_index], dtype=np.int64))
+                    break
+        owner = np.empty(n, dtype=np.int64)
+        for cluster, members in enumerate(clusters):
+            owner[members] = cluster
+        stage_times['partition'] = time.time() - stage_start
+        logger.info(f"Partitioned {n} systems into {len(clusters)} clusters in {stage_times['partition']:.2f}s")
+        stage_start = time.time()
+        centroids = np.array([coords_array[members].mean(axis=0) for members in clusters])
+        order = solve_tsp_candidate(centroids, cancel_event=cancel_event, closed=closed,
+                                    start_index=int(owner[start_index]) if start_index is not None else None,
+                                    end_index=int(owner[end_index]) if end_index is not None else None)
+        clusters = [clusters[cluster] for cluster in order]
+        centroids = centroids[order]
+        entries = []
+        exits = []
+        for position, members in enumerate(clusters):
+            pts = coords_array[members]
+            if position > 0:
+                entry_distances = np.sum((pts - coords_array[previous_exit]) ** 2, axis=1)
+                if position == len(clusters) - 1 and end_index is not None and len(members) > 1:
+                    entry_distances[members == end_index] = np.inf
+                entry = int(np.argmin(entry_distances))
+            elif start_index is not None:
+                entry = int(np.flatnonzero(members == start_index)[0])
+            else:
+                entry = None
+            if position < len(clusters) - 1 or closed:
+                target = centroids[(position + 1) % len(clusters)]
+                exit_distances = np.sum((pts - target) ** 2, axis=1)
+                if entry is not None and len(members) > 1:
+                    exit_distances[entry] = np.inf
+                exit_ = int(np.argmin(exit_distances))
+                previous_exit = members[exit_]
+            elif end_index is not None:
+                exit_ = int(np.flatnonzero(members == end_index)[0])
+            else:
+                exit_ = None
+            entries.append(entry)
+            exits.append(exit_)
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        stage_times['cluster_order'] = time.time() - stage_start
+        stage_start = time.time()
+        reserve = CLUSTER_REPAIR_BUDGET_FRACTION + (JUMP_REFINE_BUDGET_FRACTION if objective == 'jumps' else 0.0)
+        solve_budget = remaining() * (1.0 - reserve)
+        solved = {'count': 0}
+        def on_progress(elapsed: float = None):
+            self._emit_tsp_progress(progress_callback, stage_start, solve_budget, 'cluster_solve', solved['count'] / len(clusters),
+                                    clusters_done=solved['count'], clusters=len(clusters))
+        def on_result(result: Dict[str, Any]):
+            solved['count'] += 1
+            on_progress()
+        try:
+            paths = self._get_solver_pool(n).solve_clusters(coords_array, clusters, entries, exits, solve_budget,
+                                                           on_result=on_result, cancel_event=cancel_event,
+                                                           on_progress=on_progress)
+        except Exception as e:
+            logger.error(f"Cluster solver error: {e}")
+            paths = {}
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        missing = [cluster for cluster in range(len(clusters)) if cluster not in paths]
+        if missing:
+            logger.warning(f"{len(missing)} of {len(clusters)} clusters were not solved in time; using space-filling-curve order for them")
+        for cluster in missing:
+            paths[cluster] = open_path_tour(hilbert_curve_order(coords_array[clusters[cluster]]),
+                                            entries[cluster], exits[cluster]).tolist()
+        stage_times['cluster_solve'] = time.time() - stage_start
+        stage_start = time.time()
+        tour = np.concatenate([clusters[cluster][np.asarray(paths[cluster], dtype=np.int64)] for cluster in range(len(clusters))])
+        seams = np.cumsum([len(members) for members in clusters])
+        seam_positions = (seams[:, np.newaxis] + np.arange(-CLUSTER_SEAM_WINDOW, CLUSTER_SEAM_WINDOW)).ravel()
+        seam_positions = np.unique(seam_positions % n if closed else np.clip(seam_positions, 0, n - 1))
+        stitched_length = tour_length(coords_array, tour, closed)
+        neighbors = build_candidate_graph(coords_array, self.candidate_neighbors, cancel_event)
+        if neighbors is None:
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        owner = np.empty(n, dtype=np.int64)
+        for cluster, members in enumerate(clusters):
+            owner[members] = cluster
+        boundary = np.flatnonzero(np.any(owner[neighbors] != owner[:, np.newaxis], axis=1))
+        active = np.concatenate((tour[seam_positions], boundary))
+        repair_budget = remaining() * CLUSTER_REPAIR_BUDGET_FRACTION / reserve
+        logger.info(f"Seam repair over {len(active)} boundary systems ({repair_budget:.1f}s)")
+        tour = candidate_local_search(coords_array, tour, neighbors, time_limit=repair_budget,
+                                      cancel_event=cancel_event, closed=closed, fixed_start=start_index is not None,
+                                      fixed_end=end_index is not None, initial_active=active,
+                                      on_progress=self._local_search_progress(progress_callback, coords_array, closed,
+                                                                              repair_budget))
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        if closed:
+            tour = rotate_to_start(tour, 0)
+        stage_times['stitch'] = time.time() - stage_start
+        repaired_length = tour_length(coords_array, tour, closed)
+        logger.info(f"Stitched {len(clusters)} cluster paths: {stitched_length:.2f} -> {repaired_length:.2f} LY "
+                    f"after seam repair in {stage_times['stitch']:.2f}s")
+        self._record_improvement('cluster_stitch', stitched_length, repaired_length, stage_times['stitch'])
+        tours = {'distance': tour.tolist()}
+        if objective == 'jumps':
+            logger.info(f"Refining stitched route for jump count (jump range {jump_range} LY)")
+            tours['jumps'], stage_times['jump_refine'] = self._solve_tsp_candidate(
+                coords_array, timeout=remaining(), cancel_event=cancel_event,
+                jump_range=jump_range, initial_tour=tours['distance'], closed=closed,
+                start_index=start_index, end_index=end_index, progress_callback=progress_callback)
+        self._performance_stats['cluster_count'] = len(clusters)
+        self._performance_stats['cluster_stage_times'] = stage_times
+        self._performance_stats['tsp_time'] = sum(stage_times.values())
+        logger.info("Cluster solver stages: " + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in stage_times.items()))
+        self._emit_progress(progress_callback, 'tsp_done', 1.0)
+        return tours
+    def _solve_with_distance_matrix(self, coords_array: np.ndarray, start_time: float,
+                                    progress_callback: Callable[[str, float], None] = None,
+                                    cancel_event: threading.Event = None, restarts: int = 1,
+                                    objective: str = 'distance', jump_range: float = None, closed: bool = True,
+                                    start_index: int = None, end_index: int = None, timeout: float = None) -> Dict[str, List[int]]:
+        distance_matrix_opt = self.calculate_distance_matrix(coords_array, method='auto', progress_callback=progress_callback, cancel_event=cancel_event)
+        try:
+            return self._solve_on_distance_matrix(distance_matrix_opt, coords_array, start_time, progress_callback, cancel_event,
+                                                  restarts, objective, jump_range, closed, start_index, end_index, timeout)
+        finally:
+            _release_distances(distance_matrix_opt)
+    def _solve_on_distance_matrix(self, distance_matrix_opt, coords_array: np.ndarray, start_time: float,
+                                  progress_callback: Callable[[str, float], None], cancel_event: threading.Event,
+                                  restarts: int, objective: str, jump_range: float, closed: bool,
+                                  start_index: int, end_index: int, timeout: float = None) -> Dict[str, List[int]]:
+        if timeout is None:
+            timeout = self._time_budget()
+        logger.info(f"Distance matrix shape: {distance_matrix_opt.shape}; time since start: {time.perf_counter() - start_time:.2f}s")
+        self._emit_progress(progress_callback, 'distance_matrix_done', 1.0)
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user before TSP')
+        if len(distance_matrix_opt) <= 1:
+            self._performance_stats['tsp_time'] = 0.0
+            identity = list(range(len(distance_matrix_opt)))
+            return {'distance': identity, 'jumps': identity} if objective == 'jumps' else {'distance': identity}
+        self._emit_progress(progress_callback, 'tsp_start', None)
+        logger.info(f"Starting TSP solver for {len(distance_matrix_opt)} nodes (timeout {timeout:.1f}s)")
+        path = {'closed': closed, 'start_index': start_index, 'end_index': end_index}
+        if restarts > 1:
+            logger.info(f"Running {restarts} multi-start restarts")
+            permutation_opt, tsp_elapsed = self._solve_tsp_multi_start(distance_matrix_opt, restarts, coords=coords_array, timeout=timeout, progress_callback=progress_callback, cancel_event=cancel_event, **path)
+        else:
+            permutation_opt, tsp_elapsed = self._solve_tsp_with_timeout(distance_matrix_opt, timeout, progress_callback=progress_callback, cancel_event=cancel_event, **path)
+        if cancel_event and cancel_event.is_set():
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        tours = {'distance': permutation_opt}
+        if objective == 'jumps':
+            logger.info(f"Re-solving on jump-cost matrix (jump range {jump_range} LY), warm-started from the distance tour")
+            cost_matrix = jump_cost_matrix(distance_matrix_opt, jump_range)
+            try:
+                tours['jumps'], jump_elapsed = self._solve_tsp_with_timeout(cost_matrix, timeout=timeout * JUMP_REFINE_BUDGET_FRACTION, progress_callback=progress_callback,
+                                                                            cancel_event=cancel_event, initial_tour=permutation_opt, **path)
+            finally:
+                _release_distances(cost_matrix)
+            tsp_elapsed += jump_elapsed
+            if cancel_event and cancel_event.is_set():
+                raise RuntimeError('Optimization cancelled by user during TSP')
+        self._performance_stats['tsp_time'] = tsp_elapsed
+        logger.info(f"TSP solver completed in {tsp_elapsed:.2f}s")
+        self._emit_progress(progress_callback, 'tsp_done', 1.0)
+        return tours
+    def _solve_route(self, coords_array: np.ndarray, start_time: float, path_mode: str,
+                     start_index: int = None, end_index: int = None,
+                     progress_callback: Callable[[str, float], None] = None,
+                     cancel_event: threading.Event = None, solver_mode: str = None, restarts: int = 1,
+                     objective: str = 'distance', jump_range: float = None) -> Dict[str, List[int]]:
+        if path_mode == 'closed' and (start_index is not None or end_index is not None):
+            fixed = [index for index in (start_index, end_index) if index is not None]
+            others = np.delete(np.arange(len(coords_array)), fixed)
+            tours = self._solve_route(coords_array[others], start_time, path_mode, progress_callback=progress_callback,
+                                      cancel_event=cancel_event, solver_mode=solver_mode, restarts=restarts,
+                                      objective=objective, jump_range=jump_range)
+            head = [start_index] if start_index is not None else []
+            tail = [end_index] if end_index is not None and end_index != start_index else []
+            return {name: head + others[tour].tolist() + tail for name, tour in tours.items()}
+        problem = RouteProblem(coords_array, path_mode == 'closed', start_index, end_index, objective, jump_range, restarts,
+                               progress_callback, cancel_event)
+        mode = solver_mode or self.solver_mode or 'auto'
+        if mode == 'auto' and self._resource_plan is not None and not self.solver_registry.get(self._resource_plan.solver_mode).missing(problem):
+            mode = self._resource_plan.solver_mode
+        logger.info(f"Solver mode for {len(coords_array)} points: {mode}; objective: {objective}; path mode: {path_mode}")
+        return self.solve(problem, solver=mode).tours
+    def _select_planned_solver(self, plan: ResourcePlan, problem: RouteProblem, solver_mode: str = None):
+        mode = solver_mode or self.solver_mode or 'auto'
+        if mode != 'auto' and self.solver_registry.get(mode).supports(problem):
+            spec = self.solver_registry.get(mode)
+        else:
+            spec = self.solver_registry.select(problem, self._time_budget(), plan.memory_budget)
+        if spec.name == plan.solver_mode:
+            return
+        estimate = spec.estimate(problem, self._time_budget())
+        plan.reasons.append(f"solver registry picked {spec.name} over {plan.solver_mode} for {problem.n} systems "
+                            f"(~{estimate['total_seconds']:.1f}s, gap {estimate['gap'] * 100:.1f}%)")
+        plan.solver_mode = spec.name
+        plan.estimated_time = estimate['distance_seconds'] + min(estimate['tsp_seconds'], plan.time_budget)
+        plan.estimated_memory = int(estimate['memory'])
+    def _get_route_cache(self) -> RouteCache:
+        if self._route_cache is None:
+            self._route_cache = get_route_cache()
+        return self._route_cache
+    def _route_cache_settings(self, coords_array: np.ndarray, path_mode: str, start_index: int, solver_mode: str,
+                              restarts: int, objective: str, jump_range: float) -> Dict[str, Any]:
+        return {
+            'start': coords_array[start_index].tolist() if start_index is not None else None,
+            'path_mode': path_mode,
+            'objective': objective,
+            'jump_range': jump_range if objective == 'jumps' else None,
+            'solver_mode': solver_mode or self.solver_mode or 'auto',
+            'restarts': restarts,
+            'candidate_neighbors': self.candidate_neighbors,
+            'cluster_max_size': self.cluster_max_size,
+            'timeout': self.tsp_timeout_seconds
+        }
+    def _solve_route_cached(self, coords_array: np.ndarray, start_time: float, path_mode: str, start_index: int = None,
+                            progress_callback: Callable[[str, float], None] = None,
+                            cancel_event: threading.Event = None, solver_mode: str = None, restarts: int = 1,
+                            objective: str = 'distance', jump_range: float = None) -> Dict[str, List[int]]:
+        solve = {'progress_callback': progress_callback, 'cancel_event': cancel_event, 'solver_mode': solver_mode,
+                 'restarts': restarts, 'objective': objective, 'jump_range': jump_range}
+        if not self.use_route_cache:
+            return self._solve_route(coords_array, start_time, path_mode, start_index, **solve)
+        cache = self._get_route_cache()
+        settings = self._route_cache_settings(coords_array, path_mode, start_index, solver_mode, restarts, objective, jump_range)
+        try:
+            cached = cache.lookup(coords_array, settings)
+        except Exception as e:
+            logger.warning(f"Route cache lookup failed: {e}")
+            cached = None
+        if cached is not None and cached['exact']:
+            self._performance_stats['route_cache'] = 'hit'
+            self._performance_stats['tsp_time'] = 0.0
+            logger.info(f"Route cache hit for {len(coords_array)} systems; skipping distance matrix and TSP")
+            self._emit_progress(progress_callback, 'tsp_done', 1.0)
+            return {name: tour.tolist() for name, tour in cached['tours'].items()}
+        if cached is not None:
+            self._performance_stats['route_cache'] = 'near_hit'
+            tours = self._warm_start_route(coords_array, cached, path_mode, start_index, progress_callback, cancel_event, jump_range)
+        else:
+            self._performance_stats['route_cache'] = 'miss'
+            tours = self._solve_route(coords_array, start_time, path_mode, start_index, **solve)
+        try:
+            cache.store(coords_array, settings, tours)
+        except Exception as e:
+            logger.warning(f"Could not store route in cache: {e}")
+        return tours
+    def _warm_start_route(self, coords_array: np.ndarray, cached: Dict[str, Any], path_mode: str, start_index: int = None,
+                          progress_callback: Callable[[str, float], None] = None,
+                          cancel_event: threading.Event = None, jump_range: float = None) -> Dict[str, List[int]]:
+        start = time.time()
+        closed = path_mode == 'closed'
+        self._emit_progress(progress_callback, 'tsp_start', None)
+        logger.info(f"Route cache near-hit: {len(cached['added'])} systems added, {cached['removed']} removed; repairing cached route")
+        neighbors = build_candidate_graph(coords_array, self.candidate_neighbors, cancel_event)
+        if neighbors is None:
+            raise RuntimeError('Optimization cancelled by user during TSP')
+        leg = coords_leg(coords_array)
+        timeout = self._time_budget()
+        tours = {}
+        for name, cached_tour in cached['tours'].items():
+            tour, touched = repair_tour(leg, cached_tour, cached['added'], neighbors, closed)
+            if not closed:
+                tour = open_path_tour(tour, start_index)
+                touched = np.union1d(touched, tour[[0, -1]])
+            repaired_length = tour_length(coords_array, tour, closed)
+            tour = candidate_local_search(coords_array, tour, neighbors, time_limit=timeout, cancel_event=cancel_event,
+                                          closed=closed, jump_range=jump_range if name == 'jumps' else None,
+                                          fixed_start=start_index is not None, fixed_end=False, initial_active=touched,
+                                          on_progress=self._local_search_progress(progress_callback, coords_array, closed, timeout))
+            if cancel_event and cancel_event.is_set():
+                raise RuntimeError('Optimization cancelled by user during TSP')
+            if closed:
+                tour = rotate_to_start(tour, start_index if start_index is not None else 0)
+            logger.info(f"Warm-started {name} route: {repaired_length:.2f} -> {tour_length(coords_array, tour, closed):.2f} LY "
+                        f"from {len(touched)} touched systems")
+            tours[name] = tour.tolist()
+        self._performance_stats['tsp_time'] = time.time() - start
+        self._emit_progress(progress_callback, 'tsp_done', 1.0)
+        return tours
+    def solve_open_path(self, coords: np.ndarray, start_index: int = None, end_index: int = None, timeout: float = None,
+                        progress_callback: Callable[[str, float], None] = None,
+                        cancel_event: threading.Event = None, solver_mode: str = None) -> Tuple[List[int], float]:
+        self._performance_stats.pop('exact', None)
+        problem = RouteProblem(coords, False, start_index, end_index, progress_callback=progress_callback,
+                               cancel_event=cancel_event)
+        result = self.solve(problem, timeout, solver_mode)
+        return result.tours['distance'], result.elapsed
+    def _build_solver_registry(self) -> SolverRegistry:
+        registry = SolverRegistry()
+        registry.register(SolverSpec('exact', self._solve_problem_exactly, self._exact_estimate, 'O(n^2 2^n)',
+                                     frozenset({'open_path', 'fixed_ends', 'jumps', 'time_budget', 'cancel', 'optimal'}),
+                                     min_points=3, max_points=BRANCH_AND_BOUND_MAX_NODES,
+                                     description='Held-Karp dynamic programming, branch and bound above 16 systems'))
+        registry.register(SolverSpec('matrix', partial(self._solve_problem, 'matrix'), partial(self._cost_estimate, 'matrix'),
+                                     'O(n^2)', HEURISTIC_CAPABILITIES | {'restarts'},
+                                     description='dense distance matrix with 2-opt and Or-opt in a solver process, Lin-Kernighan polish on small closed tours'))
+        registry.register(SolverSpec('candidate', partial(self._solve_problem, 'candidate'), partial(self._cost_estimate, 'candidate'),
+                                     'O(n log n)', HEURISTIC_CAPABILITIES,
+                                     description='greedy edge tour on nearest neighbours, then candidate 2-opt and Or-opt'))
+        registry.register(SolverSpec('cluster', partial(self._solve_problem, 'cluster'), partial(self._cost_estimate, 'cluster'),
+                                     'O(n log n)', HEURISTIC_CAPABILITIES,
+                                     description='spatial clusters solved in parallel and stitched at the seams'))
+        return registry
+    def _memory_budget(self, n_points: int) -> Optional[int]:
+        plan = self._plan_for(n_points)
+        return plan.memory_budget if plan is not None else None
+    def _cost_estimate(self, method: str, problem: RouteProblem, budget: float) -> Dict[str, float]:
+        plan = self._plan_for(problem.n)
+        if plan is not None:
+            return plan.estimates[method]
+        return self._get_resource_governor().estimate(method, problem.n, restarts=problem.restarts,
+                                                      cluster_max_size=self.cluster_max_size)
+    def _exact_estimate(self, problem: RouteProblem, budget: float) -> Dict[str, float]:
+        n = problem.n + (1 if not problem.closed and problem.start_index is None else 0)
+        if problem.n <= HELD_KARP_MAX_NODES:
+            seconds = HELD_KARP_STATE_SECONDS * n * n * 2 ** n
+        else:
+            seconds = EXACT_TIME_LIMIT
+        if problem.objective == 'jumps':
+            seconds *= 2
+        return {'distance_seconds': 0.0, 'tsp_seconds': seconds, 'total_seconds': seconds,
+                'memory': 8 * n * 2 ** min(n, HELD_KARP_MAX_NODES), 'gap': 0.0}
+    def _solve_problem(self, mode: str, problem: RouteProblem, budget: float) -> Dict[str, List[int]]:
+        path = {'closed': problem.closed, 'start_index': problem.start_index, 'end_index': problem.end_index, 'timeout': budget}
+        solve = (problem.coords, problem.progress_callback, problem.cancel_event)
+        if mode == 'cluster':
+            return self._solve_with_clusters(*solve, problem.objective, problem.jump_range, **path)
+        if mode == 'candidate':
+            return self._solve_with_candidates(*solve, problem.objective, problem.jump_range, **path)
+        if problem.distance_matrix is not None:
+            return self._solve_on_distance_matrix(problem.distance_matrix, problem.coords, time.perf_counter(), problem.progress_callback,
+                                                  problem.cancel_event, problem.restarts, problem.objective, problem.jump_range, **path)
+        return self._solve_with_distance_matrix(problem.coords, time.perf_counter(), problem.progress_callback, problem.cancel_event,
+                                                problem.restarts, problem.objective, problem.jump_range, **path)
+    def _solve_problem_exactly(self, problem: RouteProblem, budget: float) -> Optional[Dict[str, List[int]]]:
+        time_limit = min(EXACT_TIME_LIMIT, budget) if budget else EXACT_TIME_LIMIT
+        return self._solve_exact(problem.coords, problem.closed, problem.start_index, problem.end_index, problem.cancel_event,
+                                 problem.objective, problem.jump_range, time_limit, problem.progress_callback, problem.distance_matrix)
+    def solve(self, problem: RouteProblem, budget: float = None, solver: str = None) -> SolverResult:
+        if budget is None:
+            budget = self._time_budget()
+        if problem.n <= 2:
+            tour = list(range(problem.n)) if problem.closed else open_path_tour(np.arange(problem.n), problem.start_index, problem.end_index).tolist()
+            tours = {'distance': tour, 'jumps': tour} if problem.objective == 'jumps' else {'distance': tour}
+            self._performance_stats['solver_mode'] = 'trivial'
+            return SolverResult(tours, 'trivial', 0.0)
+        result = self.solver_registry.solve(problem, budget, None if solver in (None, 'auto') else solver,
+                                            self._memory_budget(problem.n))
+        self._performance_stats['solver_mode'] = result.solver
+        self._performance_stats['solver_attempts'] = result.attempts
+        return result
+    def _solve_exact(self, coords: np.ndarray, closed: bool = True, start_index: int = None, end_index: int = None,
+                     cancel_event: threading.Event = None, objective: str = 'distance', jump_range: float = None,
+                     time_limit: float = EXACT_TIME_LIMIT, progress_callback: Callable[[str, float], None] = None,
+                     distance_matrix: np.ndarray = None) -> Optional[Dict[str, List[int]]]:
+        start = time.time()
+        n = len(coords)
+        self._emit_progress(progress_callback, 'tsp_start', None)
+        if distance_matrix is None:
+            distance_matrix = self.calculate_distance_matrix(coords)
+        distance_matrix = np.asarray(distance_matrix, dtype=np.float64)
+        costs = {'distance': distance_matrix}
+        if objective == 'jumps':
+            costs['jumps'] = jump_cost_matrix(distance_matrix, jump_range).astype(np.float64)
+        method = 'held_karp' if n <= HELD_KARP_MAX_NODES else 'branch_and_bound'
+        tours = {}
+        for name, cost in costs.items():
+            initial_tour = None
+            if n > HELD_KARP_MAX_NODES:
+                initial_tour = solve_tsp_candidate(coords, closed=closed, start_index=start_index, end_index=end_index,
+                                                   cancel_event=cancel_event, jump_range=jump_range if name == 'jumps' else None)
+            tour, optimal = solve_tsp_exact(cost, closed, start_index, end_index, initial_tour=initial_tour,
+                                            time_limit=max(0.0, time_limit - (time.time() - start)), cancel_event=cancel_event)
+            if not optimal:
+                self._performance_stats['exact'] = {'method': method, 'optimal': False, 'time': time.time() - start}
+                logger.info(f"Exact solver ({method}) did not finish within {time_limit:.1f}s; using heuristic solver")
+                return None
+            tours[name] = tour
+        elapsed = time.time() - start
+        self._performance_stats['exact'] = {'method': method, 'optimal': True, 'time': elapsed}
+        self._performance_stats['tsp_time'] = elapsed
+        logger.info(f"Exact {'tour' if closed else 'path'} ({method}, {n} systems): "
+                    f"{matrix_tour_length(distance_matrix, tours['distance'], closed):.2f} LY in {elapsed:.3f}s")
+        self._emit_progress(progress_callback, 'tsp_done', 1.0)
+        return tours
+    def _compare_path_modes(self, coords_array: np.ndarray, start_time: float, path_mode: str, start_index: int,
+                            route_totals: Dict[str, float], cancel_event: threading.Event = None, solver_mode: str = None,
+                            restarts: int = 1, objective: str = 'distance', jump_range: float = None):
+        stats = self._performance_stats.copy()
+        other_mode = 'closed' if path_mode == 'open' else 'open'
+        other_tours = self._solve_route(coords_array, start_time, other_mode, start_index, cancel_event=cancel_event,
+                                        solver_mode=solver_mode, restarts=restarts, objective=objective, jump_range=jump_range)
+        comparison = {
+            path_mode: dict(route_totals, tsp_time=stats['tsp_time']),
+            other_mode: dict(self._route_totals(coords_array, other_tours[objective], jump_range), tsp_time=self._performance_stats['tsp_time'])
+        }
+        self._performance_stats = stats
+        self._performance_stats['path_mode_comparison'] = comparison
+        for name, totals in comparison.items():
+            logger.info(f"Path mode {name}: {totals['total_distance']:.2f} LY, {totals['total_jumps']} jumps, TSP {totals['tsp_time']:.2f}s")
+    def _route_totals(self, coords_array: np.ndarray, permutation: List[int], jump_range: float) -> Dict[str, float]:
+        route_coords = coords_array[np.asarray(permutation, dtype=np.int64)]
+        legs = np.sqrt(np.sum(np.diff(route_coords, axis=0) ** 2, axis=1))
+        return {
+            'total_distance': float(np.sum(legs)),
+            'total_jumps': self.calculate_jumps(legs, jump_range)
+        }
     def calculate_jumps(self, distances: np.ndarray, jump_range: float) -> int:
         if len(distances) == 0:
             return 0
@@ -229,47 +891,37 @@ class RouteOptimizer:
         return total_jumps
     def check_csv_columns(self, file_path: str) -> Tuple[Dict[str, bool], List[str]]:
         try:
-            df = pd.read_csv(file_path, nrows=1)
+            columns = read_csv_columns(file_path)
             columns_status = {
-                'System Name': self.system_name_column in df.columns,
-                'Body Name': any(col in df.columns for col in ['Body Name', 'Name', 'BodyName', 'body_name']),
-                'X Coord': self.x_column in df.columns,
-                'Y Coord': self.y_column in df.columns,
-                'Z Coord': self.z_column in df.columns
+                'System Name': self.system_name_column in columns,
+                'Body Name': find_body_column(columns) is not None,
+                'X Coord': self.x_column in columns,
+                'Y Coord': self.y_column in columns,
+                'Z Coord': self.z_column in columns
             }
-            return columns_status, df.columns.tolist()
+            return columns_status, columns
         except Exception as e:
             logger.error(f"CSV column check error: {e}")
             return None, []
     def group_systems_and_bodies(self, df: pd.DataFrame) -> pd.DataFrame:
         if self.system_name_column not in df.columns:
             raise ValueError("CSV must contain a 'System Name' column for grouping.")
-        body_columns = ['Body Name', 'Name', 'BodyName', 'body_name']
-        body_column = next((col for col in body_columns if col in df.columns), None)
-        agg_dict = {
-            self.x_column: 'first',
-            self.y_column: 'first',
-            self.z_column: 'first'
-        }
-        if body_column:
-            agg_dict[body_column] = lambda x: [str(i) for i in x if pd.notna(i)]
-        else:
+        if not find_body_column(df.columns):
             logger.warning("No body name column found in CSV")
-        grouped_df = df.groupby(self.system_name_column, sort=False, as_index=False).agg(agg_dict)
-        if body_column:
-            grouped_df['Body_Names'] = grouped_df[body_column]
-            grouped_df['Body_Count'] = grouped_df['Body_Names'].apply(len)
-            grouped_df = grouped_df.drop(columns=[body_column])
-        else:
-            grouped_df['Body_Names'] = [[] for _ in range(len(grouped_df))]
-            grouped_df['Body_Count'] = 0
+        grouped_df = SurveyDataset.from_frame(None, None, df).grouped()
         logger.info(f"Systems grouped. Total unique systems: {len(grouped_df)}")
         return grouped_df
     def optimize_route(self, csv_path: str, jump_range: float,
                       starting_system_name: str = '',
                       existing_status: Dict[str, str] = None,
                       progress_callback: Callable[[str, float], None] = None,
-                      cancel_event: threading.Event = None) -> Dict[str, Any]:
+                      cancel_event: threading.Event = None,
+                      solver_mode: str = None,
+                      restarts: int = None,
+                      objective: str = None,
+                      path_mode: str = None,
+                      on_backup_complete: Callable[[str], None] = None,
+                      on_backup_error: Callable[[str, Exception], None] = None) -> Dict[str, Any]:
         self._reset_performance_stats()
         total_start_time = time.time()
         try:
@@ -278,151 +930,117 @@ class RouteOptimizer:
             if jump_range <= 0:
                 raise ValueError(f"Jump range must be positive, got {jump_range}")
             logger.info(f"Loading CSV: {csv_path}")
-            df = pd.read_csv(csv_path)
-            logger.info(f"CSV loaded: {len(df)} rows, columns: {df.columns.tolist()}")
+            load_start = time.time()
+            dataset = load_survey_dataset(csv_path, progress_callback=progress_callback, cancel_event=cancel_event)
+            self._performance_stats['load_time'] = time.time() - load_start
+            logger.info(f"CSV loaded: {dataset.row_count} rows, columns: {dataset.columns}")
             start_time = time.perf_counter()
             required_cols = {self.system_name_column, self.x_column, self.y_column, self.z_column}
-            if not required_cols.issubset(set(df.columns)):
-                missing = required_cols - set(df.columns)
+            if not required_cols.issubset(set(dataset.columns)):
+                missing = required_cols - set(dataset.columns)
                 raise ValueError(f"CSV missing required columns: {', '.join(missing)}")
-            df_grouped = self.group_systems_and_bodies(df)
-            logger.info(f"Grouping done: {len(df_grouped)} unique systems")
-            points = df_grouped[[self.system_name_column, self.x_column, self.y_column, self.z_column]].copy()
+            points = dataset.systems[[self.system_name_column, self.x_column, self.y_column, self.z_column]]
+            logger.info(f"Grouping done: {len(points)} unique systems")
             n_all = len(points)
-            recommended = self.get_recommended_method(n_all)
-            logger.info(f"Recommended distance matrix method for {n_all} points: {recommended}")
             if n_all < 2:
                 raise ValueError("At least two unique waypoints are required for routing.")
-            start_system_data = None
-            optimization_points = points.copy()
+            start_index = None
             original_starting_system_name = starting_system_name
             if starting_system_name:
                 starting_system_name_clean = starting_system_name.lower().strip()
-                mask = optimization_points[self.system_name_column].str.lower().str.strip() == starting_system_name_clean
-                matching_systems = optimization_points[mask]
-                if len(matching_systems) > 0:
-                    start_system_data = matching_systems.iloc[0]
-                    optimization_points = optimization_points[~mask].reset_index(drop=True)
+                mask = points[self.system_name_column].str.lower().str.strip() == starting_system_name_clean
+                matching_indices = np.flatnonzero(mask.to_numpy())
+                if len(matching_indices) > 0:
+                    start_index = int(matching_indices[0])
                     logger.info(f"Starting system '{starting_system_name}' found and set as route start")
                 else:
                     logger.warning(f"Starting system '{starting_system_name}' not found in CSV. Using auto-optimized start.")
-            if len(optimization_points) == 0:
-                raise ValueError("No systems left to optimize after removing starting system.")
-            coords_array = optimization_points[[self.x_column, self.y_column, self.z_column]].astype(np.float64).values
-            distance_matrix_opt = self.calculate_distance_matrix(coords_array, method='auto', progress_callback=progress_callback, cancel_event=cancel_event)
-            logger.info(f"Distance matrix shape: {distance_matrix_opt.shape}; time since start: {time.perf_counter() - start_time:.2f}s")
-            if progress_callback:
-                try:
-                    progress_callback('distance_matrix_done', 1.0)
-                except Exception:
-                    pass
-            if cancel_event and cancel_event.is_set():
-                raise RuntimeError('Optimization cancelled by user before TSP')
-            distance_matrix_opt = distance_matrix_opt.astype(np.float64)
-            logger.debug(f"Converted distance matrix to float64 for TSP solver (shape {distance_matrix_opt.shape})")
-            if len(distance_matrix_opt) > 1:
-                if progress_callback:
-                    try:
-                        progress_callback('tsp_start', None)
-                    except Exception:
-                        pass
-                logger.info(f"Starting TSP solver for {len(distance_matrix_opt)} nodes (timeout {getattr(self, 'tsp_timeout_seconds', 30)}s)")
-                permutation_opt, tsp_elapsed = self._solve_tsp_with_timeout(distance_matrix_opt)
-                optimized_names = optimization_points.iloc[permutation_opt][self.system_name_column].tolist()
-                self._performance_stats['tsp_time'] = tsp_elapsed
-                logger.info(f"TSP solver completed in {tsp_elapsed:.2f}s")
-                if progress_callback:
-                    try:
-                        progress_callback('tsp_done', 1.0)
-                    except Exception:
-                        pass
-            else:
-                optimized_names = optimization_points[self.system_name_column].tolist()
-                self._performance_stats['tsp_time'] = 0.0
-            if start_system_data is not None:
-                optimized_names.insert(0, start_system_data[self.system_name_column])
-            optimized_points_full = df[df[self.system_name_column].isin(optimized_names)]
-            
-            body_columns = ['Body Name', 'Name', 'BodyName', 'body_name']
-            body_column = next((col for col in body_columns if col in df.columns), None)
-            
-            if body_column:
-                system_bodies = df.groupby(self.system_name_column)[body_column].apply(list).to_dict()
+            coords_array = points[[self.x_column, self.y_column, self.z_column]].astype(np.float64).values
+            preview_start = time.time()
+            preview = self.space_filling_curve_route(coords_array, start_index)
+            self._performance_stats['preview_time'] = time.time() - preview_start
+            logger.info(f"Preview route: {self._route_totals(coords_array, preview, jump_range)['total_distance']:.2f} LY "
+                        f"in {self._performance_stats['preview_time']:.2f}s")
+            self._emit_progress(progress_callback, 'preview_route', None, {'preview_coords': coords_array[preview]})
+            objective = self.resolve_objective(objective)
+            path_mode = self.resolve_path_mode(path_mode)
+            restarts = max(1, int(restarts if restarts is not None else self.tsp_restarts))
+            if self.use_resource_governor:
+                plan = self.plan_resources(n_all, solver_mode, restarts)
+                self._resource_plan = plan
+                fixed = [start_index] if path_mode == 'closed' and start_index is not None else []
+                self._select_planned_solver(plan, RouteProblem(np.delete(coords_array, fixed, axis=0), path_mode == 'closed',
+                                                               None if fixed else start_index, None, objective, jump_range,
+                                                               restarts), solver_mode)
+                logger.info(f"Resource plan: {plan.summary()}")
+                for reason in plan.reasons:
+                    logger.info(f" - {reason}")
+                self._performance_stats['resource_plan'] = plan.to_dict()
+                self._emit_progress(progress_callback, 'resource_plan', None, {'plan': plan.to_dict(), 'summary': plan.summary()})
             else:
-                system_bodies = {}
+                logger.info(f"Recommended distance matrix method for {n_all} points: {self.get_recommended_method(n_all)}")
+            self._performance_stats['objective'] = objective
+            self._performance_stats['path_mode'] = path_mode
+            tours = self._solve_route_cached(coords_array, start_time, path_mode, start_index, progress_callback=progress_callback,
+                                             cancel_event=cancel_event, solver_mode=solver_mode, restarts=restarts,
+                                             objective=objective, jump_range=jump_range)
+            objective_totals = {name: self._route_totals(coords_array, tour, jump_range) for name, tour in tours.items()}
+            if objective == 'jumps':
+                jump_key = (objective_totals['jumps']['total_jumps'], objective_totals['jumps']['total_distance'])
+                distance_key = (objective_totals['distance']['total_jumps'], objective_totals['distance']['total_distance'])
+                if distance_key < jump_key:
+                    logger.info("Jump-optimized tour did not beat the distance tour on jumps; keeping the distance tour")
+                    tours['jumps'] = tours['distance']
+                    objective_totals['jumps'] = objective_totals['distance']
+                saved = objective_totals['distance']['total_jumps'] - objective_totals['jumps']['total_jumps']
+                extra = objective_totals['jumps']['total_distance'] - objective_totals['distance']['total_distance']
+                logger.info(f"Jump objective: {objective_totals['jumps']['total_jumps']} jumps vs {objective_totals['distance']['total_jumps']} "
+                            f"for the distance-optimized route ({saved} saved, {extra:+.2f} LY)")
+            if self.compare_path_modes:
+                self._compare_path_modes(coords_array, start_time, path_mode, start_index, objective_totals[objective],
+                                         cancel_event, solver_mode, restarts, objective, jump_range)
+            assembly_start = time.time()
+            order = np.asarray(tours[objective], dtype=np.int64)
+            if dataset.body_column is None:
                 logger.info("No body name column found - bodies will be empty")
-            
-            optimized_points_full = optimized_points_full.drop_duplicates(self.system_name_column).copy()
-            optimized_points_full['Body_Names'] = optimized_points_full[self.system_name_column].map(
-                lambda x: system_bodies.get(x, [])
-            )
-            try:
-                name_to_index = {name: idx for idx, name in enumerate(optimized_names)}
-                optimized_points_full['order'] = optimized_points_full[self.system_name_column].map(name_to_index)
-                optimized_points_full = optimized_points_full.sort_values('order').drop(columns=['order'])
-            except KeyError as e:
-                missing_systems = [name for name in optimized_names if name not in optimized_points_full.index]
-                logger.warning(f"Some systems not found during reordering: {missing_systems}")
-                found_names = [name for name in optimized_names if name in optimized_points_full.index]
-                optimized_points_full = optimized_points_full.set_index(self.system_name_column).loc[found_names].reset_index()
-                optimized_names = found_names
-            if len(optimized_points_full) > 1:
-                coords_values = optimized_points_full[[self.x_column, self.y_column, self.z_column]].values
-                route_distances = np.sqrt(
-                    np.sum(np.diff(coords_values, axis=0) ** 2, axis=1)
-                ).tolist()
-            else:
-                route_distances = []
-            optimized_route_length = float(np.sum(route_distances)) if route_distances else 0.0
-            total_jumps = self.calculate_jumps(np.array(route_distances), jump_range)
-            optimized_points_full['Status'] = optimized_points_full[self.system_name_column].map(
-                lambda x: existing_status.get(x, STATUS_UNVISITED)
-            )
-            route_data = []
-            records = optimized_points_full.to_dict('records')
-            for rec in records:
-                coords = [
-                    float(rec.get(self.x_column, 0) or 0),
-                    float(rec.get(self.y_column, 0) or 0),
-                    float(rec.get(self.z_column, 0) or 0)
-                ]
-                bodies = rec.get('Body_Names', [])
-                if not isinstance(bodies, list):
-                    bodies = []
-                route_data.append({
-                    'name': rec[self.system_name_column],
-                    'status': rec['Status'],
-                    'coords': coords,
-                    'bodies_to_scan': bodies,
-                    'body_count': int(rec.get('Body_Count', 0))
-                })
+            optimized_points_full = dataset.systems.iloc[order].reset_index(drop=True)
+            route_bodies = dataset.body_names.views(order)
+            optimized_points_full['Body_Names'] = route_bodies
+            optimized_names = optimized_points_full[self.system_name_column].tolist()
+            route_coords = coords_array[order]
+            route_distances = np.sqrt(np.sum(np.diff(route_coords, axis=0) ** 2, axis=1))
+            optimized_route_length = float(route_distances.sum())
+            total_jumps = self.calculate_jumps(route_distances, jump_range)
+            statuses = optimized_points_full[self.system_name_column].map(existing_status).fillna(STATUS_UNVISITED)
+            optimized_points_full['Status'] = statuses
+            route_statuses = statuses.tolist()
+            route_data = [
+                {'name': name, 'status': status, 'coords': coords, 'bodies_to_scan': bodies, 'body_count': count}
+                for name, status, coords, bodies, count in zip(optimized_names, route_statuses, route_coords.tolist(),
+                                                               route_bodies, dataset.body_counts[order].tolist())
+            ]
+            status_data = [{'name': name, 'status': status} for name, status in zip(optimized_names, route_statuses)]
+            self._performance_stats['assembly_time'] = time.time() - assembly_start
+            logger.info(f"Route assembly for {len(order)} systems: {self._performance_stats['assembly_time']:.3f}s")
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             backup_folder_name = f"Route_{len(optimized_names)}_sys_{timestamp}"
             from edmrn.config import Paths
             backup_folder_path = Path(Paths.get_backup_folder()) / backup_folder_name
             backup_folder_path.mkdir(parents=True, exist_ok=True)
-            csv_filename = "optimized_route.csv"
-            csv_path_backup = backup_folder_path / csv_filename
-            optimized_points_full.to_csv(csv_path_backup, index=False)
-            logger.info(f"Optimized CSV backed up to {csv_path_backup}; time since start: {time.perf_counter() - start_time:.2f}s")
-            status_data = []
-            for _, row in optimized_points_full.iterrows():
-                system_name = row[self.system_name_column]
-                current_status = existing_status.get(system_name, STATUS_UNVISITED) if existing_status else STATUS_UNVISITED
-                status_data.append({
-                    'name': system_name,
-                    'status': current_status
-                })
-            status_path = backup_folder_path / "route_status.json"
-            with open(status_path, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Route status saved to {status_path}; time since start: {time.perf_counter() - start_time:.2f}s")
-            logger.info(f"Route saved to backup folder: {backup_folder_name}")
+            persistence = get_persistence_worker()
+            persistence.submit(backup_folder_path, {
+                'optimized_route.csv': csv_writer(optimized_points_full),
+                'route_status.json': json_writer(status_data)
+            }, on_complete=on_backup_complete, on_error=on_backup_error)
+            if not self.write_behind:
+                persistence.flush(backup_folder_path)
+            logger.info(f"Route backup queued for {backup_folder_name}; time since start: {time.perf_counter() - start_time:.2f}s")
             total_time = time.time() - total_start_time
             self._performance_stats['processing_time'] = total_time
             logger.info(f"Optimization completed in {total_time:.2f} seconds")
             logger.info(f" - Distance matrix: {self._performance_stats['distance_matrix_time']:.2f}s")
             logger.info(f" - TSP: {self._performance_stats['tsp_time']:.2f}s")
+            logger.info(f" - Route assembly: {self._performance_stats['assembly_time']:.2f}s")
             logger.info(f" - Total: {total_time:.2f}s")
             return {
                 'success': True,
@@ -434,6 +1052,8 @@ class RouteOptimizer:
                 'starting_system': original_starting_system_name if original_starting_system_name else 'Auto',
                 'backup_folder': str(backup_folder_path),
                 'backup_name': backup_folder_name,
+                'objective': objective,
+                'objective_totals': objective_totals,
                 'performance_stats': self._performance_stats.copy()
             }
         except ValueError as e:
@@ -452,19 +1072,23 @@ class RouteOptimizer:
                 'num_systems': 0,
                 'performance_stats': self._performance_stats.copy()
             }
+        finally:
+            self._resource_plan = None
     def estimate_memory_usage(self, n_points: int, dtype: str = 'float32') -> float:
         bytes_per_element = 4 if dtype == 'float32' else 8
         total_elements = n_points * n_points
         memory_bytes = total_elements * bytes_per_element
         return memory_bytes / (1024 * 1024)
     def get_recommended_method(self, n_points: int) -> str:
-        memory_mb = self.estimate_memory_usage(n_points)
+        plan = self._plan_for(n_points)
+        if plan is not None:
+            return plan.distance_method
         if n_points <= 2000:
             return 'scipy'
-        elif memory_mb <= 2000:
+        elif n_points <= CONDENSED_DISTANCE_MIN_POINTS:
             return 'vectorized'
         else:
-            return 'chunked'
+            return 'condensed'
     def validate_coordinates(self, coords: np.ndarray) -> bool:
         if not isinstance(coords, np.ndarray):
             return False
@@ -479,18 +1103,5 @@ def quick_optimize(csv_path: str, jump_range: float = 70.0,
     return optimizer.optimize_route(csv_path, jump_range, starting_system)
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-        print(f"Testing optimizer with: {csv_file}")
-        optimizer = RouteOptimizer()
-        result = optimizer.optimize_route(csv_file, jump_range=70.0)
-        if result['success']:
-            print(f"✓ Optimization successful!")
-            print(f" Systems: {result['num_systems']}")
-            print(f" Distance: {result['total_distance']:.2f} LY")
-            print(f" Jumps: {result['total_jumps']}")
-            print(f" Output: {result['output_file']}")
-        else:
-            print(f"✗ Optimization failed: {result['error']}")
-    else:
-        print("Usage: python optimizer.py <csv_file>")
+    from edmrn.optimize import main
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from edmrn.logger import get_logger
+logger = get_logger('Persistence')
+FLUSH_TIMEOUT = 30.0
+
+def csv_writer(df) -> Callable[[str], None]:
+    def write(path: str):
+        df.to_csv(path, index=False)
+    return write
+
+def json_writer(data: Any, indent: Optional[int] = 2) -> Callable[[str], None]:
+    def write(path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+    return write
+
+def write_atomic(path: Path, write: Callable[[str], None]):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class PersistenceWorker:
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._queue: List[str] = []
+        self._active = None
+        self._thread = None
+        self._closed = False
+    def submit(self, folder, files: Dict[str, Callable[[str], None]],
+               on_complete: Callable[[str], None] = None,
+               on_error: Callable[[str, Exception], None] = None):
+        folder = str(Path(folder))
+        with self._condition:
+            if self._closed:
+                job = None
+            else:
+                job = self._pending.get(folder)
+                if job is None:
+                    job = {'files': {}, 'on_complete': [], 'on_error': [], 'submitted': time.time()}
+                    self._pending[folder] = job
+                    self._queue.append(folder)
+                else:
+                    logger.debug(f"Coalescing pending writes for {Path(folder).name}: {', '.join(files)}")
+                job['files'].update(files)
+                if on_complete:
+                    job['on_complete'].append(on_complete)
+                if on_error:
+                    job['on_error'].append(on_error)
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+                    self._thread.start()
+                self._condition.notify_all()
+                return
+        self._process(folder, {'files': dict(files), 'on_complete': [on_complete] if on_complete else [],
+                               'on_error': [on_error] if on_error else [], 'submitted': time.time()})
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                folder = self._queue.pop(0)
+                job = self._pending.pop(folder)
+                self._active = folder
+            try:
+                self._process(folder, job)
+            finally:
+                with self._condition:
+                    self._active = None
+                    self._condition.notify_all()
+    def _process(self, folder: str, job: Dict[str, Any]):
+        start = time.time()
+        try:
+            path = Path(folder)
+            path.mkdir(parents=True, exist_ok=True)
+            for name, write in job['files'].items():
+                write_atomic(path / name, write)
+        except Exception as e:
+            logger.error(f"Failed to write {', '.join(job['files'])} to {folder}: {e}")
+            for callback in job['on_error']:
+                try:
+                    callback(folder, e)
+                except Exception:
+                    pass
+            return
+        logger.info(f"Wrote {', '.join(job['files'])} to {Path(folder).name} in {time.time() - start:.2f}s "
+                    f"({time.time() - job['submitted']:.2f}s after submit)")
+        for callback in job['on_complete']:
+            try:
+                callback(folder)
+            except Exception:
+                pass
+    def is_pending(self, folder=None) -> bool:
+        with self._condition:
+            return self._is_pending(folder)
+    def _is_pending(self, folder=None) -> bool:
+        if folder is None:
+            return bool(self._queue) or self._active is not None
+        folder = str(Path(folder))
+        return folder in self._pending or self._active == folder
+    def flush(self, folder=None, timeout: float = FLUSH_TIMEOUT) -> bool:
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            while self._is_pending(folder):
+                if threading.current_thread() is self._thread:
+                    return False
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"Timed out waiting for pending writes to {folder or 'backup folders'}")
+                    return False
+                self._condition.wait(remaining)
+        return True
+    def shutdown(self, timeout: float = FLUSH_TIMEOUT):
+        self.flush(timeout=timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+_persistence_worker = None
+_persistence_worker_lock = threading.Lock()
+
+def get_persistence_worker() -> PersistenceWorker:
+    global _persistence_worker
+    with _persistence_worker_lock:
+        if _persistence_worker is None:
+            _persistence_worker = PersistenceWorker()
+            atexit.register(_persistence_worker.shutdown)
+        return _persistence_worker
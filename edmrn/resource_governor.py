@@ -0,0 +1,255 @@
+import copy
+import json
+import math
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import psutil
+from edmrn.config import AppConfig
+from edmrn.distance_store import default_thread_count
+from edmrn.logger import get_logger
+from edmrn.solver_registry import rank_by_estimate
+from edmrn.utils import atomic_write_json
+logger = get_logger('ResourceGovernor')
+COST_MODEL_VERSION = 1
+COST_MODEL_FILE = 'cost_model.json'
+PLAN_METHODS = ('matrix', 'candidate', 'cluster')
+MEMORY_BUDGET_FRACTION = 0.5
+FALLBACK_AVAILABLE_MEMORY = 2 * 1024 ** 3
+SCIPY_MAX_POINTS = 2000
+REPRESENTATION_BYTES_PER_PAIR = {'scipy': 12, 'vectorized': 40, 'chunked': 8, 'condensed': 2}
+MAX_BLOCK_BYTES = 32 * 1024 ** 2
+MIN_BLOCK_ELEMENTS = 1 << 16
+WORKER_PROCESS_BYTES = 96 * 1024 ** 2
+DEFAULT_TIME_BUDGET = 30.0
+MIN_TIME_BUDGET = 10.0
+MAX_TIME_BUDGET = 60.0
+TIME_BUDGET_MARGIN = 1.5
+CONVERGED_BUDGET_FRACTION = 0.9
+EXPONENT_LIMITS = (0.8, 2.5)
+DEFAULT_COST_MODEL = {
+    'version': COST_MODEL_VERSION,
+    'source': 'default',
+    'cpu_count': 1,
+    'distance_pair_seconds': 3.5e-8,
+    'methods': {
+        'matrix': {'time_coef': 4.5e-6, 'time_exponent': 1.44, 'bytes_per_point': 2000, 'gap': 0.173},
+        'candidate': {'time_coef': 3.4e-5, 'time_exponent': 1.11, 'bytes_per_point': 1500, 'gap': 0.154},
+        'cluster': {'time_coef': 6.0e-5, 'time_exponent': 1.06, 'bytes_per_point': 1500, 'gap': 0.157}
+    }
+}
+
+@dataclass
+class ResourcePlan:
+    n_points: int
+    cpu_count: int
+    total_memory: int
+    available_memory: int
+    memory_budget: int
+    solver_mode: str
+    distance_method: str
+    distance_backing: str
+    block_elements: int
+    chunk_size: int
+    workers: int
+    distance_threads: int
+    time_budget: float
+    estimated_time: float
+    estimated_memory: int
+    cost_model: str
+    estimates: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    reasons: List[str] = field(default_factory=list)
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    def summary(self) -> str:
+        return (f"{self.n_points} systems on {self.cpu_count} CPUs with {self.available_memory / 1024 ** 3:.1f} GB free: "
+                f"{self.solver_mode} solver, {self.distance_method} distances in {self.distance_backing}, "
+                f"{self.workers} workers x {self.distance_threads} threads, {self.block_elements} elements per block, "
+                f"{self.time_budget:.0f}s budget; estimated {self.estimated_time:.1f}s and "
+                f"{self.estimated_memory / 1024 ** 2:.0f} of {self.memory_budget / 1024 ** 2:.0f} MB")
+
+def cost_model_path() -> Path:
+    return Path(AppConfig.get_app_data_path()) / COST_MODEL_FILE
+
+def load_cost_model(path=None) -> Dict[str, Any]:
+    path = Path(path) if path else cost_model_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            model = json.load(f)
+        if model.get('version') == COST_MODEL_VERSION and all(method in model.get('methods', {}) for method in PLAN_METHODS):
+            return model
+        logger.warning(f"Ignoring cost model {path}: unsupported version or missing methods")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read cost model {path}: {e}")
+    return copy.deepcopy(DEFAULT_COST_MODEL)
+
+def save_cost_model(model: Dict[str, Any], path=None) -> Path:
+    path = Path(path) if path else cost_model_path()
+    if not atomic_write_json(path, model):
+        raise OSError(f"Could not write cost model {path}")
+    return path
+
+def _fit_power_law(samples: List[Tuple[float, float]], exponent: float) -> Optional[Tuple[float, float]]:
+    samples = [(n, seconds) for n, seconds in samples if n > 1 and seconds > 0]
+    if not samples:
+        return None
+    x = np.log([n for n, _ in samples])
+    y = np.log([seconds for _, seconds in samples])
+    if len(np.unique(x)) >= 2:
+        exponent = float(np.clip(np.polyfit(x, y, 1)[0], *EXPONENT_LIMITS))
+    return float(np.exp(np.mean(y - exponent * x))), exponent
+
+def calibrate_cost_model(report: Dict[str, Any], base: Dict[str, Any] = None) -> Dict[str, Any]:
+    model = copy.deepcopy(base or DEFAULT_COST_MODEL)
+    cpu_count = max(1, int(report.get('platform', {}).get('cpu_count') or 1))
+    budget = report.get('settings', {}).get('time_budget')
+    cases = [case for case in report.get('results', []) if case.get('valid_tour') and case.get('n')]
+    pair_seconds = [case['distance_matrix_time'] * cpu_count / (case['n'] * (case['n'] - 1) / 2)
+                    for case in cases if case['method'] == 'matrix' and case['n'] >= 1000 and case.get('distance_matrix_time')]
+    if pair_seconds:
+        model['distance_pair_seconds'] = float(np.median(pair_seconds))
+    for method in PLAN_METHODS:
+        runs = [case for case in cases if case['method'] == method]
+        if not runs:
+            continue
+        params = model['methods'][method]
+        converged = [case for case in runs if not budget or case['tsp_time'] < budget * CONVERGED_BUDGET_FRACTION]
+        samples = []
+        for case in converged:
+            parallel = min(cpu_count, case.get('cluster_count') or 1) if method == 'cluster' else 1
+            samples.append((case['n'], case['tsp_time'] * parallel))
+        fit = _fit_power_law(samples, params['time_exponent'])
+        if fit is not None:
+            params['time_coef'], params['time_exponent'] = fit
+        per_point = []
+        for case in runs:
+            representation = REPRESENTATION_BYTES_PER_PAIR.get(case.get('distance_method'), 0) * case['n'] ** 2 if method == 'matrix' else 0
+            per_point.append(max(0, case['peak_rss_delta'] - representation) / case['n'])
+        params['bytes_per_point'] = float(np.median(per_point))
+        gaps = [case['gap'] for case in runs if case.get('gap') is not None]
+        if gaps:
+            params['gap'] = float(np.mean(gaps))
+    model['cpu_count'] = cpu_count
+    model['source'] = f"benchmark {report.get('revision') or 'unknown'} {report.get('timestamp', '')}".strip()
+    return model
+
+def system_resources() -> Dict[str, int]:
+    try:
+        memory = psutil.virtual_memory()
+        total, available = int(memory.total), int(memory.available)
+    except Exception:
+        total = available = FALLBACK_AVAILABLE_MEMORY
+    return {'cpu_count': default_thread_count(), 'total_memory': total, 'available_memory': available}
+
+class ResourceGovernor:
+    def __init__(self, cost_model: Dict[str, Any] = None, memory_fraction: float = MEMORY_BUDGET_FRACTION):
+        self.cost_model = cost_model or load_cost_model()
+        self.memory_fraction = memory_fraction
+    def distance_method(self, n_points: int, memory_budget: int, threads: int) -> Tuple[str, str]:
+        pairs = n_points * n_points
+        if n_points <= SCIPY_MAX_POINTS and REPRESENTATION_BYTES_PER_PAIR['scipy'] * pairs <= memory_budget:
+            return 'scipy', 'memory'
+        if REPRESENTATION_BYTES_PER_PAIR['chunked'] * pairs <= memory_budget:
+            return 'chunked', 'memory'
+        backing = 'shared_memory' if REPRESENTATION_BYTES_PER_PAIR['condensed'] * pairs <= memory_budget else 'memmap'
+        return 'condensed', backing
+    def block_elements(self, memory_budget: int, threads: int) -> int:
+        target = min(MAX_BLOCK_BYTES, memory_budget // (20 * max(1, threads))) // 8
+        return max(MIN_BLOCK_ELEMENTS, 1 << int(math.log2(max(1, target))))
+    def estimate(self, method: str, n_points: int, workers: int = 1, threads: int = 1, distance_method: str = 'condensed',
+                 cluster_max_size: int = None, restarts: int = 1) -> Dict[str, float]:
+        params = self.cost_model['methods'][method]
+        tsp_seconds = params['time_coef'] * n_points ** params['time_exponent']
+        memory = params['bytes_per_point'] * n_points
+        distance_seconds = 0.0
+        if method == 'matrix':
+            distance_seconds = n_points * (n_points - 1) / 2 * self.cost_model['distance_pair_seconds'] / max(1, threads)
+            memory += REPRESENTATION_BYTES_PER_PAIR[distance_method] * n_points * n_points
+            if restarts > 1:
+                tsp_seconds *= math.ceil(restarts / max(1, workers))
+                memory += (min(restarts, workers) - 1) * WORKER_PROCESS_BYTES
+        elif method == 'cluster':
+            clusters = math.ceil(n_points / cluster_max_size) if cluster_max_size else 1
+            tsp_seconds /= max(1, min(workers, clusters))
+            memory += (min(workers, clusters) - 1) * WORKER_PROCESS_BYTES
+        return {'distance_seconds': distance_seconds, 'tsp_seconds': tsp_seconds,
+                'total_seconds': distance_seconds + tsp_seconds, 'memory': memory, 'gap': params['gap']}
+    def plan(self, n_points: int, solver_mode: str = None, time_budget: float = None, restarts: int = 1,
+             cluster_max_size: int = None, distance_threads: int = None, resources: Dict[str, int] = None) -> ResourcePlan:
+        resources = resources or system_resources()
+        cpu_count = max(1, resources['cpu_count'])
+        memory_budget = int(resources['available_memory'] * self.memory_fraction)
+        threads = max(1, min(distance_threads or cpu_count, cpu_count))
+        reasons = []
+        distance_method, backing = self.distance_method(n_points, memory_budget, threads)
+        block_elements = self.block_elements(memory_budget, threads)
+        memory_workers = (memory_budget - self.cost_model['methods']['cluster']['bytes_per_point'] * n_points) // WORKER_PROCESS_BYTES
+        workers = int(max(1, min(cpu_count, memory_workers)))
+        if workers < cpu_count:
+            reasons.append(f"solver pool limited to {workers} workers by the memory budget")
+        estimates = {method: self.estimate(method, n_points, workers, threads, distance_method, cluster_max_size, restarts)
+                     for method in PLAN_METHODS}
+        limit = time_budget or MAX_TIME_BUDGET
+        if solver_mode in PLAN_METHODS:
+            mode = solver_mode
+            reasons.append(f"solver mode {mode} requested")
+        else:
+            fitting = [method for method in PLAN_METHODS if estimates[method]['memory'] <= memory_budget]
+            for method in PLAN_METHODS:
+                if method not in fitting:
+                    reasons.append(f"{method} needs ~{estimates[method]['memory'] / 1024 ** 2:.0f} MB, over the "
+                                   f"{memory_budget / 1024 ** 2:.0f} MB budget")
+            if not fitting:
+                mode = 'cluster'
+                reasons.append("no method fits the memory budget; cluster keeps the smallest working set")
+            else:
+                converging = [method for method in fitting if estimates[method]['total_seconds'] <= limit]
+                for method in fitting:
+                    if method not in converging:
+                        reasons.append(f"{method} needs ~{estimates[method]['total_seconds']:.0f}s, over {limit:.0f}s")
+                preferred = {'matrix'} if restarts > 1 else None
+                mode = rank_by_estimate({method: estimates[method] for method in fitting}, limit, preferred=preferred)[0]
+                if preferred and mode in preferred:
+                    reasons.append(f"{restarts} restarts need the matrix solver")
+                reasons.append(f"{mode} has the best expected gap ({estimates[mode]['gap'] * 100:.1f}%) "
+                               f"for its cost among {', '.join(converging or fitting)}")
+        estimate = estimates[mode]
+        if time_budget:
+            budget = float(time_budget)
+        else:
+            budget = float(min(MAX_TIME_BUDGET, max(MIN_TIME_BUDGET, estimate['tsp_seconds'] * TIME_BUDGET_MARGIN)))
+            reasons.append(f"time budget {budget:.0f}s from an estimated {estimate['tsp_seconds']:.1f}s search")
+        return ResourcePlan(
+            n_points=n_points,
+            cpu_count=cpu_count,
+            total_memory=resources['total_memory'],
+            available_memory=resources['available_memory'],
+            memory_budget=memory_budget,
+            solver_mode=mode,
+            distance_method=distance_method,
+            distance_backing=backing,
+            block_elements=block_elements,
+            chunk_size=int(math.isqrt(block_elements // 4)),
+            workers=workers,
+            distance_threads=threads,
+            time_budget=budget,
+            estimated_time=estimate['distance_seconds'] + min(estimate['tsp_seconds'], budget),
+            estimated_memory=int(estimate['memory']),
+            cost_model=self.cost_model.get('source', 'default'),
+            estimates=estimates,
+            reasons=reasons
+        )
+
+_resource_governor = None
+_resource_governor_lock = threading.Lock()
+
+def get_resource_governor() -> ResourceGovernor:
+    global _resource_governor
+    with _resource_governor_lock:
+        if _resource_governor is None:
+            _resource_governor = ResourceGovernor()
+        return _resource_governor
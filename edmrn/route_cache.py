@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from edmrn.config import AppConfig
+from edmrn.logger import get_logger
+from edmrn.utils import atomic_write_json
+logger = get_logger('RouteCache')
+ROUTE_CACHE_VERSION = 2
+ROUTE_CACHE_FOLDER = 'route_cache'
+ROUTE_CACHE_INDEX = 'index.json'
+ROUTE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+ROUTE_CACHE_MAX_ENTRIES = 64
+ORPHAN_GRACE_SECONDS = 300
+NEAR_HIT_MIN_CHANGES = 16
+NEAR_HIT_MAX_CHANGE_FRACTION = 0.05
+NEAR_HIT_MAX_CANDIDATES = 8
+_HASH_MULTIPLIERS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+
+def coordinate_row_keys(coords: np.ndarray) -> np.ndarray:
+    bits = np.ascontiguousarray(coords, dtype=np.float64).view(np.uint64)
+    keys = np.zeros(len(bits), dtype=np.uint64)
+    for axis, multiplier in enumerate(_HASH_MULTIPLIERS):
+        keys ^= bits[:, axis] * multiplier
+        keys = (keys << np.uint64(13)) | (keys >> np.uint64(51))
+    return keys
+
+def coordinates_digest(coords: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(coords, dtype=np.float64).tobytes()).hexdigest()
+
+def settings_digest(settings: Dict[str, Any]) -> str:
+    payload = json.dumps(dict(settings, version=ROUTE_CACHE_VERSION), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def entry_key(coords: np.ndarray, settings: Dict[str, Any]) -> str:
+    return f"{settings_digest(settings)[:24]}_{coordinates_digest(coords)[:40]}"
+
+def allowed_changes(n: int) -> int:
+    return max(NEAR_HIT_MIN_CHANGES, int(n * NEAR_HIT_MAX_CHANGE_FRACTION))
+
+class RouteCache:
+    def __init__(self, folder: str = None, max_bytes: int = ROUTE_CACHE_MAX_BYTES,
+                 max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        self.folder = Path(folder) if folder else Path(AppConfig.get_app_data_path()) / ROUTE_CACHE_FOLDER
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+    def _meta_path(self, key: str) -> Path:
+        return self.folder / f"{key}.json"
+    def _entry_path(self, key: str) -> Path:
+        return self.folder / f"{key}.npz"
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        if not self.folder.is_dir():
+            return entries
+        for path in self.folder.glob('*.json'):
+            if path.name == ROUTE_CACHE_INDEX or path.name.startswith('.'):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta.get('version') == ROUTE_CACHE_VERSION:
+                entries[path.stem] = meta
+        return entries
+    def _write_meta(self, key: str, meta: Dict[str, Any]):
+        if not atomic_write_json(self._meta_path(key), dict(meta, version=ROUTE_CACHE_VERSION)):
+            logger.warning(f"Could not write route cache entry metadata {key}")
+    def _remove_entry(self, key: str):
+        for path in (self._meta_path(key), self._entry_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    def _read_entry(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        try:
+            with np.load(self._entry_path(key), allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except Exception as e:
+            logger.warning(f"Dropping unreadable route cache entry {key}: {e}")
+            self._remove_entry(key)
+            return None
+    def _touch(self, key: str, meta: Dict[str, Any]):
+        self._write_meta(key, dict(meta, last_used=time.time()))
+    def lookup(self, coords: np.ndarray, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        settings_key = settings_digest(settings)
+        key = entry_key(coords, settings)
+        with self._lock:
+            entries = self._load_index()
+            if key in entries:
+                data = self._read_entry(key)
+                if data is not None:
+                    self._touch(key, entries[key])
+                    tours = {name[5:]: data[name].astype(np.int64) for name in data if name.startswith('tour_')}
+                    return {'exact': True, 'tours': tours, 'added': np.empty(0, dtype=np.int64), 'removed': 0}
+            n = len(coords)
+            limit = allowed_changes(n)
+            candidates = sorted((entry for entry in entries.items()
+                                 if entry[1]['settings'] == settings_key and abs(entry[1]['n'] - n) <= limit),
+                                key=lambda entry: entry[1]['last_used'], reverse=True)[:NEAR_HIT_MAX_CANDIDATES]
+            if not candidates:
+                return None
+            row_keys = coordinate_row_keys(coords)
+            order = np.argsort(row_keys, kind='stable')
+            sorted_keys = row_keys[order]
+            if np.any(sorted_keys[1:] == sorted_keys[:-1]):
+                return None
+            best = None
+            for candidate_key, _ in candidates:
+                data = self._read_entry(candidate_key)
+                if data is None:
+                    continue
+                cached_keys = data['row_keys']
+                slot = np.minimum(np.searchsorted(sorted_keys, cached_keys), n - 1)
+                found = sorted_keys[slot] == cached_keys
+                mapping = np.where(found, order[slot], -1)
+                present = np.zeros(n, dtype=bool)
+                present[mapping[found]] = True
+                removed = int(np.count_nonzero(~found))
+                added = np.flatnonzero(~present)
+                changes = removed + len(added)
+                if changes <= limit and (best is None or changes < best['changes']):
+                    tours = {name[5:]: mapping[data[name].astype(np.int64)] for name in data if name.startswith('tour_')}
+                    best = {'exact': False, 'tours': tours, 'added': added, 'removed': removed,
+                            'changes': changes, 'key': candidate_key}
+            if best is not None:
+                best_key = best.pop('key')
+                self._touch(best_key, entries[best_key])
+            return best
+    def store(self, coords: np.ndarray, settings: Dict[str, Any], tours: Dict[str, List[int]]):
+        settings_key = settings_digest(settings)
+        key = entry_key(coords, settings)
+        arrays = {f"tour_{name}": np.asarray(tour, dtype=np.int32) for name, tour in tours.items()}
+        arrays['row_keys'] = coordinate_row_keys(coords)
+        with self._lock:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            path = self._entry_path(key)
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix=f".{key}.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self._write_meta(key, {'settings': settings_key, 'n': len(coords), 'size': path.stat().st_size,
+                                   'last_used': time.time()})
+            self._evict(self._load_index())
+    def _evict(self, entries: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        for path in list(self.folder.glob('*.npz')) + list(self.folder.glob('.*.tmp')) + [self.folder / ROUTE_CACHE_INDEX]:
+            if path.suffix == '.npz' and path.stem in entries:
+                continue
+            try:
+                if now - path.stat().st_mtime > ORPHAN_GRACE_SECONDS:
+                    path.unlink()
+                    logger.debug(f"Removed orphaned route cache file {path.name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove orphaned route cache file {path.name}: {e}")
+        total = sum(entry['size'] for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes and len(entries) <= self.max_entries:
+                break
+            try:
+                self._remove_entry(key)
+            except OSError as e:
+                logger.warning(f"Could not remove route cache entry {key}: {e}")
+                continue
+            total -= entry['size']
+            del entries[key]
+            logger.debug(f"Evicted route cache entry {key}")
+    def clear(self):
+        with self._lock:
+            if not self.folder.is_dir():
+                return
+            for path in list(self.folder.glob('*.npz')) + list(self.folder.glob('*.json')) + list(self.folder.glob('.*.tmp')):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+_route_cache = None
+_route_cache_lock = threading.Lock()
+
+def get_route_cache() -> RouteCache:
+    global _route_cache
+    with _route_cache_lock:
+        if _route_cache is None:
+            _route_cache = RouteCache()
+        return _route_cache
@@ -8,6 +8,7 @@ from edmrn.tracker import STATUS_VISITED, STATUS_SKIPPED, STATUS_UNVISITED
 from edmrn.gui import ProcessingDialog, InfoDialog, ErrorDialog
 from edmrn.minimap import MiniMapFrame, MiniMapFrameFallback
 from edmrn.logger import get_logger
+from edmrn.persistence import csv_writer, get_persistence_worker
 from edmrn.visit_history import get_history_manager
 from edmrn.visit_history_dialog import VisitedSystemsDialog
 logger = get_logger('RouteManagement')
@@ -193,9 +194,34 @@ class RouteManagement:
         self.app.run_button.configure(state='disabled', text="Optimizing...")
         cancel_event = threading.Event()
         dialog = ProcessingDialog(self.app, on_cancel=lambda: cancel_event.set())
-        def progress_callback(stage: str, fraction: float = None):
+        def progress_callback(stage: str, fraction: float = None, details: dict = None):
             try:
-                if fraction is None:
+                if details and 'preview_coords' in details:
+                    preview_coords = details['preview_coords']
+                    def show_preview():
+                        if getattr(self.app, 'map_frame', None) and hasattr(self.app.map_frame, 'plot_preview'):
+                            self.app.map_frame.plot_preview(preview_coords)
+                        dialog.update("Preview route ready, optimizing…", None)
+                    self.app.root.after(0, show_preview)
+                elif details and 'plan' in details:
+                    plan = details['plan']
+                    message = (f"Planned {plan['solver_mode']} solver, {plan['workers']} workers, "
+                               f"{plan['time_budget']:.0f}s budget")
+                    self.app.root.after(0, lambda: dialog.update(message, None))
+                elif details and 'elapsed' in details:
+                    if cancel_event.is_set():
+                        message = "Cancelling…"
+                    elif 'clusters' in details:
+                        message = f"Solving clusters {details['clusters_done']}/{details['clusters']}"
+                    elif 'best_length' in details:
+                        message = f"Solving route… best {details['best_length']:,.0f} LY"
+                    else:
+                        message = "Solving route…"
+                    message += f" · {details['elapsed']:.0f}s of {details['budget']:.0f}s"
+                    if 'iterations' in details:
+                        message += f" · {details['iterations']:,} checks"
+                    self.app.root.after(0, lambda: dialog.update(message, fraction))
+                elif fraction is None:
                     self.app.root.after(0, lambda: dialog.update(stage.replace('_', ' ').capitalize(), None))
                 else:
                     self.app.root.after(0, lambda: dialog.update(stage.replace('_', ' ').capitalize(), fraction))
@@ -222,7 +248,8 @@ class RouteManagement:
                 route_data = self.app.route_manager.get_route()
                 for route in route_data:
                     existing_status[route['name']] = route['status']
-                result = self.app.route_optimizer.optimize_route(csv_path, jump_range, starting_system_name, existing_status, progress_callback=progress_callback, cancel_event=cancel_event)
+                result = self.app.route_optimizer.optimize_route(csv_path, jump_range, starting_system_name, existing_status, progress_callback=progress_callback, cancel_event=cancel_event,
+                                                                 on_backup_error=lambda folder, e: self.app.root.after(0, lambda: self.app._log(f"Backup write failed for {Path(folder).name}: {e}")))
                 def finish():
                     try:
                         dialog.close()
@@ -263,9 +290,7 @@ class RouteManagement:
                                     'Body_Count': item.get('body_count', 0)
                                 })
                             if rows:
-                                csv_path = Path(result['backup_folder']) / 'current_route.csv'
-                                df = pd.DataFrame(rows)
-                                df.to_csv(csv_path, index=False)
+                                get_persistence_worker().submit(result['backup_folder'], {'current_route.csv': csv_writer(pd.DataFrame(rows))})
                         except Exception as e:
                             logger.error(f"Failed to write filtered route CSV: {e}")
                         self.app.route_tracker.save_route_status(result['backup_folder'])
@@ -394,7 +419,7 @@ class RouteManagement:
                                     border_width=1,
                                     corner_radius=8)
         button_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
-        button_frame.columnconfigure((0, 1, 2, 3, 4), weight=1)
+        button_frame.columnconfigure((0, 1, 2, 3, 4, 5), weight=1)
         button_frame.rowconfigure(0, weight=1)
         button_frame.rowconfigure(1, weight=1)
         colors = self.app.theme_manager.get_theme_colors()
@@ -424,12 +449,17 @@ class RouteManagement:
                                       text_color=colors['text'], border_width=0,
                                       height=22, font=ctk.CTkFont(size=11, weight="bold"))
         quick_save_btn.grid(row=0, column=4, padx=3, pady=3, sticky="ew")
+        reoptimize_btn = ctk.CTkButton(button_frame, text="Reoptimize", command=self.reoptimize_remaining_threaded,
+                                      fg_color=colors['secondary'], hover_color=colors['secondary_hover'],
+                                      text_color=colors['text'], border_color=colors['primary'], border_width=1,
+                                      height=22, font=ctk.CTkFont(size=11))
+        reoptimize_btn.grid(row=0, column=5, padx=3, pady=3, sticky="ew")
         info_frame = ctk.CTkFrame(button_frame,
                                  fg_color=colors['frame'],
                                  border_color=colors['accent'],
                                  border_width=1,
                                  corner_radius=8)
-        info_frame.grid(row=1, column=0, columnspan=5, padx=5, pady=(2, 5), sticky="nsew")
+        info_frame.grid(row=1, column=0, columnspan=6, padx=5, pady=(2, 5), sticky="nsew")
         info_frame.columnconfigure(0, weight=1)
         self.app.stats_label = ctk.CTkLabel(info_frame,
                                        text="📊 Route Statistics | Total: 0.00 LY | Traveled: 0.00 LY | Average: 0.0 LY",
@@ -463,29 +493,7 @@ class RouteManagement:
         for i, item in enumerate(route_data):
             system_name = item.get('name', f"Unknown-{i}")
             status = item.get('status', STATUS_UNVISITED)
-            display_name = system_name
-            bodies_to_scan = item.get('bodies_to_scan', [])
-            if bodies_to_scan:
-                formatted_bodies = []
-                for body_name in bodies_to_scan:
-                    if not isinstance(body_name, str):
-                        body_name = str(body_name)
-                    if body_name.startswith(system_name):
-                        pattern = f"{system_name} "
-                        if body_name.startswith(pattern):
-                            body_display = body_name[len(pattern):]
-                        else:
-                            body_display = body_name.replace(system_name, "").strip()
-                    else:
-                        body_display = body_name
-                    formatted_bodies.append(body_display)
-                if formatted_bodies:
-                    all_bodies = " > ".join(formatted_bodies)
-                    max_display_length = 100
-                    if len(all_bodies) > max_display_length:
-                        all_bodies = all_bodies[:80] + "..."
-                    display_name = f"{display_name} → {all_bodies}"
-            label = ctk.CTkLabel(self.app.scroll_frame, text=f"{i+1}. {display_name}",
+            label = ctk.CTkLabel(self.app.scroll_frame, text=self._format_system_label(i, item),
                                 anchor="w", justify="left", cursor="hand2",
                                 font=ctk.CTkFont(family="Segoe UI", size=13, underline=False),
                                 fg_color="transparent",
@@ -505,6 +513,89 @@ class RouteManagement:
             threading.Thread(target=plot_in_background, daemon=True).start()
         self.update_route_statistics()
         self.update_progress_info()
+    def _format_system_label(self, index, item):
+        system_name = item.get('name', f"Unknown-{index}")
+        display_name = system_name
+        bodies_to_scan = item.get('bodies_to_scan', [])
+        if bodies_to_scan:
+            formatted_bodies = []
+            for body_name in bodies_to_scan:
+                if not isinstance(body_name, str):
+                    body_name = str(body_name)
+                if body_name.startswith(system_name):
+                    pattern = f"{system_name} "
+                    if body_name.startswith(pattern):
+                        body_display = body_name[len(pattern):]
+                    else:
+                        body_display = body_name.replace(system_name, "").strip()
+                else:
+                    body_display = body_name
+                formatted_bodies.append(body_display)
+            if formatted_bodies:
+                all_bodies = " > ".join(formatted_bodies)
+                max_display_length = 100
+                if len(all_bodies) > max_display_length:
+                    all_bodies = all_bodies[:80] + "..."
+                display_name = f"{display_name} → {all_bodies}"
+        return f"{index+1}. {display_name}"
+    def reoptimize_remaining_threaded(self):
+        if self.app._optimization_in_progress:
+            self.app._log("Optimization already in progress")
+            return
+        if not self.app.route_manager.get_route():
+            self.app._log("INFO: No route loaded. Nothing to reoptimize.")
+            return
+        self.app._optimization_in_progress = True
+        def reoptimize():
+            current_coords = None
+            try:
+                if getattr(self.app, 'journal_monitor', None):
+                    current_coords = self.app.journal_monitor.get_current_coordinates()
+            except Exception:
+                pass
+            try:
+                result = self.app.route_tracker.reoptimize_remaining(current_coords)
+            except Exception as e:
+                logger.error(f"Remaining route reoptimization failed: {e}")
+                result = None
+            def finish():
+                self.app._optimization_in_progress = False
+                if not result:
+                    self.app._log("INFO: Not enough remaining systems to reoptimize.")
+                    return
+                if result['changed']:
+                    self.refresh_route_order()
+                    self.app._log(f"Remaining route reoptimized: {result['before']:.2f} -> {result['after']:.2f} LY "
+                                  f"({result['systems']} systems, {result['time']:.2f}s)")
+                else:
+                    self.app._log("INFO: Remaining route is already optimal for the current position.")
+            self.app.root.after(0, finish)
+        threading.Thread(target=reoptimize, daemon=True).start()
+    def refresh_route_order(self):
+        route_data = self.app.route_manager.get_route()
+        if not route_data or not getattr(self.app, 'system_labels', None):
+            return
+        for label in self.app.system_labels.values():
+            label.pack_forget()
+        for i, item in enumerate(route_data):
+            label = self.app.system_labels.get(item.get('name'))
+            if label is None:
+                continue
+            label.configure(text=self._format_system_label(i, item))
+            label.pack(fill="x", padx=10, pady=2)
+        if self.app.map_frame and route_data and 'coords' in route_data[0]:
+            self.app.map_frame.clear()
+            def plot_in_background():
+                try:
+                    self.app.map_frame.plot_route(route_data)
+                except Exception as e:
+                    logger.error(f"Map plot error: {e}")
+            threading.Thread(target=plot_in_background, daemon=True).start()
+        self.update_route_statistics()
+        self.update_progress_info()
+        if hasattr(self.app, 'current_backup_folder') and self.app.current_backup_folder:
+            self.app.route_tracker.save_route_status(self.app.current_backup_folder)
+        self.copy_next_system_to_clipboard()
     def handle_system_click_manual(self, system_name):
         if self.app.map_frame:
             self.app.map_frame.highlight_system(system_name)
@@ -0,0 +1,159 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set
+import numpy as np
+from edmrn.logger import get_logger
+logger = get_logger('SolverRegistry')
+CAPABILITIES = ('open_path', 'fixed_ends', 'jumps', 'restarts', 'time_budget', 'cancel', 'progress', 'optimal')
+GAP_TOLERANCE = 0.01
+MIN_REMAINING_BUDGET = 1.0
+
+@dataclass
+class RouteProblem:
+    coords: np.ndarray
+    closed: bool = False
+    start_index: Optional[int] = None
+    end_index: Optional[int] = None
+    objective: str = 'distance'
+    jump_range: Optional[float] = None
+    restarts: int = 1
+    progress_callback: Optional[Callable[..., None]] = None
+    cancel_event: Optional[threading.Event] = None
+    distance_matrix: Optional[np.ndarray] = None
+    def __post_init__(self):
+        self.coords = np.asarray(self.coords, dtype=np.float64)
+        if self.distance_matrix is not None and self.distance_matrix.shape != (self.n, self.n):
+            raise ValueError(f"Distance matrix shape {self.distance_matrix.shape} does not match {self.n} systems")
+    @property
+    def n(self) -> int:
+        return len(self.coords)
+    def requirements(self) -> Set[str]:
+        required = set()
+        if not self.closed:
+            required.add('open_path')
+        if self.start_index is not None or self.end_index is not None:
+            required.add('fixed_ends')
+        if self.objective == 'jumps':
+            required.add('jumps')
+        return required
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+@dataclass
+class SolverSpec:
+    name: str
+    solve: Callable[[RouteProblem, float], Optional[Dict[str, List[int]]]]
+    estimate: Callable[[RouteProblem, float], Dict[str, float]]
+    complexity: str
+    capabilities: FrozenSet[str]
+    min_points: int = 0
+    max_points: Optional[int] = None
+    description: str = ''
+    def missing(self, problem: RouteProblem) -> Set[str]:
+        return problem.requirements() - self.capabilities
+    def supports(self, problem: RouteProblem) -> bool:
+        if problem.n < self.min_points or (self.max_points is not None and problem.n > self.max_points):
+            return False
+        return not self.missing(problem)
+
+@dataclass
+class SolverResult:
+    tours: Dict[str, List[int]]
+    solver: str
+    elapsed: float
+    attempts: List[Dict[str, Any]] = field(default_factory=list)
+
+def rank_by_estimate(estimates: Dict[str, Dict[str, float]], limit: float = None, memory_budget: float = None,
+                     preferred: Set[str] = None, gap_tolerance: float = GAP_TOLERANCE) -> List[str]:
+    def seconds(name):
+        return estimates[name]['total_seconds']
+    fitting = [name for name in estimates if memory_budget is None or estimates[name].get('memory', 0) <= memory_budget]
+    converging = [name for name in fitting if not limit or seconds(name) <= limit]
+    if preferred and any(name in preferred for name in converging):
+        pools = [[name for name in converging if name in preferred], [name for name in converging if name not in preferred]]
+    else:
+        pools = [converging]
+    ranked = []
+    for pool in pools:
+        while pool:
+            best_gap = min(estimates[name]['gap'] for name in pool)
+            choice = min((name for name in pool if estimates[name]['gap'] <= best_gap + gap_tolerance), key=seconds)
+            ranked.append(choice)
+            pool.remove(choice)
+    ranked += sorted((name for name in fitting if name not in converging), key=seconds)
+    ranked += sorted((name for name in estimates if name not in fitting), key=lambda name: estimates[name].get('memory', 0))
+    return ranked
+
+class SolverRegistry:
+    def __init__(self):
+        self._solvers: Dict[str, SolverSpec] = {}
+        self._lock = threading.Lock()
+    def register(self, spec: SolverSpec, replace: bool = False):
+        unknown = set(spec.capabilities) - set(CAPABILITIES)
+        if unknown:
+            raise ValueError(f"Unknown solver capabilities for {spec.name}: {', '.join(sorted(unknown))}")
+        with self._lock:
+            if spec.name in self._solvers and not replace:
+                raise ValueError(f"Solver already registered: {spec.name}")
+            self._solvers[spec.name] = spec
+        logger.debug(f"Registered solver {spec.name} ({spec.complexity}; {', '.join(sorted(spec.capabilities))})")
+    def unregister(self, name: str):
+        with self._lock:
+            self._solvers.pop(name, None)
+    def get(self, name: str) -> SolverSpec:
+        with self._lock:
+            if name not in self._solvers:
+                raise ValueError(f"Unknown solver: {name}")
+            return self._solvers[name]
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._solvers)
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'name': spec.name, 'complexity': spec.complexity, 'capabilities': sorted(spec.capabilities),
+                     'min_points': spec.min_points, 'max_points': spec.max_points, 'description': spec.description}
+                    for spec in self._solvers.values()]
+    def rank(self, problem: RouteProblem, budget: float = None, memory_budget: float = None) -> List[SolverSpec]:
+        with self._lock:
+            capable = [spec for spec in self._solvers.values() if spec.supports(problem)]
+        if not capable:
+            raise ValueError(f"No registered solver supports {problem.n} systems with {', '.join(sorted(problem.requirements())) or 'no requirements'}")
+        estimates = {spec.name: spec.estimate(problem, budget) for spec in capable}
+        preferred = {spec.name for spec in capable if 'restarts' in spec.capabilities} if problem.restarts > 1 else None
+        order = rank_by_estimate(estimates, budget, memory_budget, preferred)
+        specs = {spec.name: spec for spec in capable}
+        logger.debug(f"Solver ranking for {problem.n} systems within {budget}s: " + ", ".join(
+            f"{name} (~{estimates[name]['total_seconds']:.2f}s, gap {estimates[name]['gap'] * 100:.1f}%)" for name in order))
+        return [specs[name] for name in order]
+    def select(self, problem: RouteProblem, budget: float = None, memory_budget: float = None) -> SolverSpec:
+        return self.rank(problem, budget, memory_budget)[0]
+    def solve(self, problem: RouteProblem, budget: float = None, solver: str = None,
+              memory_budget: float = None) -> SolverResult:
+        start = time.time()
+        if solver:
+            spec = self.get(solver)
+            missing = spec.missing(problem)
+            if missing:
+                raise ValueError(f"Solver {solver} does not support {', '.join(sorted(missing))}")
+            specs = [other for other in self.rank(problem, budget, memory_budget) if other.name != spec.name]
+            if spec.supports(problem):
+                specs.insert(0, spec)
+            else:
+                logger.warning(f"Solver {solver} handles {spec.min_points}-{spec.max_points} systems, not {problem.n}; "
+                               f"using {specs[0].name}")
+        else:
+            specs = self.rank(problem, budget, memory_budget)
+        attempts = []
+        for spec in specs:
+            if problem.cancelled():
+                raise RuntimeError('Optimization cancelled by user before TSP')
+            remaining = max(MIN_REMAINING_BUDGET, budget - (time.time() - start)) if budget else budget
+            logger.info(f"Solving {problem.n} systems with the {spec.name} solver ({spec.complexity}, budget {remaining or 0:.1f}s)")
+            attempt_start = time.time()
+            tours = spec.solve(problem, remaining)
+            attempts.append({'solver': spec.name, 'time': time.time() - attempt_start, 'solved': tours is not None})
+            if tours is not None:
+                return SolverResult(tours, spec.name, time.time() - start, attempts)
+            logger.info(f"Solver {spec.name} gave no route for {problem.n} systems; trying the next solver")
+        raise RuntimeError(f"No solver produced a route for {problem.n} systems")
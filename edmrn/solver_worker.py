@@ -0,0 +1,485 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from python_tsp.heuristics import solve_tsp_lin_kernighan
+from edmrn.distance_store import CondensedDistanceMatrix, attach_shared_memory
+from edmrn.logger import get_logger
+from edmrn.tsp_solvers import (IMPROVEMENT_REPORT_INTERVAL, hilbert_curve_order, matrix_candidate_graph, matrix_greedy_edge_tour, matrix_local_search,
+                               matrix_nearest_neighbor_tour, matrix_tour_length, open_path_tour,
+                               rotate_to_start, solve_tsp_candidate)
+logger = get_logger('SolverWorker')
+TOUR_MESSAGE = '__TOUR__'
+DONE_MESSAGE = '__DONE__'
+PROGRESS_MESSAGE = '__PROGRESS__'
+ERROR_MESSAGE = '__ERROR__'
+LK_POLISH_MAX_NODES = 60
+CANCEL_GRACE_SECONDS = 2.0
+_POLL_INTERVAL = 0.05
+MULTI_START_STRATEGIES = ('nearest_neighbor', 'greedy_edge', 'space_filling_curve')
+_pool_cancel_flag = None
+
+def _open_distance_matrix(task: Dict[str, Any]):
+    if task.get('condensed') is not None:
+        store = CondensedDistanceMatrix.attach(task['condensed'])
+        return store, store
+    shm = attach_shared_memory(task['shm_name'])
+    return np.ndarray(task['shape'], dtype=task['dtype'], buffer=shm.buf), shm
+
+def _run_anytime_solve(distance_matrix: np.ndarray, task_id: int, result_q, cancel_flag, time_limit: float,
+                       initial_tour: List[int] = None, closed: bool = True,
+                       start_index: int = None, end_index: int = None) -> Tuple[List[int], float]:
+    start = time.time()
+    def publish(tour):
+        result_q.put((TOUR_MESSAGE, task_id, tour.tolist(), matrix_tour_length(distance_matrix, tour, closed)))
+    def report(tour, steps, moves):
+        result_q.put((PROGRESS_MESSAGE, task_id, steps, moves))
+    if initial_tour is not None:
+        tour = np.asarray(initial_tour, dtype=np.int64)
+    elif isinstance(distance_matrix, CondensedDistanceMatrix):
+        tour = matrix_greedy_edge_tour(distance_matrix, cancel_event=cancel_flag)
+    else:
+        tour = matrix_nearest_neighbor_tour(distance_matrix, start_index or 0)
+    if not closed:
+        tour = open_path_tour(tour, start_index, end_index)
+    publish(tour)
+    remaining = max(0.01, time_limit - (time.time() - start)) if time_limit else None
+    tour = matrix_local_search(distance_matrix, tour, time_limit=remaining, cancel_event=cancel_flag, closed=closed,
+                               on_improve=publish, fixed_start=start_index is not None, fixed_end=end_index is not None,
+                               on_progress=report)
+    if not closed:
+        return tour.tolist(), matrix_tour_length(distance_matrix, tour, closed)
+    tour = rotate_to_start(tour, 0)
+    length = matrix_tour_length(distance_matrix, tour)
+    if 3 < len(tour) <= LK_POLISH_MAX_NODES and not cancel_flag.is_set():
+        permutation, lk_length = solve_tsp_lin_kernighan(np.asarray(distance_matrix), x0=tour.tolist())
+        if lk_length < length:
+            return list(permutation), float(lk_length)
+    return tour.tolist(), length
+
+def _solver_worker_main(task_q, result_q, cancel_flag):
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+        task_id = task['task_id']
+        handle = None
+        try:
+            distance_matrix, handle = _open_distance_matrix(task)
+            try:
+                tour, length = _run_anytime_solve(distance_matrix, task_id, result_q, cancel_flag, task['time_limit'],
+                                                  task.get('initial_tour'), task.get('closed', True),
+                                                  task.get('start_index'), task.get('end_index'))
+            finally:
+                del distance_matrix
+            result_q.put((DONE_MESSAGE, task_id, tour, length))
+        except Exception as e:
+            result_q.put((ERROR_MESSAGE, task_id, str(e)))
+        finally:
+            if handle is not None:
+                handle.close()
+
+def _copy_to_shared_memory(matrix: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+    try:
+        view = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)
+        view[...] = matrix
+        del view
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+def _share_distance_matrix(distance_matrix) -> Tuple[Dict[str, Any], Optional[shared_memory.SharedMemory]]:
+    if isinstance(distance_matrix, CondensedDistanceMatrix):
+        return {'condensed': distance_matrix.descriptor()}, None
+    matrix = np.ascontiguousarray(distance_matrix)
+    shm = _copy_to_shared_memory(matrix)
+    return {'shm_name': shm.name, 'shape': matrix.shape, 'dtype': matrix.dtype.str}, shm
+
+def _release_shared_copy(shm: Optional[shared_memory.SharedMemory]):
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+def _init_pool_worker(cancel_flag):
+    global _pool_cancel_flag
+    _pool_cancel_flag = cancel_flag
+
+def _multi_start_strategy(index: int, has_coords: bool) -> str:
+    if index < len(MULTI_START_STRATEGIES):
+        strategy = MULTI_START_STRATEGIES[index]
+        if strategy != 'space_filling_curve' or has_coords:
+            return strategy
+    return 'random_nearest_neighbor'
+
+def _initial_tour(strategy: str, distance_matrix: np.ndarray, coords: Optional[np.ndarray], neighbors: np.ndarray, seed: int,
+                  start_index: int = None) -> np.ndarray:
+    if strategy == 'greedy_edge':
+        return matrix_greedy_edge_tour(distance_matrix, neighbors, _pool_cancel_flag)
+    if strategy == 'space_filling_curve':
+        return hilbert_curve_order(coords)
+    if strategy == 'random_nearest_neighbor':
+        rng = np.random.default_rng(seed)
+        return matrix_nearest_neighbor_tour(distance_matrix, int(rng.integers(distance_matrix.shape[0])))
+    return matrix_nearest_neighbor_tour(distance_matrix, start_index or 0)
+
+def _multi_start_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.time()
+    distance_matrix, handle = _open_distance_matrix(task)
+    try:
+        try:
+            neighbors = matrix_candidate_graph(distance_matrix)
+            closed = task.get('closed', True)
+            start_index = task.get('start_index')
+            end_index = task.get('end_index')
+            tour = _initial_tour(task['strategy'], distance_matrix, task['coords'], neighbors, task['seed'], start_index)
+            if not closed:
+                tour = open_path_tour(tour, start_index, end_index)
+            initial_length = matrix_tour_length(distance_matrix, tour, closed)
+            remaining = max(0.01, task['time_limit'] - (time.time() - start)) if task['time_limit'] else None
+            tour = matrix_local_search(distance_matrix, tour, neighbors, time_limit=remaining, cancel_event=_pool_cancel_flag,
+                                       closed=closed, fixed_start=start_index is not None, fixed_end=end_index is not None)
+            if closed:
+                tour = rotate_to_start(tour, 0)
+            length = matrix_tour_length(distance_matrix, tour, closed)
+        finally:
+            del distance_matrix
+    finally:
+        handle.close()
+    return {
+        'worker': task['index'],
+        'pid': os.getpid(),
+        'strategy': task['strategy'],
+        'seed': task['seed'],
+        'initial_length': initial_length,
+        'length': length,
+        'time': time.time() - start,
+        'tour': tour.tolist()
+    }
+
+def _cluster_path_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.time()
+    tour = solve_tsp_candidate(task['coords'], time_limit=task['time_limit'], cancel_event=_pool_cancel_flag, closed=False,
+                               start_index=task['start_index'], end_index=task['end_index'])
+    return {
+        'cluster': task['cluster'],
+        'pid': os.getpid(),
+        'size': len(task['coords']),
+        'time': time.time() - start,
+        'tour': tour
+    }
+
+class SolverWorker:
+    def __init__(self):
+        self._ctx = multiprocessing.get_context('spawn')
+        self._process = None
+        self._task_q = None
+        self._result_q = None
+        self._cancel_flag = None
+        self._lock = threading.Lock()
+        self._task_counter = 0
+        self._abandoned_task = None
+    def _ensure_started(self):
+        if self._process is not None and self._process.is_alive():
+            self._drain_abandoned()
+            return
+        self._abandoned_task = None
+        self._task_q = self._ctx.Queue()
+        self._result_q = self._ctx.Queue()
+        self._cancel_flag = self._ctx.Event()
+        process = self._ctx.Process(target=_solver_worker_main,
+                                    args=(self._task_q, self._result_q, self._cancel_flag),
+                                    daemon=True)
+        process.start()
+        self._process = process
+        logger.info(f"Solver worker started (pid {self._process.pid})")
+    def _drain_abandoned(self):
+        if self._abandoned_task is None:
+            return
+        deadline = time.time() + CANCEL_GRACE_SECONDS
+        while time.time() < deadline:
+            try:
+                message = self._result_q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    break
+                continue
+            if message[1] == self._abandoned_task and message[0] in (DONE_MESSAGE, ERROR_MESSAGE):
+                self._abandoned_task = None
+                return
+        logger.warning("Cancelled solver task did not stop in time; restarting the worker")
+        self._stop_process()
+        self._ensure_started()
+    def _stop_process(self):
+        self._abandoned_task = None
+        if self._process is None:
+            return
+        if self._process.pid is not None:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process.join()
+        self._process = None
+    def start(self):
+        with self._lock:
+            self._ensure_started()
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+    def shutdown(self):
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                if self._process.is_alive():
+                    self._task_q.put(None)
+                    self._process.join(timeout=2.0)
+            except Exception:
+                pass
+            self._stop_process()
+            logger.info("Solver worker stopped")
+    def solve(self, distance_matrix: np.ndarray, time_limit: float,
+              on_tour: Callable[[float, float], None] = None,
+              cancel_event: threading.Event = None,
+              initial_tour: List[int] = None, closed: bool = True,
+              start_index: int = None, end_index: int = None,
+              on_progress: Callable[[Dict[str, Any]], None] = None) -> Tuple[Optional[List[int]], float]:
+        with self._lock:
+            self._ensure_started()
+            self._cancel_flag.clear()
+            self._task_counter += 1
+            task_id = self._task_counter
+            shared, shm = _share_distance_matrix(distance_matrix)
+            best_tour = None
+            best_length = float('inf')
+            start = time.time()
+            try:
+                self._task_q.put({
+                    'task_id': task_id,
+                    **shared,
+                    'time_limit': time_limit,
+                    'initial_tour': list(initial_tour) if initial_tour is not None else None,
+                    'closed': closed,
+                    'start_index': start_index,
+                    'end_index': end_index
+                })
+                deadline = start + time_limit if time_limit else None
+                cancel_sent_at = None
+                while True:
+                    now = time.time()
+                    if cancel_sent_at is None:
+                        if cancel_event is not None and cancel_event.is_set():
+                            logger.info("Solver task cancelled; asking worker to stop")
+                            self._cancel_flag.set()
+                            self._abandoned_task = task_id
+                            break
+                        elif deadline is not None and now >= deadline:
+                            logger.warning(f"Solver task reached its {time_limit}s budget; asking worker to stop")
+                            self._cancel_flag.set()
+                            cancel_sent_at = now
+                    elif now - cancel_sent_at > CANCEL_GRACE_SECONDS:
+                        logger.warning("Solver worker did not stop in time; restarting it")
+                        self._stop_process()
+                        break
+                    try:
+                        message = self._result_q.get(timeout=_POLL_INTERVAL)
+                    except queue.Empty:
+                        if not self._process.is_alive():
+                            logger.error("Solver worker exited unexpectedly")
+                            self._process = None
+                            break
+                        continue
+                    kind, message_task = message[0], message[1]
+                    if message_task != task_id:
+                        continue
+                    if kind == ERROR_MESSAGE:
+                        logger.error(f"Solver worker error: {message[2]}")
+                        break
+                    if kind == PROGRESS_MESSAGE:
+                        if on_progress is not None:
+                            try:
+                                on_progress({'best_length': best_length, 'iterations': message[2], 'moves': message[3],
+                                             'elapsed': time.time() - start})
+                            except Exception:
+                                pass
+                        continue
+                    tour, length = message[2], message[3]
+                    if length < best_length:
+                        best_tour, best_length = tour, length
+                        if on_tour is not None:
+                            try:
+                                on_tour(best_length, time.time() - start)
+                            except Exception:
+                                pass
+                    if kind == DONE_MESSAGE:
+                        break
+            finally:
+                _release_shared_copy(shm)
+        return best_tour, best_length
+
+class SolverPool:
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._ctx = multiprocessing.get_context('spawn')
+        self._executor = None
+        self._cancel_flag = None
+        self._lock = threading.Lock()
+        self._abandoned = set()
+    def _drain_abandoned(self):
+        if not self._abandoned:
+            return
+        _, not_done = wait(self._abandoned, timeout=CANCEL_GRACE_SECONDS)
+        self._abandoned = set()
+        if not_done and self._executor is not None:
+            logger.warning("Cancelled solver pool tasks did not stop in time; restarting the pool")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    def _ensure_started(self):
+        self._drain_abandoned()
+        if self._executor is not None:
+            return
+        self._cancel_flag = self._ctx.Event()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._ctx,
+                                             initializer=_init_pool_worker, initargs=(self._cancel_flag,))
+        logger.info(f"Solver pool started with {self.max_workers} workers")
+    def resize(self, max_workers: int):
+        max_workers = max(1, int(max_workers))
+        with self._lock:
+            if max_workers == self.max_workers:
+                return
+            logger.info(f"Resizing solver pool from {self.max_workers} to {max_workers} workers")
+            self.max_workers = max_workers
+            if self._executor is not None:
+                self._drain_abandoned()
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True, cancel_futures=True)
+                    self._executor = None
+    def shutdown(self):
+        with self._lock:
+            if self._executor is None:
+                return
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Solver pool stopped")
+    def _run_tasks(self, fn: Callable[[Dict[str, Any]], Dict[str, Any]], tasks: List[Dict[str, Any]], time_limit: float,
+                   on_result: Callable[[Dict[str, Any]], None] = None,
+                   cancel_event: threading.Event = None,
+                   on_progress: Callable[[float], None] = None) -> List[Dict[str, Any]]:
+        results = []
+        start = time.time()
+        pending = {self._executor.submit(fn, task) for task in tasks}
+        deadline = start + time_limit if time_limit else None
+        next_progress = start + IMPROVEMENT_REPORT_INTERVAL
+        cancel_sent_at = None
+        while pending:
+            done, pending = wait(pending, timeout=_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Solver pool task error: {e}")
+                    continue
+                results.append(result)
+                if on_result is not None:
+                    try:
+                        on_result(result)
+                    except Exception:
+                        pass
+            now = time.time()
+            if on_progress is not None and pending and now >= next_progress:
+                try:
+                    on_progress(now - start)
+                except Exception:
+                    pass
+                next_progress = now + IMPROVEMENT_REPORT_INTERVAL
+            if cancel_sent_at is None:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("Solver pool cancelled; leaving running tasks to stop in the background")
+                    self._cancel_flag.set()
+                    for future in pending:
+                        future.cancel()
+                    self._abandoned = {future for future in pending if not future.done()}
+                    break
+                if deadline is not None and now >= deadline:
+                    logger.info("Solver pool stopping; collecting best tours so far")
+                    self._cancel_flag.set()
+                    cancel_sent_at = now
+                    for future in pending:
+                        future.cancel()
+            elif now - cancel_sent_at > CANCEL_GRACE_SECONDS:
+                logger.warning("Solver pool workers did not stop in time; restarting the pool")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                break
+        return results
+    def solve_multi_start(self, distance_matrix: np.ndarray, restarts: int, time_limit: float,
+                          coords: np.ndarray = None, seed: int = 0,
+                          on_result: Callable[[Dict[str, Any]], None] = None,
+                          cancel_event: threading.Event = None, closed: bool = True,
+                          start_index: int = None, end_index: int = None,
+                          on_progress: Callable[[float], None] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_started()
+            self._cancel_flag.clear()
+            shared, shm = _share_distance_matrix(distance_matrix)
+            try:
+                tasks = [{
+                    'index': index,
+                    'strategy': _multi_start_strategy(index, coords is not None),
+                    'seed': seed + index,
+                    **shared,
+                    'coords': coords,
+                    'time_limit': time_limit,
+                    'closed': closed,
+                    'start_index': start_index,
+                    'end_index': end_index
+                } for index in range(restarts)]
+                return self._run_tasks(_multi_start_task, tasks, time_limit, on_result, cancel_event, on_progress)
+            finally:
+                _release_shared_copy(shm)
+    def solve_clusters(self, coords: np.ndarray, clusters: List[np.ndarray], entries: List[Optional[int]],
+                       exits: List[Optional[int]], time_limit: float,
+                       on_result: Callable[[Dict[str, Any]], None] = None,
+                       cancel_event: threading.Event = None,
+                       on_progress: Callable[[float], None] = None) -> Dict[int, List[int]]:
+        task_limit = time_limit * min(1.0, self.max_workers / max(1, len(clusters))) if time_limit else time_limit
+        tasks = [{
+            'cluster': cluster,
+            'coords': coords[members],
+            'time_limit': task_limit,
+            'start_index': entries[cluster],
+            'end_index': exits[cluster]
+        } for cluster, members in enumerate(clusters)]
+        with self._lock:
+            self._ensure_started()
+            self._cancel_flag.clear()
+            results = self._run_tasks(_cluster_path_task, tasks, time_limit, on_result, cancel_event, on_progress)
+        return {result['cluster']: result['tour'] for result in results}
+
+_solver_worker = None
+_solver_worker_lock = threading.Lock()
+_solver_pool = None
+
+def get_solver_worker() -> SolverWorker:
+    global _solver_worker
+    with _solver_worker_lock:
+        if _solver_worker is None:
+            _solver_worker = SolverWorker()
+            atexit.register(_solver_worker.shutdown)
+        return _solver_worker
+
+def get_solver_pool() -> SolverPool:
+    global _solver_pool
+    with _solver_worker_lock:
+        if _solver_pool is None:
+            _solver_pool = SolverPool()
+            atexit.register(_solver_pool.shutdown)
+        return _solver_pool
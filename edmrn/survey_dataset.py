@@ -0,0 +1,355 @@
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from edmrn.config import AppConfig
+from edmrn.logger import get_logger
+logger = get_logger('SurveyDataset')
+SYSTEM_NAME_COLUMN = 'System Name'
+COORD_COLUMNS = ('X', 'Y', 'Z')
+BODY_NAME_COLUMNS = ('Body Name', 'Name', 'BodyName', 'body_name')
+SIDECAR_VERSION = 2
+SIDECAR_FOLDER = 'dataset_cache'
+MEMORY_CACHE_SIZE = 4
+INGEST_CHUNK_ROWS = 250000
+COORD_DTYPE = np.float32
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zip': 'zip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+_STRING_SEPARATOR = '\x00'
+
+def dataset_key(path: str) -> Tuple[str, int, int]:
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+def find_body_column(columns) -> Optional[str]:
+    return next((col for col in BODY_NAME_COLUMNS if col in columns), None)
+
+def csv_compression(path: str) -> Optional[str]:
+    return COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+def ingest_columns(columns) -> List[str]:
+    wanted = [SYSTEM_NAME_COLUMN, *COORD_COLUMNS, find_body_column(columns)]
+    return [col for col in wanted if col is not None and col in columns]
+
+def ingest_dtypes(columns) -> dict:
+    dtypes = {col: COORD_DTYPE for col in COORD_COLUMNS if col in columns}
+    if SYSTEM_NAME_COLUMN in columns:
+        dtypes[SYSTEM_NAME_COLUMN] = 'category'
+    body_column = find_body_column(columns)
+    if body_column:
+        dtypes[body_column] = str
+    return dtypes
+
+def _report_load_progress(progress_callback: Callable[[str, float], None], fraction: float):
+    if progress_callback:
+        try:
+            progress_callback('load_csv', min(1.0, fraction))
+        except Exception:
+            pass
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    if len(chunks) == 1:
+        return chunks[0]
+    names = None
+    if SYSTEM_NAME_COLUMN in chunks[0].columns:
+        names = union_categoricals([chunk[SYSTEM_NAME_COLUMN] for chunk in chunks])
+        chunks = [chunk.drop(columns=[SYSTEM_NAME_COLUMN]) for chunk in chunks]
+    df = pd.concat(chunks, ignore_index=True)
+    if names is not None:
+        df.insert(0, SYSTEM_NAME_COLUMN, names)
+    return df
+
+def read_survey_csv(path: str, columns: List[str] = None, progress_callback: Callable[[str, float], None] = None,
+                    cancel_event: threading.Event = None, chunk_rows: int = INGEST_CHUNK_ROWS,
+                    engine: str = None) -> pd.DataFrame:
+    header = read_csv_columns(path) if columns is None else columns
+    usecols = ingest_columns(header)
+    dtypes = ingest_dtypes(usecols)
+    compression = csv_compression(path)
+    if engine is None:
+        engine = 'pyarrow' if PYARROW_AVAILABLE else 'c'
+    _report_load_progress(progress_callback, 0.0)
+    if engine == 'pyarrow':
+        df = pd.read_csv(path, usecols=usecols, dtype=dtypes, compression=compression, engine='pyarrow')
+        _report_load_progress(progress_callback, 1.0)
+        return df
+    total = max(1, os.path.getsize(path))
+    chunks = []
+    with open(path, 'rb') as raw:
+        reader = pd.read_csv(raw, usecols=usecols, dtype=dtypes, compression=compression,
+                             chunksize=chunk_rows, engine=engine)
+        with reader:
+            for chunk in reader:
+                chunks.append(chunk)
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("CSV loading cancelled by user")
+                    raise RuntimeError("Optimization cancelled by user during CSV loading")
+                _report_load_progress(progress_callback, raw.tell() / total)
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=dtypes.get(col, object)) for col in usecols})
+    df = _concat_chunks(chunks)
+    _report_load_progress(progress_callback, 1.0)
+    return df
+
+def _pack_strings(values: List[str]) -> Tuple[str, np.ndarray]:
+    if not any(_STRING_SEPARATOR in value for value in values):
+        return 'joined', np.frombuffer(_STRING_SEPARATOR.join(values).encode('utf-8'), dtype=np.uint8)
+    return 'array', np.array(values, dtype=str)
+
+def _unpack_strings(kind: str, packed: np.ndarray, count: int) -> List[str]:
+    if kind == 'array':
+        return packed.tolist()
+    if count == 0:
+        return []
+    return packed.tobytes().decode('utf-8').split(_STRING_SEPARATOR)
+
+class BodyList(Sequence):
+    __slots__ = ('_values', '_lo', '_hi')
+    def __init__(self, values: np.ndarray, lo: int, hi: int):
+        self._values = values
+        self._lo = lo
+        self._hi = hi
+    def __len__(self) -> int:
+        return self._hi - self._lo
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._values[self._lo:self._hi][index].tolist()
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('body index out of range')
+        return self._values[self._lo + index]
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values[self._lo:self._hi])
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (BodyList, list, tuple)):
+            return self.tolist() == list(other)
+        return NotImplemented
+    def __repr__(self) -> str:
+        return repr(self.tolist())
+    def tolist(self) -> List[str]:
+        return self._values[self._lo:self._hi].tolist()
+
+class BodyNames:
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        self.values = values
+        self.offsets = offsets
+    @classmethod
+    def empty(cls, systems: int) -> 'BodyNames':
+        return cls(np.empty(0, dtype=object), np.zeros(systems + 1, dtype=np.int64))
+    @classmethod
+    def from_codes(cls, codes: np.ndarray, values: np.ndarray, systems: int) -> 'BodyNames':
+        order = np.argsort(codes, kind='stable')
+        values = values[order]
+        if pd.api.types.infer_dtype(values, skipna=False) != 'string':
+            values = np.array([str(value) for value in values], dtype=object)
+        return cls(values, cls._offsets(np.bincount(codes, minlength=systems)))
+    @classmethod
+    def from_counts(cls, values: List[str], counts: np.ndarray) -> 'BodyNames':
+        flat = np.empty(len(values), dtype=object)
+        flat[:] = values
+        return cls(flat, cls._offsets(counts))
+    @staticmethod
+    def _offsets(counts: np.ndarray) -> np.ndarray:
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+    @property
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    def __getitem__(self, system: int) -> BodyList:
+        return BodyList(self.values, int(self.offsets[system]), int(self.offsets[system + 1]))
+    def __iter__(self) -> Iterator[BodyList]:
+        bounds = self.offsets.tolist()
+        return (BodyList(self.values, lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]))
+    def views(self, order: np.ndarray = None) -> np.ndarray:
+        bounds = self.offsets.tolist()
+        systems = range(len(self)) if order is None else np.asarray(order).tolist()
+        return np.fromiter((BodyList(self.values, bounds[i], bounds[i + 1]) for i in systems), dtype=object, count=len(systems))
+    def to_lists(self) -> List[List[str]]:
+        return [bodies.tolist() for bodies in self]
+
+class SurveyDataset:
+    def __init__(self, path: str, key: Tuple[str, int, int], columns: List[str], systems: pd.DataFrame,
+                 body_names: BodyNames, row_count: int):
+        self.path = path
+        self.key = key
+        self.columns = columns
+        self.systems = systems
+        self.body_names = body_names
+        self.row_count = row_count
+        self.body_column = find_body_column(columns)
+    @property
+    def has_names(self) -> bool:
+        return SYSTEM_NAME_COLUMN in self.columns
+    @property
+    def has_coordinates(self) -> bool:
+        return all(col in self.columns for col in COORD_COLUMNS)
+    @property
+    def names(self) -> pd.Series:
+        return self.systems[SYSTEM_NAME_COLUMN]
+    @property
+    def body_counts(self) -> np.ndarray:
+        return self.body_names.counts
+    def coords(self) -> np.ndarray:
+        return self.systems[list(COORD_COLUMNS)].astype(np.float64).to_numpy()
+    def grouped(self) -> pd.DataFrame:
+        grouped = self.systems[[SYSTEM_NAME_COLUMN, *COORD_COLUMNS]].copy()
+        grouped['Body_Names'] = self.body_names.to_lists()
+        grouped['Body_Count'] = self.body_counts
+        return grouped
+    @classmethod
+    def from_frame(cls, path: str, key: Tuple[str, int, int], df: pd.DataFrame, columns: List[str] = None) -> 'SurveyDataset':
+        columns = df.columns.tolist() if columns is None else list(columns)
+        if SYSTEM_NAME_COLUMN not in df.columns:
+            return cls(path, key, columns, df.iloc[:0].copy(), BodyNames.empty(0), len(df))
+        codes, uniques = pd.factorize(df[SYSTEM_NAME_COLUMN], sort=False)
+        named = codes >= 0
+        _, first_rows = np.unique(codes[named], return_index=True)
+        systems = df.iloc[np.flatnonzero(named)[first_rows]].reset_index(drop=True)
+        if isinstance(systems[SYSTEM_NAME_COLUMN].dtype, pd.CategoricalDtype):
+            systems[SYSTEM_NAME_COLUMN] = systems[SYSTEM_NAME_COLUMN].astype(str)
+        coord_columns = [col for col in COORD_COLUMNS if col in df.columns]
+        if coord_columns:
+            firsts = df[coord_columns].groupby(codes, sort=True).first()
+            systems[coord_columns] = firsts.loc[firsts.index >= 0].to_numpy()
+        body_names = BodyNames.empty(len(uniques))
+        body_column = find_body_column(df.columns)
+        if body_column:
+            keep = named & df[body_column].notna().to_numpy()
+            body_names = BodyNames.from_codes(codes[keep], df[body_column].to_numpy(dtype=object)[keep], len(uniques))
+        return cls(path, key, columns, systems, body_names, len(df))
+    def save(self, sidecar_path: Path):
+        arrays = {}
+        column_meta = []
+        for i, column in enumerate(self.systems.columns):
+            series = self.systems[column]
+            if not (pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)):
+                nulls = series.isna().to_numpy()
+                kind, packed = _pack_strings(series.where(~nulls, '').astype(str).tolist())
+                arrays[f'col{i}'] = packed
+                arrays[f'null{i}'] = nulls
+                column_meta.append({'name': column, 'kind': kind})
+            else:
+                arrays[f'col{i}'] = np.asarray(series.to_numpy())
+                column_meta.append({'name': column, 'kind': 'native'})
+        flat = self.body_names.values.tolist()
+        body_kind, arrays['body_values'] = _pack_strings(flat)
+        arrays['body_counts'] = self.body_counts
+        meta = {
+            'version': SIDECAR_VERSION,
+            'key': list(self.key),
+            'columns': self.columns,
+            'system_columns': column_meta,
+            'row_count': self.row_count,
+            'systems': len(self.systems),
+            'bodies': len(flat),
+            'body_kind': body_kind
+        }
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+        sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = sidecar_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, sidecar_path)
+    @classmethod
+    def load(cls, sidecar_path: Path, key: Tuple[str, int, int]) -> Optional['SurveyDataset']:
+        with np.load(sidecar_path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != SIDECAR_VERSION or tuple(meta.get('key', ())) != tuple(key):
+                return None
+            n = meta['systems']
+            systems = {}
+            for i, column in enumerate(meta['system_columns']):
+                if column['kind'] == 'native':
+                    systems[column['name']] = data[f'col{i}']
+                    continue
+                values = np.array(_unpack_strings(column['kind'], data[f'col{i}'], n), dtype=object)
+                values[data[f'null{i}']] = np.nan
+                systems[column['name']] = values
+            flat = _unpack_strings(meta['body_kind'], data['body_values'], meta['bodies'])
+            counts = data['body_counts']
+        body_names = BodyNames.from_counts(flat, counts)
+        return cls(key[0], key, meta['columns'], pd.DataFrame(systems, index=pd.RangeIndex(n)), body_names, meta['row_count'])
+
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+def sidecar_path_for(path: str) -> Path:
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return Path(AppConfig.get_app_data_path()) / SIDECAR_FOLDER / f"{digest}.npz"
+
+def get_cached_dataset(path: str) -> Optional[SurveyDataset]:
+    try:
+        key = dataset_key(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        dataset = _memory_cache.get(key)
+        if dataset is not None:
+            _memory_cache.move_to_end(key)
+        return dataset
+
+def load_survey_dataset(path: str, use_sidecar: bool = True, progress_callback: Callable[[str, float], None] = None,
+                        cancel_event: threading.Event = None) -> SurveyDataset:
+    dataset = get_cached_dataset(path)
+    if dataset is not None:
+        return dataset
+    with _load_lock:
+        dataset = get_cached_dataset(path)
+        if dataset is not None:
+            return dataset
+        return _load_uncached(path, use_sidecar, progress_callback, cancel_event)
+
+def _load_uncached(path: str, use_sidecar: bool, progress_callback: Callable[[str, float], None] = None,
+                   cancel_event: threading.Event = None) -> SurveyDataset:
+    key = dataset_key(path)
+    dataset = None
+    start = time.time()
+    sidecar = sidecar_path_for(path) if use_sidecar else None
+    if sidecar is not None and sidecar.exists():
+        try:
+            dataset = SurveyDataset.load(sidecar, key)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable dataset sidecar {sidecar}: {e}")
+        if dataset is not None:
+            logger.info(f"Dataset loaded from sidecar: {len(dataset.systems)} systems in {time.time() - start:.2f}s")
+    if dataset is None:
+        columns = read_csv_columns(path)
+        df = read_survey_csv(path, columns, progress_callback, cancel_event)
+        dataset = SurveyDataset.from_frame(path, key, df, columns)
+        logger.info(f"Dataset parsed: {dataset.row_count} rows, {len(dataset.systems)} systems in {time.time() - start:.2f}s")
+        if sidecar is not None:
+            try:
+                dataset.save(sidecar)
+            except Exception as e:
+                logger.warning(f"Could not write dataset sidecar {sidecar}: {e}")
+    with _cache_lock:
+        _memory_cache[key] = dataset
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return dataset
+
+def read_csv_columns(path: str) -> List[str]:
+    dataset = get_cached_dataset(path)
+    if dataset is not None:
+        return list(dataset.columns)
+    return pd.read_csv(path, nrows=0, compression=csv_compression(path)).columns.tolist()
+
+def clear_dataset_cache():
+    with _cache_lock:
+        _memory_cache.clear()
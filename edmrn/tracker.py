@@ -1,16 +1,21 @@
 import threading
 import json
 import math
+import time
 from pathlib import Path
+import numpy as np
 import customtkinter as ctk
 from edmrn.logger import get_logger
 from edmrn.config import AppConfig
 from edmrn.icons import Icons
 from edmrn.visit_history import get_history_manager
+from edmrn.persistence import get_persistence_worker, json_writer
+from edmrn.tsp_solvers import build_candidate_graph, candidate_local_search, tour_length
 logger = get_logger('Tracker')
 STATUS_VISITED = 'visited'
 STATUS_SKIPPED = 'skipped'
 STATUS_UNVISITED = 'unvisited'
+REOPTIMIZE_TIME_LIMIT = 0.8
 COLOR_VISITED = "#32B837"
 COLOR_SKIPPED = "#FF5D5D"
 COLOR_DEFAULT_TEXT = ('#E0E0E0', '#E0E0E0')
@@ -46,6 +51,11 @@ class ThreadSafeRouteManager:
                         return True
                     return False
             return False
+    def reorder_remaining(self, ordered_names):
+        with self._lock:
+            remaining = {item.get('name'): item for item in self._route if item.get('status') == STATUS_UNVISITED}
+            reordered = iter([remaining.pop(name) for name in ordered_names if name in remaining] + list(remaining.values()))
+            self._route = [next(reordered) if item.get('status') == STATUS_UNVISITED else item for item in self._route]
     def contains_system(self, system_name):
         with self._lock:
             return system_name in self._route_names
@@ -68,6 +78,8 @@ class RouteTracker:
                 temp_path = Path(AppConfig.get_app_data_path()) / "temp_route_status.json"
                 if temp_path.exists():
                     custom_path = str(temp_path)
+            if custom_path is not None:
+                get_persistence_worker().flush(Path(custom_path).parent)
             if custom_path is None or not Path(custom_path).exists():
                 return []
             with open(custom_path, "r", encoding="utf-8") as f:
@@ -102,22 +114,51 @@ class RouteTracker:
             return False
         try:
             backup_path = Path(backup_folder)
-            if not backup_path.exists():
-                backup_path.mkdir(parents=True, exist_ok=True)
-            status_path = backup_path / "route_status.json"
             save_data = []
             for item in route_data:
                 save_data.append({
                     'name': item.get('name', ''),
                     'status': item.get('status', STATUS_UNVISITED)
                 })
-            with open(status_path, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Route status saved to backup: {backup_path.name}")
+            get_persistence_worker().submit(backup_path, {'route_status.json': json_writer(save_data)})
+            logger.debug(f"Route status queued for backup: {backup_path.name}")
             return True
         except Exception as e:
             logger.error(f"Failed to save route status: {e}")
             return False
+    def reoptimize_remaining(self, current_coords=None, time_limit: float = REOPTIMIZE_TIME_LIMIT, cancel_event: threading.Event = None):
+        start = time.time()
+        route_data = self.route_manager.get_route()
+        remaining = [item for item in route_data if item.get('status') == STATUS_UNVISITED and item.get('coords')]
+        if len(remaining) < 3:
+            return None
+        if current_coords is None:
+            visited = [item for item in route_data if item.get('status') == STATUS_VISITED and item.get('coords')]
+            if visited:
+                current_coords = visited[-1]['coords']
+        coords = np.array([item['coords'] for item in remaining], dtype=np.float64)
+        if current_coords is not None:
+            coords = np.vstack((np.asarray(current_coords, dtype=np.float64), coords))
+        fixed_start = current_coords is not None
+        initial = np.arange(len(coords), dtype=np.int64)
+        neighbors = build_candidate_graph(coords)
+        tour = candidate_local_search(coords, initial, neighbors, time_limit=time_limit, cancel_event=cancel_event,
+                                      closed=False, fixed_start=fixed_start, fixed_end=False)
+        before = tour_length(coords, initial, closed=False)
+        after = tour_length(coords, tour, closed=False)
+        if fixed_start:
+            tour = tour[1:] - 1
+        if after < before:
+            self.route_manager.reorder_remaining([remaining[i]['name'] for i in tour])
+        elapsed = time.time() - start
+        logger.info(f"Remaining route reoptimized: {len(remaining)} systems, {before:.2f} -> {after:.2f} LY in {elapsed:.2f}s")
+        return {
+            'systems': len(remaining),
+            'before': before,
+            'after': after,
+            'time': elapsed,
+            'changed': after < before
+        }
     def get_next_unvisited_system(self):
         with self.route_manager as route:
             for item in route:
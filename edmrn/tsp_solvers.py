@@ -0,0 +1,941 @@
+import bisect
+import math
+import time
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from scipy.spatial import cKDTree
+from edmrn.distance_store import CondensedDistanceMatrix
+from edmrn.logger import get_logger
+logger = get_logger('TSPSolvers')
+DEFAULT_CANDIDATE_NEIGHBORS = 10
+_IMPROVEMENT_EPS = 1e-7
+_OR_OPT_MAX_SEGMENT = 3
+_TIME_CHECK_INTERVAL = 256
+_CONSTRUCTION_CHECK_INTERVAL = 16384
+CANDIDATE_QUERY_CHUNK = 8192
+IMPROVEMENT_REPORT_INTERVAL = 0.5
+JUMP_TIE_BREAK_WEIGHT = 1e-3
+GREEDY_EDGE_MAX_NODES = 200000
+HELD_KARP_MAX_NODES = 16
+BRANCH_AND_BOUND_MAX_NODES = 24
+EXACT_TIME_LIMIT = 2.0
+def build_candidate_graph(coords: np.ndarray, k: int = DEFAULT_CANDIDATE_NEIGHBORS,
+                          cancel_event: threading.Event = None) -> Optional[np.ndarray]:
+    n = coords.shape[0]
+    if n < 2:
+        return np.empty((n, 0), dtype=np.int32)
+    k = max(1, min(k, n - 1))
+    tree = cKDTree(coords)
+    if cancel_event is None:
+        _, idx = tree.query(coords, k=k + 1)
+    else:
+        idx = np.empty((n, k + 1), dtype=np.int64)
+        for lo in range(0, n, CANDIDATE_QUERY_CHUNK):
+            if cancel_event.is_set():
+                logger.info("Candidate graph build cancelled")
+                return None
+            hi = min(n, lo + CANDIDATE_QUERY_CHUNK)
+            idx[lo:hi] = tree.query(coords[lo:hi], k=k + 1)[1]
+    idx = np.asarray(idx, dtype=np.int64).reshape(n, k + 1)
+    self_mask = idx == np.arange(n)[:, np.newaxis]
+    no_self = ~self_mask.any(axis=1)
+    self_mask[no_self, -1] = True
+    neighbors = idx[~self_mask].reshape(n, k)
+    return neighbors.astype(np.int32)
+def tour_length(coords: np.ndarray, tour, closed: bool = True) -> float:
+    tour = np.asarray(tour, dtype=np.int64)
+    if len(tour) < 2:
+        return 0.0
+    pts = coords[tour]
+    length = float(np.sum(np.sqrt(np.sum(np.diff(pts, axis=0) ** 2, axis=1))))
+    if closed:
+        length += float(np.sqrt(np.sum((pts[-1] - pts[0]) ** 2)))
+    return length
+def greedy_edge_tour(coords: np.ndarray, neighbors: np.ndarray, cancel_event: threading.Event = None) -> np.ndarray:
+    n = coords.shape[0]
+    if n <= 3:
+        return np.arange(n, dtype=np.int64)
+    lo, hi = _candidate_edges(neighbors)
+    lengths = np.sqrt(np.sum((coords[lo] - coords[hi]) ** 2, axis=1))
+    fragments = _greedy_fragments(n, lo, hi, lengths, cancel_event)
+    def distances_from(city, others):
+        return np.sum((coords[others] - coords[city]) ** 2, axis=1)
+    return _join_fragments(fragments, distances_from, cancel_event)
+def matrix_greedy_edge_tour(distance_matrix: np.ndarray, neighbors: np.ndarray = None,
+                            cancel_event: threading.Event = None) -> np.ndarray:
+    n = distance_matrix.shape[0]
+    if n <= 3:
+        return np.arange(n, dtype=np.int64)
+    if neighbors is None:
+        neighbors = matrix_candidate_graph(distance_matrix)
+    lo, hi = _candidate_edges(neighbors)
+    lengths = np.asarray(distance_matrix[lo, hi], dtype=np.float64)
+    fragments = _greedy_fragments(n, lo, hi, lengths, cancel_event)
+    def distances_from(city, others):
+        return np.asarray(distance_matrix[city, others], dtype=np.float64)
+    return _join_fragments(fragments, distances_from, cancel_event)
+def _candidate_edges(neighbors: np.ndarray):
+    n, k = neighbors.shape
+    src = np.repeat(np.arange(n, dtype=np.int64), k)
+    dst = neighbors.reshape(-1).astype(np.int64)
+    lo = np.minimum(src, dst)
+    hi = np.maximum(src, dst)
+    pairs = np.sort(lo * n + hi)
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    return pairs // n, pairs % n
+def _greedy_fragments(n: int, lo: np.ndarray, hi: np.ndarray, lengths: np.ndarray,
+                      cancel_event: threading.Event = None) -> List[List[int]]:
+    if cancel_event is not None and cancel_event.is_set():
+        return [list(range(n))]
+    order = np.argsort(lengths, kind='stable')
+    lo = lo[order].tolist()
+    hi = hi[order].tolist()
+    degree = [0] * n
+    adj_a = [-1] * n
+    adj_b = [-1] * n
+    parent = list(range(n))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    edges_added = 0
+    for step, (u, v) in enumerate(zip(lo, hi)):
+        if cancel_event is not None and step % _CONSTRUCTION_CHECK_INTERVAL == 0 and cancel_event.is_set():
+            logger.info("Greedy-edge construction cancelled")
+            break
+        if degree[u] >= 2 or degree[v] >= 2:
+            continue
+        ru = find(u)
+        rv = find(v)
+        if ru == rv:
+            continue
+        parent[ru] = rv
+        if adj_a[u] < 0:
+            adj_a[u] = v
+        else:
+            adj_b[u] = v
+        if adj_a[v] < 0:
+            adj_a[v] = u
+        else:
+            adj_b[v] = u
+        degree[u] += 1
+        degree[v] += 1
+        edges_added += 1
+        if edges_added == n - 1:
+            break
+    fragments = []
+    seen = [False] * n
+    for start in range(n):
+        if cancel_event is not None and start % _CONSTRUCTION_CHECK_INTERVAL == 0 and cancel_event.is_set():
+            rest = [city for city in range(n) if not seen[city]]
+            if rest:
+                fragments.append(rest)
+            break
+        if seen[start] or degree[start] == 2:
+            continue
+        fragment = [start]
+        seen[start] = True
+        prev, cur = -1, start
+        while True:
+            nxt = adj_a[cur] if adj_a[cur] != prev else adj_b[cur]
+            if nxt < 0 or seen[nxt]:
+                break
+            fragment.append(nxt)
+            seen[nxt] = True
+            prev, cur = cur, nxt
+        fragments.append(fragment)
+    return fragments
+def _join_fragments(fragments: List[List[int]], distances_from: Callable[[int, np.ndarray], np.ndarray],
+                    cancel_event: threading.Event = None) -> np.ndarray:
+    f = len(fragments)
+    if f == 1:
+        return np.asarray(fragments[0], dtype=np.int64)
+    if cancel_event is not None and cancel_event.is_set():
+        return np.asarray([city for fragment in fragments for city in fragment], dtype=np.int64)
+    heads = np.array([frag[0] for frag in fragments], dtype=np.int64)
+    tails = np.array([frag[-1] for frag in fragments], dtype=np.int64)
+    alive = np.ones(f, dtype=bool)
+    alive[0] = False
+    tour = list(fragments[0])
+    for _ in range(f - 1):
+        if cancel_event is not None and cancel_event.is_set():
+            for fragment in np.flatnonzero(alive).tolist():
+                tour.extend(fragments[fragment])
+            break
+        d_head = distances_from(tour[-1], heads)
+        d_tail = distances_from(tour[-1], tails)
+        d_head[~alive] = np.inf
+        d_tail[~alive] = np.inf
+        best_head = int(np.argmin(d_head))
+        best_tail = int(np.argmin(d_tail))
+        if d_head[best_head] <= d_tail[best_tail]:
+            tour.extend(fragments[best_head])
+            alive[best_head] = False
+        else:
+            tour.extend(reversed(fragments[best_tail]))
+            alive[best_tail] = False
+    return np.asarray(tour, dtype=np.int64)
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    v = values.astype(np.uint64) & np.uint64(0x1fffff)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+def hilbert_curve_order(coords: np.ndarray, bits: int = 16) -> np.ndarray:
+    n = coords.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    lo = coords.min(axis=0)
+    span = float(np.max(coords.max(axis=0) - lo)) or 1.0
+    scale = (1 << bits) - 1
+    cells = ((coords - lo) * (scale / span)).astype(np.uint32)
+    x = [np.ascontiguousarray(cells[:, axis]) for axis in range(3)]
+    zero = np.uint32(0)
+    one = np.uint32(1)
+    for k in range(bits - 1, 0, -1):
+        low = np.uint32((1 << k) - 1)
+        shift = np.uint32(k)
+        for axis in range(3):
+            flip = zero - ((x[axis] >> shift) & one)
+            if axis == 0:
+                x[0] ^= flip & low
+            else:
+                swap = (x[0] ^ x[axis]) & low & ~flip
+                x[0] ^= swap | (flip & low)
+                x[axis] ^= swap
+    x[1] ^= x[0]
+    x[2] ^= x[1]
+    gray = np.zeros(n, dtype=np.uint32)
+    for k in range(bits - 1, 0, -1):
+        gray ^= (zero - ((x[2] >> np.uint32(k)) & one)) & np.uint32((1 << k) - 1)
+    code = (_spread_bits(x[0] ^ gray) << np.uint64(2)) | (_spread_bits(x[1] ^ gray) << np.uint64(1)) | _spread_bits(x[2] ^ gray)
+    return np.argsort(code).astype(np.int64)
+def spatial_partition(coords: np.ndarray, max_size: int) -> List[np.ndarray]:
+    parts = []
+    stack = [np.arange(coords.shape[0], dtype=np.int64)]
+    while stack:
+        idx = stack.pop()
+        if len(idx) <= max_size:
+            parts.append(idx)
+            continue
+        pts = coords[idx]
+        axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+        half = len(idx) // 2
+        split = np.argpartition(pts[:, axis], half)
+        stack.append(idx[split[half:]])
+        stack.append(idx[split[:half]])
+    return parts
+def _reverse_segment(tour: np.ndarray, pos: np.ndarray, i: int, j: int, closed: bool):
+    n = len(tour)
+    if closed and (j - i) * 2 > n:
+        idx = np.arange(j + 1, i + n + 1) % n
+    else:
+        idx = np.arange(i + 1, j + 1)
+    tour[idx] = tour[idx[::-1]]
+    pos[tour[idx]] = idx
+def _move_segment(tour: np.ndarray, pos: np.ndarray, seg_start: int, seg_len: int, q: int, reverse: bool):
+    seg_end = seg_start + seg_len - 1
+    seg = tour[seg_start:seg_end + 1].copy()
+    if reverse:
+        seg = seg[::-1]
+    if q > seg_end:
+        block = np.concatenate((tour[seg_end + 1:q + 1], seg))
+        lo = seg_start
+    else:
+        block = np.concatenate((seg, tour[q + 1:seg_start]))
+        lo = q + 1
+    tour[lo:lo + len(block)] = block
+    pos[block] = np.arange(lo, lo + len(block))
+def jump_cost_matrix(distance_matrix: np.ndarray, jump_range: float, rows_per_chunk: int = 1024) -> np.ndarray:
+    if jump_range <= 0:
+        raise ValueError(f"Jump range must be positive, got {jump_range}")
+    n = distance_matrix.shape[0]
+    scale = np.float32(1.0 / jump_range)
+    weight = np.float32(JUMP_TIE_BREAK_WEIGHT)
+    if isinstance(distance_matrix, CondensedDistanceMatrix):
+        return distance_matrix.map(lambda legs: np.ceil(legs * scale) + legs * scale * weight)
+    cost = np.empty(distance_matrix.shape, dtype=np.float32)
+    for lo in range(0, n, rows_per_chunk):
+        hi = min(lo + rows_per_chunk, n)
+        legs = np.asarray(distance_matrix[lo:hi], dtype=np.float32) * scale
+        cost[lo:hi] = np.ceil(legs)
+        cost[lo:hi] += legs * weight
+    return cost
+def candidate_local_search(coords: np.ndarray, tour, neighbors: np.ndarray,
+                           time_limit: float = None, cancel_event: threading.Event = None,
+                           closed: bool = True, on_improve: Callable[[np.ndarray], None] = None,
+                           jump_range: float = None, fixed_start: bool = True, fixed_end: bool = True,
+                           initial_active=None, on_progress: Callable[[np.ndarray, int, int], None] = None) -> np.ndarray:
+    xs = coords[:, 0].tolist()
+    ys = coords[:, 1].tolist()
+    zs = coords[:, 2].tolist()
+    sqrt = math.sqrt
+    ceil = math.ceil
+    def dist(a, b):
+        dx = xs[a] - xs[b]
+        dy = ys[a] - ys[b]
+        dz = zs[a] - zs[b]
+        return sqrt(dx * dx + dy * dy + dz * dz)
+    if jump_range:
+        euclidean = dist
+        def dist(a, b):
+            legs = euclidean(a, b) / jump_range
+            return ceil(legs) + legs * JUMP_TIE_BREAK_WEIGHT
+    return _local_search(dist, tour, neighbors, time_limit, cancel_event, closed, on_improve, fixed_start, fixed_end,
+                         initial_active, on_progress)
+def matrix_local_search(distance_matrix: np.ndarray, tour, neighbors: np.ndarray = None,
+                        time_limit: float = None, cancel_event: threading.Event = None,
+                        closed: bool = True, on_improve: Callable[[np.ndarray], None] = None,
+                        fixed_start: bool = True, fixed_end: bool = True,
+                        on_progress: Callable[[np.ndarray, int, int], None] = None) -> np.ndarray:
+    if neighbors is None:
+        neighbors = matrix_candidate_graph(distance_matrix)
+    item = distance_matrix.item
+    def dist(a, b):
+        return item(a, b)
+    return _local_search(dist, tour, neighbors, time_limit, cancel_event, closed, on_improve, fixed_start, fixed_end,
+                         on_progress=on_progress)
+def _local_search(dist: Callable[[int, int], float], tour, neighbors: np.ndarray,
+                  time_limit: float, cancel_event: threading.Event, closed: bool,
+                  on_improve: Callable[[np.ndarray], None],
+                  fixed_start: bool = True, fixed_end: bool = True, initial_active=None,
+                  on_progress: Callable[[np.ndarray, int, int], None] = None) -> np.ndarray:
+    n = len(tour)
+    open_head = not closed and not fixed_start
+    open_tail = not closed and not fixed_end
+    tour = np.array(tour, dtype=np.int64)
+    if n < 5 or (cancel_event is not None and cancel_event.is_set()):
+        return tour
+    nbrs = neighbors.tolist()
+    pos = np.empty(n, dtype=np.int64)
+    pos[tour] = np.arange(n)
+    def succ(a):
+        p = pos[a] + 1
+        if p == n:
+            return tour[0] if closed else -1
+        return tour[p]
+    def pred(a):
+        p = pos[a] - 1
+        if p < 0:
+            return tour[n - 1] if closed else -1
+        return tour[p]
+    deadline = time.time() + time_limit if time_limit else None
+    next_report = time.time() + IMPROVEMENT_REPORT_INTERVAL
+    next_progress = next_report
+    reported_moves = 0
+    if initial_active is None:
+        active = [True] * n
+        queue = list(tour[::-1].tolist())
+    else:
+        active = [False] * n
+        queue = []
+        for c in np.asarray(initial_active, dtype=np.int64)[::-1].tolist():
+            if not active[c]:
+                active[c] = True
+                queue.append(c)
+    steps = 0
+    moves = 0
+    def activate(*cities):
+        for c in cities:
+            if c >= 0 and not active[c]:
+                active[c] = True
+                queue.append(c)
+    def try_two_opt(a):
+        for forward in (True, False):
+            b = succ(a) if forward else pred(a)
+            if b < 0:
+                continue
+            d_ab = dist(a, b)
+            for c in nbrs[a]:
+                d_ac = dist(a, c)
+                if d_ac >= d_ab:
+                    break
+                d = succ(c) if forward else pred(c)
+                if d < 0:
+                    if c == b or not (open_tail if forward else open_head):
+                        continue
+                    if d_ac - d_ab < -_IMPROVEMENT_EPS:
+                        if forward:
+                            _reverse_segment(tour, pos, int(pos[a]), n - 1, closed)
+                        else:
+                            _reverse_segment(tour, pos, -1, int(pos[a]) - 1, closed)
+                        activate(a, b, c)
+                        return True
+                    continue
+                if c == b or d == a:
+                    continue
+                delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+                if delta < -_IMPROVEMENT_EPS:
+                    if forward:
+                        i, j = pos[a], pos[c]
+                    else:
+                        i, j = pos[b], pos[d]
+                    if i > j:
+                        i, j = j, i
+                    _reverse_segment(tour, pos, int(i), int(j), closed)
+                    activate(a, b, c, d)
+                    return True
+        return False
+    def try_or_opt(a):
+        pa = int(pos[a])
+        for seg_len in range(1, _OR_OPT_MAX_SEGMENT + 1):
+            seg_end = pa + seg_len - 1
+            if seg_end >= n or seg_len >= n - 2:
+                break
+            s = a
+            e = tour[seg_end]
+            p = pred(s)
+            nx = succ(e)
+            if p < 0 and nx < 0:
+                continue
+            if p < 0:
+                if not open_head:
+                    continue
+                remove_gain = dist(e, nx)
+            elif nx < 0:
+                if not open_tail:
+                    continue
+                remove_gain = dist(p, s)
+            else:
+                remove_gain = dist(p, s) + dist(e, nx) - dist(p, nx)
+            if remove_gain <= _IMPROVEMENT_EPS:
+                continue
+            for end_city in (s, e):
+                for c in nbrs[end_city]:
+                    if dist(end_city, c) >= remove_gain:
+                        break
+                    pc = pos[c]
+                    if pa <= pc <= seg_end:
+                        continue
+                    for u, v in ((c, succ(c)), (pred(c), c)):
+                        if (u < 0 and not open_head) or (v < 0 and not open_tail):
+                            continue
+                        pu = pos[u] if u >= 0 else -1
+                        pv = pos[v] if v >= 0 else n
+                        if pa <= pu <= seg_end or pa <= pv <= seg_end:
+                            continue
+                        if u == p and v == nx:
+                            continue
+                        if u < 0:
+                            add_fwd = dist(e, v)
+                            add_rev = dist(s, v)
+                        elif v < 0:
+                            add_fwd = dist(u, s)
+                            add_rev = dist(u, e)
+                        else:
+                            d_uv = dist(u, v)
+                            add_fwd = dist(u, s) + dist(e, v) - d_uv
+                            add_rev = dist(u, e) + dist(s, v) - d_uv
+                        if add_fwd <= add_rev:
+                            add_cost, reverse = add_fwd, False
+                        else:
+                            add_cost, reverse = add_rev, True
+                        if add_cost < remove_gain - _IMPROVEMENT_EPS:
+                            _move_segment(tour, pos, pa, seg_len, int(pu), reverse)
+                            activate(p, nx, s, e, u, v)
+                            return True
+        return False
+    while queue:
+        a = queue.pop()
+        active[a] = False
+        steps += 1
+        if steps % _TIME_CHECK_INTERVAL == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Local search cancelled")
+                break
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                logger.info(f"Local search reached time limit after {moves} moves")
+                break
+            if on_improve is not None and now >= next_report and moves > reported_moves:
+                on_improve(tour.copy())
+                reported_moves = moves
+                next_report = now + IMPROVEMENT_REPORT_INTERVAL
+            if on_progress is not None and now >= next_progress:
+                on_progress(tour, steps, moves)
+                next_progress = now + IMPROVEMENT_REPORT_INTERVAL
+        if try_two_opt(a) or try_or_opt(a):
+            moves += 1
+    if on_improve is not None and moves > reported_moves:
+        on_improve(tour.copy())
+    if on_progress is not None:
+        on_progress(tour, steps, moves)
+    logger.debug(f"Local search finished: {moves} improving moves, {steps} node checks")
+    return tour
+def coords_leg(coords: np.ndarray) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    axes = [np.ascontiguousarray(coords[:, d], dtype=np.float64) for d in range(coords.shape[1])]
+    def leg(a, b):
+        total = np.zeros(len(a))
+        for axis in axes:
+            delta = axis[a] - axis[b]
+            total += delta * delta
+        return np.sqrt(total)
+    return leg
+def matrix_leg(distance_matrix: np.ndarray) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    def leg(a, b):
+        return np.asarray(distance_matrix[a, b], dtype=np.float64)
+    return leg
+def _best_per_key(key: np.ndarray, gain: np.ndarray) -> np.ndarray:
+    order = np.lexsort((-gain, key))
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = key[order[1:]] != key[order[:-1]]
+    return order[keep]
+def _select_disjoint(lo: np.ndarray, hi: np.ndarray, gain: np.ndarray) -> List[int]:
+    order = np.argsort(-gain, kind='stable')
+    starts = []
+    ends = []
+    chosen = []
+    for m in order.tolist():
+        a, b = int(lo[m]), int(hi[m])
+        k = bisect.bisect_left(starts, a)
+        if k < len(starts) and starts[k] <= b:
+            continue
+        if k > 0 and ends[k - 1] >= a:
+            continue
+        starts.insert(k, a)
+        ends.insert(k, b)
+        chosen.append(m)
+    return chosen
+def _successor_legs(leg, tour: np.ndarray) -> np.ndarray:
+    return leg(tour, np.roll(tour, -1))
+def _batch_two_opt(leg, tour: np.ndarray, pos: np.ndarray, neighbors: np.ndarray, neighbor_legs: np.ndarray,
+                   closed: bool, fixed_start: bool, fixed_end: bool) -> int:
+    n = len(tour)
+    k = neighbors.shape[1]
+    succ = _successor_legs(leg, tour)
+    pa = np.repeat(np.arange(n), k)
+    pc = pos[neighbors[tour].reshape(-1)]
+    known = neighbor_legs[tour].reshape(-1)
+    lo = np.minimum(pa, pc)
+    hi = np.maximum(pa, pc)
+    i = np.concatenate((lo, lo - 1))
+    j = np.concatenate((hi, hi - 1))
+    known = np.concatenate((known, known))
+    shifted = np.repeat((False, True), len(lo))
+    valid = j - i >= 2
+    if closed:
+        valid &= (i >= 0) & (j - i < n - 1)
+    else:
+        valid &= i >= (0 if fixed_start else -1)
+        valid &= j <= (n - 2 if fixed_end else n - 1)
+    has_left = i >= 0
+    has_right = (j + 1 < n) | closed
+    removed = np.where(has_left, succ[np.maximum(i, 0)], 0.0) + np.where(has_right, succ[j % n], 0.0)
+    valid &= known < removed - _IMPROVEMENT_EPS
+    i, j, known, shifted, has_left, has_right, removed = (
+        i[valid], j[valid], known[valid], shifted[valid], has_left[valid], has_right[valid], removed[valid])
+    if len(i) == 0:
+        return 0
+    left = tour[np.maximum(i, 0)]
+    right = tour[j]
+    other = np.where(shifted, leg(left, right), leg(tour[i + 1], tour[(j + 1) % n]))
+    other_exists = np.where(shifted, has_left, has_right)
+    gain = removed - known - np.where(other_exists, other, 0.0)
+    improving = gain > _IMPROVEMENT_EPS
+    if not improving.any():
+        return 0
+    i, j, gain = i[improving], j[improving], gain[improving]
+    best = _best_per_key(i, gain)
+    i, j, gain = i[best], j[best], gain[best]
+    chosen = _select_disjoint(i, j + 1, gain)
+    for m in chosen:
+        a, b = int(i[m]) + 1, int(j[m]) + 1
+        tour[a:b] = tour[a:b][::-1].copy()
+    pos[tour] = np.arange(n)
+    return len(chosen)
+def _batch_or_opt(leg, tour: np.ndarray, pos: np.ndarray, neighbors: np.ndarray, neighbor_legs: np.ndarray,
+                  seg_len: int) -> int:
+    n = len(tour)
+    k = neighbors.shape[1]
+    if n < seg_len + 4:
+        return 0
+    succ = _successor_legs(leg, tour)
+    first = np.arange(1, n - seg_len)
+    last = first + seg_len - 1
+    remove_gain = succ[first - 1] + succ[last] - leg(tour[first - 1], tour[last + 1])
+    worth = remove_gain > _IMPROVEMENT_EPS
+    first, last, remove_gain = first[worth], last[worth], remove_gain[worth]
+    if len(first) == 0:
+        return 0
+    ends = np.concatenate((tour[first], tour[last]))
+    seg = np.repeat(np.tile(np.arange(len(first)), 2), k)
+    near = neighbor_legs[ends].reshape(-1) < remove_gain[seg]
+    seg = seg[near]
+    q = pos[neighbors[ends].reshape(-1)[near]]
+    seg = np.concatenate((seg, seg))
+    q = np.concatenate((q, q - 1))
+    first, last, remove_gain = first[seg], last[seg], remove_gain[seg]
+    valid = (q >= 0) & (q <= n - 2) & ((q < first - 1) | (q > last))
+    first, last, remove_gain, q = first[valid], last[valid], remove_gain[valid], q[valid]
+    if len(q) == 0:
+        return 0
+    s = tour[first]
+    e = tour[last]
+    u = tour[q]
+    v = tour[q + 1]
+    d_uv = succ[q]
+    add_fwd = leg(u, s) + leg(e, v) - d_uv
+    add_rev = leg(u, e) + leg(s, v) - d_uv
+    reverse = add_rev < add_fwd
+    gain = remove_gain - np.where(reverse, add_rev, add_fwd)
+    improving = gain > _IMPROVEMENT_EPS
+    if not improving.any():
+        return 0
+    first, last, q, reverse, gain = first[improving], last[improving], q[improving], reverse[improving], gain[improving]
+    best = _best_per_key(first, gain)
+    first, last, q, reverse, gain = first[best], last[best], q[best], reverse[best], gain[best]
+    span_lo = np.minimum(first - 1, q)
+    span_hi = np.maximum(last + 1, q + 1)
+    chosen = _select_disjoint(span_lo, span_hi, gain)
+    for m in chosen:
+        _move_segment(tour, pos, int(first[m]), seg_len, int(q[m]), bool(reverse[m]))
+    pos[tour] = np.arange(n)
+    return len(chosen)
+def vectorized_local_search(leg: Callable[[np.ndarray, np.ndarray], np.ndarray], tour, neighbors: np.ndarray,
+                            time_limit: float = None, cancel_event: threading.Event = None, closed: bool = True,
+                            fixed_start: bool = True, fixed_end: bool = True) -> Tuple[np.ndarray, Dict[str, int]]:
+    tour = np.array(tour, dtype=np.int64)
+    n = len(tour)
+    stats = {'rounds': 0, 'two_opt_moves': 0, 'or_opt_moves': 0}
+    if n < 5:
+        return tour, stats
+    neighbors = np.asarray(neighbors, dtype=np.int64)
+    k = neighbors.shape[1]
+    neighbor_legs = leg(np.repeat(np.arange(n), k), neighbors.reshape(-1)).reshape(n, k)
+    pos = np.empty(n, dtype=np.int64)
+    pos[tour] = np.arange(n)
+    deadline = time.time() + time_limit if time_limit else None
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info("Vectorized local search cancelled")
+            break
+        if deadline is not None and time.time() >= deadline:
+            logger.info(f"Vectorized local search reached time limit after {stats['rounds']} rounds")
+            break
+        stats['rounds'] += 1
+        two_opt = _batch_two_opt(leg, tour, pos, neighbors, neighbor_legs, closed, fixed_start, fixed_end)
+        or_opt = 0
+        for seg_len in range(1, _OR_OPT_MAX_SEGMENT + 1):
+            or_opt += _batch_or_opt(leg, tour, pos, neighbors, neighbor_legs, seg_len)
+        stats['two_opt_moves'] += two_opt
+        stats['or_opt_moves'] += or_opt
+        if two_opt + or_opt == 0:
+            break
+    return tour, stats
+def matrix_candidate_graph(distance_matrix: np.ndarray, k: int = DEFAULT_CANDIDATE_NEIGHBORS, rows_per_chunk: int = 1024) -> np.ndarray:
+    n = distance_matrix.shape[0]
+    if n < 2:
+        return np.empty((n, 0), dtype=np.int32)
+    k = max(1, min(k, n - 1))
+    neighbors = np.empty((n, k), dtype=np.int32)
+    for lo in range(0, n, rows_per_chunk):
+        hi = min(lo + rows_per_chunk, n)
+        block = np.array(distance_matrix[lo:hi], dtype=np.float64)
+        block[np.arange(hi - lo), np.arange(lo, hi)] = np.inf
+        part = np.argpartition(block, k - 1, axis=1)[:, :k]
+        part_d = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(part_d, axis=1)
+        neighbors[lo:hi] = np.take_along_axis(part, order, axis=1)
+    return neighbors
+def matrix_nearest_neighbor_tour(distance_matrix: np.ndarray, start: int = 0) -> np.ndarray:
+    n = distance_matrix.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    current = start
+    for step in range(n):
+        tour[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        row = np.where(visited, np.inf, distance_matrix[current])
+        current = int(np.argmin(row))
+    return tour
+def matrix_tour_length(distance_matrix: np.ndarray, tour, closed: bool = True) -> float:
+    tour = np.asarray(tour, dtype=np.int64)
+    if len(tour) < 2:
+        return 0.0
+    length = float(np.sum(distance_matrix[tour[:-1], tour[1:]]))
+    if closed:
+        length += float(distance_matrix[tour[-1], tour[0]])
+    return length
+def rotate_to_start(tour: np.ndarray, start: int = 0) -> np.ndarray:
+    tour = np.asarray(tour, dtype=np.int64)
+    where = np.nonzero(tour == start)[0]
+    if len(where) == 0:
+        return tour
+    return np.roll(tour, -int(where[0]))
+def open_path_tour(tour, start_index: Optional[int] = None, end_index: Optional[int] = None) -> np.ndarray:
+    tour = np.asarray(tour, dtype=np.int64)
+    if start_index is not None:
+        tour = rotate_to_start(tour, start_index)
+    if end_index is not None and end_index != start_index and len(tour) > 1:
+        tour = np.append(tour[tour != end_index], end_index)
+    return tour
+def repair_tour(leg: Callable[[np.ndarray, np.ndarray], np.ndarray], tour, added, candidates: np.ndarray = None,
+                closed: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    tour = np.asarray(tour, dtype=np.int64)
+    added = np.asarray(added, dtype=np.int64)
+    removed = tour < 0
+    kept = tour[~removed]
+    n = len(kept) + len(added)
+    if len(kept) < 2:
+        return np.concatenate((kept, added)), np.arange(n, dtype=np.int64)
+    touched = []
+    if removed.any():
+        kept_positions = np.flatnonzero(~removed)
+        gaps = np.flatnonzero(np.diff(kept_positions) > 1)
+        touched.extend(kept[gaps].tolist())
+        touched.extend(kept[gaps + 1].tolist())
+        if kept_positions[0] > 0 or kept_positions[-1] < len(tour) - 1:
+            touched.extend([int(kept[0]), int(kept[-1])])
+    nxt = np.full(n, -1, dtype=np.int64)
+    prv = np.full(n, -1, dtype=np.int64)
+    nxt[kept[:-1]] = kept[1:]
+    prv[kept[1:]] = kept[:-1]
+    if closed:
+        nxt[kept[-1]] = kept[0]
+        prv[kept[0]] = kept[-1]
+    in_tour = np.zeros(n, dtype=bool)
+    in_tour[kept] = True
+    head = int(kept[0])
+    for node in added.tolist():
+        near = candidates[node][in_tour[candidates[node]]] if candidates is not None else np.empty(0, dtype=np.int64)
+        if len(near):
+            near = near.astype(np.int64)
+            lefts = np.concatenate((near, prv[near]))
+            rights = np.concatenate((nxt[near], near))
+        else:
+            lefts = np.flatnonzero(in_tour)
+            rights = nxt[lefts]
+            if not closed:
+                lefts = np.append(lefts, -1)
+                rights = np.append(rights, head)
+        targets = np.full(len(lefts), node, dtype=np.int64)
+        has_left = lefts >= 0
+        has_right = rights >= 0
+        safe_lefts = np.where(has_left, lefts, node)
+        safe_rights = np.where(has_right, rights, node)
+        cost = (np.where(has_left, leg(safe_lefts, targets), 0.0) + np.where(has_right, leg(targets, safe_rights), 0.0)
+                - np.where(has_left & has_right, leg(safe_lefts, safe_rights), 0.0))
+        best = int(np.argmin(cost))
+        left, right = int(lefts[best]), int(rights[best])
+        if left >= 0:
+            nxt[left] = node
+            touched.append(left)
+        else:
+            head = node
+        if right >= 0:
+            prv[right] = node
+            touched.append(right)
+        prv[node] = left
+        nxt[node] = right
+        in_tour[node] = True
+        touched.append(node)
+    order = np.empty(n, dtype=np.int64)
+    current = head
+    for step in range(n):
+        order[step] = current
+        current = int(nxt[current])
+    return order, np.unique(np.asarray(touched, dtype=np.int64))
+def cheapest_insertion(leg: Callable[[np.ndarray, np.ndarray], np.ndarray], tour, node: int, closed: bool = True,
+                       fixed_start: bool = False, fixed_end: bool = False) -> Tuple[np.ndarray, float]:
+    tour = np.asarray(tour, dtype=np.int64)
+    n = len(tour)
+    if n == 0:
+        return np.array([node], dtype=np.int64), 0.0
+    to_node = leg(tour, np.full(n, node, dtype=np.int64))
+    cost = np.full(n + 1, np.inf)
+    if n > 1:
+        cost[1:n] = to_node[:-1] + to_node[1:] - leg(tour[:-1], tour[1:])
+    if closed:
+        cost[n] = to_node[-1] + to_node[0] - (leg(tour[-1:], tour[:1])[0] if n > 1 else 0.0)
+    else:
+        if not fixed_start:
+            cost[0] = to_node[0]
+        if not fixed_end:
+            cost[n] = to_node[-1]
+    if not np.isfinite(cost).any():
+        cost[n] = to_node[-1]
+    position = int(np.argmin(cost))
+    return np.insert(tour, position, node), float(cost[position])
+def solve_tsp_candidate(coords: np.ndarray, k: int = DEFAULT_CANDIDATE_NEIGHBORS,
+                        time_limit: float = None, cancel_event: threading.Event = None,
+                        jump_range: float = None, initial_tour=None, closed: bool = True,
+                        start_index: Optional[int] = None, end_index: Optional[int] = None,
+                        on_progress: Callable[[np.ndarray, int, int], None] = None) -> List[int]:
+    n = coords.shape[0]
+    if n <= 3:
+        if closed:
+            return list(range(n))
+        return open_path_tour(np.arange(n), start_index, end_index).tolist()
+    start = time.time()
+    neighbors = build_candidate_graph(coords, k, cancel_event)
+    if neighbors is None:
+        tour = np.arange(n, dtype=np.int64) if initial_tour is None else np.asarray(initial_tour, dtype=np.int64)
+        return (tour if closed else open_path_tour(tour, start_index, end_index)).tolist()
+    logger.info(f"Candidate graph built: {n} nodes x {neighbors.shape[1]} neighbors in {time.time() - start:.2f}s")
+    if initial_tour is None and n > GREEDY_EDGE_MAX_NODES:
+        tour = hilbert_curve_order(coords)
+        logger.info(f"Hilbert-curve tour: {tour_length(coords, tour):.2f} LY in {time.time() - start:.2f}s")
+    elif initial_tour is None:
+        tour = greedy_edge_tour(coords, neighbors, cancel_event)
+        logger.info(f"Greedy-edge tour: {tour_length(coords, tour):.2f} LY in {time.time() - start:.2f}s")
+    else:
+        tour = np.asarray(initial_tour, dtype=np.int64)
+    if not closed:
+        tour = open_path_tour(tour, start_index, end_index)
+    if cancel_event is not None and cancel_event.is_set():
+        return tour.tolist()
+    initial_length = tour_length(coords, tour, closed)
+    remaining = None
+    if time_limit:
+        remaining = max(0.0, time_limit - (time.time() - start))
+    tour = candidate_local_search(coords, tour, neighbors, time_limit=remaining, cancel_event=cancel_event,
+                                  closed=closed, jump_range=jump_range,
+                                  fixed_start=start_index is not None, fixed_end=end_index is not None,
+                                  on_progress=on_progress)
+    final_length = tour_length(coords, tour, closed)
+    logger.info(f"Candidate local search: {initial_length:.2f} -> {final_length:.2f} LY in {time.time() - start:.2f}s")
+    if not closed:
+        return tour.tolist()
+    return rotate_to_start(tour, 0).tolist()
+def held_karp_path(distance_matrix: np.ndarray, start: int, end: Optional[int] = None) -> List[int]:
+    distance_matrix = np.asarray(distance_matrix, dtype=np.float64)
+    n = distance_matrix.shape[0]
+    inner = np.array([i for i in range(n) if i != start and i != end], dtype=np.int64)
+    tail = [end] if end is not None and end != start else []
+    m = len(inner)
+    if m == 0:
+        return [start] + tail
+    d = distance_matrix[np.ix_(inner, inner)]
+    full = 1 << m
+    bits = 1 << np.arange(m, dtype=np.int64)
+    subsets = np.arange(full, dtype=np.int64)
+    popcount = np.zeros(full, dtype=np.int8)
+    for b in range(m):
+        popcount += ((subsets >> b) & 1).astype(np.int8)
+    dp = np.full((full, m), np.inf)
+    parent = np.full((full, m), -1, dtype=np.int8)
+    dp[bits, np.arange(m)] = distance_matrix[start, inner]
+    for size in range(1, m):
+        masks = subsets[popcount == size]
+        for j in range(m):
+            src = masks[(masks & bits[j]) == 0]
+            cand = dp[src] + d[:, j]
+            best = np.argmin(cand, axis=1)
+            dp[src | bits[j], j] = cand[np.arange(len(src)), best]
+            parent[src | bits[j], j] = best
+    closing = distance_matrix[inner, end] if end is not None else np.zeros(m)
+    j = int(np.argmin(dp[full - 1] + closing))
+    mask = full - 1
+    path = []
+    while j >= 0:
+        path.append(int(inner[j]))
+        previous = int(parent[mask, j])
+        mask ^= int(bits[j])
+        j = previous
+    return [start] + path[::-1] + tail
+def _mst_weight(distance_matrix: np.ndarray, nodes: List[int]) -> float:
+    if len(nodes) < 2:
+        return 0.0
+    sub = distance_matrix[np.ix_(nodes, nodes)]
+    in_tree = np.zeros(len(nodes), dtype=bool)
+    in_tree[0] = True
+    best = sub[0].copy()
+    total = 0.0
+    for _ in range(len(nodes) - 1):
+        k = int(np.argmin(np.where(in_tree, np.inf, best)))
+        total += best[k]
+        in_tree[k] = True
+        best = np.minimum(best, sub[k])
+    return total
+def branch_and_bound_path(distance_matrix: np.ndarray, start: int, end: Optional[int] = None, initial_tour=None,
+                          time_limit: float = EXACT_TIME_LIMIT,
+                          cancel_event: threading.Event = None) -> Tuple[List[int], bool]:
+    distance_matrix = np.asarray(distance_matrix, dtype=np.float64)
+    n = distance_matrix.shape[0]
+    closed = end == start
+    tail = [] if end is None or closed else [end]
+    inner = [i for i in range(n) if i != start and i != end]
+    def path_cost(path):
+        cost = float(np.sum(distance_matrix[path[:-1], path[1:]]))
+        if closed:
+            cost += float(distance_matrix[path[-1], start])
+        return cost
+    if initial_tour is None or int(initial_tour[0]) != start or (tail and int(initial_tour[-1]) != end):
+        initial_tour = [start] + inner + tail
+    best = {'tour': [int(i) for i in initial_tour], 'cost': path_cost(list(initial_tour)), 'steps': 0}
+    deadline = time.time() + time_limit if time_limit else None
+    aborted = False
+    seen = {}
+    def visit(path, cost, remaining, mask):
+        nonlocal aborted
+        last = path[-1]
+        if not remaining:
+            total = cost + (float(distance_matrix[last, end]) if end is not None else 0.0)
+            if total < best['cost'] - _IMPROVEMENT_EPS:
+                best['tour'] = path + tail
+                best['cost'] = total
+            return
+        best['steps'] += 1
+        if best['steps'] % _TIME_CHECK_INTERVAL == 0:
+            if (cancel_event is not None and cancel_event.is_set()) or (deadline is not None and time.time() >= deadline):
+                aborted = True
+        if aborted or cost >= best['cost'] - _IMPROVEMENT_EPS:
+            return
+        state = (mask, last)
+        if seen.get(state, np.inf) <= cost + _IMPROVEMENT_EPS:
+            return
+        seen[state] = cost
+        bound = cost + _mst_weight(distance_matrix, remaining) + float(np.min(distance_matrix[last, remaining]))
+        if end is not None:
+            bound += float(np.min(distance_matrix[end, remaining]))
+        if bound >= best['cost'] - _IMPROVEMENT_EPS:
+            return
+        for nxt in sorted(remaining, key=lambda j: distance_matrix[last, j]):
+            visit(path + [nxt], cost + float(distance_matrix[last, nxt]), [r for r in remaining if r != nxt], mask | (1 << nxt))
+            if aborted:
+                return
+    visit([start], 0.0, inner, 0)
+    logger.info(f"Branch and bound: {best['cost']:.2f} LY after {best['steps']} nodes"
+                f"{' (stopped early)' if aborted else ' (optimal)'}")
+    return best['tour'], not aborted
+def solve_tsp_exact(distance_matrix: np.ndarray, closed: bool = True, start_index: Optional[int] = None,
+                    end_index: Optional[int] = None, initial_tour=None, time_limit: float = EXACT_TIME_LIMIT,
+                    cancel_event: threading.Event = None) -> Tuple[Optional[List[int]], bool]:
+    distance_matrix = np.asarray(distance_matrix, dtype=np.float64)
+    n = distance_matrix.shape[0]
+    if n > BRANCH_AND_BOUND_MAX_NODES:
+        return None, False
+    if n <= 2:
+        if closed:
+            return list(range(n)), True
+        return open_path_tour(np.arange(n), start_index, end_index).tolist(), True
+    dummy = None
+    if closed:
+        start, end = 0, 0
+        if initial_tour is not None:
+            initial_tour = rotate_to_start(initial_tour, 0).tolist()
+    elif start_index is None:
+        dummy = n
+        padded = np.zeros((n + 1, n + 1))
+        padded[:n, :n] = distance_matrix
+        distance_matrix = padded
+        start, end = dummy, end_index
+        if initial_tour is not None:
+            initial_tour = [dummy] + [int(i) for i in initial_tour]
+    else:
+        start, end = start_index, end_index
+    if n <= HELD_KARP_MAX_NODES:
+        tour, optimal = held_karp_path(distance_matrix, start, end), True
+    else:
+        tour, optimal = branch_and_bound_path(distance_matrix, start, end, initial_tour, time_limit, cancel_event)
+    if dummy is not None:
+        tour = tour[1:]
+    return tour, optimal
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import cdist, pdist, squareform
+from edmrn.distance_store import CondensedDistanceMatrix, IncrementalDistanceMatrix, condensed_index
+
+@pytest.fixture(params=['shared_memory', 'memmap'])
+def store(request, tmp_path):
+    coords = np.random.default_rng(0).uniform(-1000, 1000, (57, 3))
+    store = CondensedDistanceMatrix.from_coords(coords, request.param, str(tmp_path))
+    yield coords, store
+    store.release()
+
+def test_condensed_index_matches_squareform():
+    n = 23
+    reference = squareform(np.arange(n * (n - 1) // 2))
+    i, j = np.triu_indices(n, 1)
+    assert np.array_equal(condensed_index(n, i, j), reference[i, j])
+    assert np.array_equal(condensed_index(n, j, i), reference[i, j])
+
+def test_condensed_store_matches_squareform(store):
+    coords, store = store
+    dense = squareform(pdist(coords))
+    assert store.shape == dense.shape
+    assert np.allclose(store.data, pdist(coords), rtol=1e-5, atol=1e-3)
+    assert np.allclose(np.asarray(store), dense, rtol=1e-5, atol=1e-3)
+    for i in (0, 1, 28, 56):
+        assert np.allclose(store[i], dense[i], rtol=1e-5, atol=1e-3)
+        assert store[i, i] == 0.0
+        assert store[i, 56 - i] == pytest.approx(dense[i, 56 - i], rel=1e-5, abs=1e-3)
+    assert np.allclose(store[0:57], dense, rtol=1e-5, atol=1e-3)
+    assert np.allclose(store[10:30], dense[10:30], rtol=1e-5, atol=1e-3)
+    assert store[5:5].shape == (0, 57)
+    rows = np.array([3, 9, 9, 40])
+    columns = np.array([40, 9, 2, 3])
+    assert np.allclose(store[rows, columns], dense[rows, columns], rtol=1e-5, atol=1e-3)
+    with pytest.raises(IndexError):
+        store[0:10:2]
+
+def test_condensed_store_attaches_and_maps(store):
+    coords, store = store
+    dense = cdist(coords, coords)
+    attached = CondensedDistanceMatrix.attach(store.descriptor())
+    try:
+        assert np.array_equal(attached.data, store.data)
+    finally:
+        attached.close()
+    doubled = store.map(lambda block: block * 2)
+    try:
+        assert np.allclose(np.asarray(doubled), dense * 2, rtol=1e-5, atol=1e-3)
+    finally:
+        doubled.release()
+
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_condensed_store_handles_tiny_inputs(n):
+    coords = np.random.default_rng(n).random((n, 3))
+    store = CondensedDistanceMatrix.from_coords(coords, 'shared_memory')
+    try:
+        assert np.allclose(np.asarray(store), squareform(pdist(coords)), atol=1e-5)
+    finally:
+        store.release()
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_condensed_store_fills_in_bands(threads):
+    coords = np.random.default_rng(1).uniform(-1000, 1000, (101, 3))
+    store = CondensedDistanceMatrix.create(101, 'shared_memory')
+    try:
+        store.fill_from_coords(coords, block_elements=300, threads=threads)
+        assert np.allclose(store.data, pdist(coords), rtol=1e-5, atol=1e-3)
+    finally:
+        store.release()
+
+def check_incremental(matrix, points):
+    keys = matrix.keys
+    assert len(matrix) == len(points)
+    assert set(keys) == set(points)
+    assert all(matrix.slot(key) == slot and matrix.key(slot) == key for slot, key in enumerate(keys))
+    coords = np.array([points[key] for key in keys]).reshape(-1, 3)
+    assert np.array_equal(matrix.coords, coords)
+    assert np.allclose(matrix.matrix, cdist(coords, coords))
+
+def test_incremental_matrix_tracks_adds_and_removes():
+    rng = np.random.default_rng(4)
+    matrix = IncrementalDistanceMatrix(capacity=2)
+    points = {}
+    for step in range(300):
+        if points and rng.random() < 0.4:
+            key = list(points)[int(rng.integers(len(points)))]
+            slot, last = matrix.remove(key)
+            del points[key]
+            assert last == len(points)
+            assert key not in matrix
+            if slot != last:
+                assert matrix.slot(matrix.key(slot)) == slot
+        else:
+            key = f'system {int(rng.integers(60))}'
+            points[key] = rng.uniform(-500, 500, 3)
+            slot = matrix.add(key, points[key])
+            assert matrix.key(slot) == key
+        check_incremental(matrix, points)
+    assert matrix.capacity >= len(matrix)
+
+def test_incremental_matrix_moves_existing_key():
+    matrix = IncrementalDistanceMatrix()
+    matrix.add('a', (0, 0, 0))
+    matrix.add('b', (3, 4, 0))
+    assert matrix.add('a', (0, 4, 0)) == 0
+    assert len(matrix) == 2
+    assert matrix.matrix[0, 1] == matrix.matrix[1, 0] == pytest.approx(3.0)
+
+def test_incremental_submatrix_follows_key_order():
+    points = {key: np.random.default_rng(key).random(3) * 100 for key in range(10)}
+    matrix = IncrementalDistanceMatrix(capacity=4)
+    for key, point in points.items():
+        matrix.add(key, point)
+    matrix.remove(2)
+    order = [7, 0, 9, 3]
+    coords = np.array([points[key] for key in order])
+    assert np.allclose(matrix.submatrix(order), cdist(coords, coords))
+    with pytest.raises(KeyError):
+        matrix.submatrix([2])
+    matrix.clear()
+    assert len(matrix) == 0 and matrix.matrix.shape == (0, 0)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from edmrn.optimizer import RouteOptimizer
+from edmrn.solver_registry import RouteProblem
+
+@pytest.fixture
+def optimizer():
+    optimizer = RouteOptimizer()
+    optimizer.use_route_cache = False
+    return optimizer
+
+def test_cluster_solver_keeps_fixed_end_when_last_cluster_enters_at_it(optimizer):
+    rng = np.random.default_rng(13)
+    n = int(rng.integers(120, 320))
+    coords = rng.random((n, 3)) * 1000
+    end = int(rng.integers(n))
+    optimizer.cluster_max_size = 40
+    tour = optimizer.solve(RouteProblem(coords, False, None, end), 3, 'cluster').tours['distance']
+    assert sorted(tour) == list(range(n))
+    assert tour[-1] == end
+
+@pytest.mark.parametrize('closed,start,end', [(True, None, None), (False, None, None), (False, 0, None),
+                                              (False, 0, -1), (False, None, -1), (False, 5, 5)])
+@pytest.mark.parametrize('objective', ['distance', 'jumps'])
+def test_cluster_solver_keeps_permutation_and_fixed_ends(optimizer, closed, start, end, objective):
+    n = 400
+    coords = np.random.default_rng(7).random((n, 3)) * 1000
+    end = end % n if end is not None else None
+    optimizer.cluster_max_size = 50
+    tours = optimizer.solve(RouteProblem(coords, closed, start, end, objective, 60.0), 5, 'cluster').tours
+    assert optimizer._performance_stats['solver_mode'] == 'cluster'
+    assert optimizer._performance_stats['cluster_count'] > 1
+    assert set(tours) == ({'distance', 'jumps'} if objective == 'jumps' else {'distance'})
+    for tour in tours.values():
+        assert sorted(tour) == list(range(n))
+        if closed:
+            assert tour[0] == 0
+        if start is not None:
+            assert tour[0] == start
+        if end is not None and end != start:
+            assert tour[-1] == end
@@ -0,0 +1,70 @@
+import json
+import threading
+import pandas as pd
+import pytest
+from edmrn.persistence import PersistenceWorker, csv_writer, json_writer
+
+@pytest.fixture
+def worker():
+    worker = PersistenceWorker()
+    yield worker
+    worker.shutdown(timeout=5)
+
+def blocking_writer(started, release):
+    def write(path):
+        started.set()
+        release.wait(5)
+        json_writer({'blocked': True})(path)
+    return write
+
+def test_persistence_worker_coalesces_pending_writes(worker, tmp_path):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    writes = []
+    def counted(data):
+        def write(path):
+            writes.append(data)
+            json_writer(data)(path)
+        return write
+    worker.submit(tmp_path / 'busy', {'busy.json': blocking_writer(started, release)})
+    assert started.wait(5)
+    worker.submit(tmp_path / 'backup', {'route.json': counted({'version': 1})}, on_complete=calls.append)
+    worker.submit(tmp_path / 'backup', {'route.json': counted({'version': 2}), 'route.csv': csv_writer(pd.DataFrame({'a': [1, 2]}))},
+                  on_complete=calls.append)
+    assert worker.is_pending(tmp_path / 'backup')
+    assert not worker.flush(tmp_path / 'backup', timeout=0.05)
+    release.set()
+    assert worker.flush(tmp_path / 'backup', timeout=5)
+    assert not worker.is_pending()
+    assert writes == [{'version': 2}]
+    assert calls == [str(tmp_path / 'backup')] * 2
+    assert json.loads((tmp_path / 'backup' / 'route.json').read_text()) == {'version': 2}
+    assert pd.read_csv(tmp_path / 'backup' / 'route.csv')['a'].tolist() == [1, 2]
+    assert json.loads((tmp_path / 'busy' / 'busy.json').read_text()) == {'blocked': True}
+
+def test_persistence_worker_flush_waits_for_every_folder(worker, tmp_path):
+    for index in range(5):
+        worker.submit(tmp_path / f'backup{index}', {'data.json': json_writer({'index': index})})
+    assert worker.flush(timeout=5)
+    for index in range(5):
+        assert json.loads((tmp_path / f'backup{index}' / 'data.json').read_text()) == {'index': index}
+
+def test_persistence_worker_reports_errors_without_partial_files(worker, tmp_path):
+    errors = []
+    completed = []
+    def failing(path):
+        with open(path, 'w') as f:
+            f.write('partial')
+        raise OSError('disk full')
+    worker.submit(tmp_path, {'broken.json': failing}, on_complete=completed.append,
+                  on_error=lambda folder, error: errors.append((folder, str(error))))
+    assert worker.flush(timeout=5)
+    assert errors == [(str(tmp_path), 'disk full')]
+    assert not completed
+    assert not list(tmp_path.iterdir())
+
+def test_persistence_worker_writes_synchronously_after_shutdown(tmp_path):
+    worker = PersistenceWorker()
+    worker.shutdown(timeout=5)
+    worker.submit(tmp_path, {'late.json': json_writer([1])})
+    assert json.loads((tmp_path / 'late.json').read_text()) == [1]
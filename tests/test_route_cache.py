@@ -0,0 +1,95 @@
+import os
+import time
+import numpy as np
+import pytest
+from edmrn.route_cache import ORPHAN_GRACE_SECONDS, RouteCache, entry_key
+
+SETTINGS = {'path_mode': 'open', 'objective': 'distance', 'solver_mode': 'auto'}
+
+def coordinates(n, seed=0):
+    return np.random.default_rng(seed).uniform(-1000, 1000, (n, 3))
+
+@pytest.fixture
+def cache(tmp_path):
+    return RouteCache(str(tmp_path / 'routes'))
+
+def test_route_cache_misses_then_hits(cache):
+    coords = coordinates(50)
+    tour = np.random.default_rng(1).permutation(50).tolist()
+    assert cache.lookup(coords, SETTINGS) is None
+    cache.store(coords, SETTINGS, {'distance': tour})
+    hit = cache.lookup(coords, SETTINGS)
+    assert hit['exact'] and hit['removed'] == 0 and len(hit['added']) == 0
+    assert hit['tours']['distance'].tolist() == tour
+    assert cache.lookup(coords, dict(SETTINGS, objective='jumps')) is None
+    assert cache.lookup(coordinates(50, 2), SETTINGS) is None
+
+def test_route_cache_near_hit_maps_tour_onto_new_coordinates(cache):
+    coords = coordinates(400)
+    tour = np.random.default_rng(1).permutation(400)
+    cache.store(coords, SETTINGS, {'distance': tour.tolist()})
+    kept = np.delete(np.arange(400), [5, 17, 300])
+    changed = np.vstack((coords[kept][::-1], coordinates(4, 9)))
+    hit = cache.lookup(changed, SETTINGS)
+    assert not hit['exact']
+    assert hit['removed'] == 3
+    assert hit['added'].tolist() == [397, 398, 399, 400]
+    mapped = hit['tours']['distance']
+    assert np.array_equal(mapped < 0, np.isin(tour, [5, 17, 300]))
+    assert np.array_equal(changed[mapped[mapped >= 0]], coords[tour[~np.isin(tour, [5, 17, 300])]])
+
+def test_route_cache_ignores_routes_with_too_many_changes(cache):
+    coords = coordinates(400)
+    cache.store(coords, SETTINGS, {'distance': list(range(400))})
+    assert cache.lookup(np.vstack((coords[:300], coordinates(100, 3))), SETTINGS) is None
+
+def test_route_cache_evicts_least_recently_used(tmp_path):
+    cache = RouteCache(str(tmp_path), max_entries=2)
+    routes = [coordinates(20, seed) for seed in range(3)]
+    cache.store(routes[0], SETTINGS, {'distance': list(range(20))})
+    time.sleep(0.01)
+    cache.store(routes[1], SETTINGS, {'distance': list(range(20))})
+    time.sleep(0.01)
+    assert cache.lookup(routes[0], SETTINGS)['exact']
+    time.sleep(0.01)
+    cache.store(routes[2], SETTINGS, {'distance': list(range(20))})
+    assert cache.lookup(routes[1], SETTINGS) is None
+    assert cache.lookup(routes[0], SETTINGS) is not None
+    assert cache.lookup(routes[2], SETTINGS) is not None
+    assert len(list(tmp_path.glob('*.npz'))) == len(list(tmp_path.glob('*.json'))) == 2
+
+def test_route_cache_evicts_by_size(tmp_path):
+    cache = RouteCache(str(tmp_path), max_bytes=1)
+    coords = coordinates(20)
+    cache.store(coords, SETTINGS, {'distance': list(range(20))})
+    assert cache.lookup(coords, SETTINGS) is None
+    assert not list(tmp_path.glob('*.npz'))
+
+def test_route_cache_writers_share_a_folder(tmp_path):
+    first = RouteCache(str(tmp_path))
+    second = RouteCache(str(tmp_path))
+    routes = [coordinates(30, seed) for seed in range(4)]
+    for index, coords in enumerate(routes):
+        (first if index % 2 else second).store(coords, SETTINGS, {'distance': list(range(30))})
+    for coords in routes:
+        assert first.lookup(coords, SETTINGS)['exact']
+
+def test_route_cache_drops_orphans_and_unreadable_entries(cache):
+    coords = coordinates(20)
+    cache.store(coords, SETTINGS, {'distance': list(range(20))})
+    key = entry_key(coords, SETTINGS)
+    orphan = cache.folder / 'orphan.npz'
+    stale = cache.folder / '.orphan.123.tmp'
+    fresh = cache.folder / 'fresh.npz'
+    for path in (orphan, stale, fresh):
+        path.write_bytes(b'x')
+    old = time.time() - ORPHAN_GRACE_SECONDS - 1
+    os.utime(orphan, (old, old))
+    os.utime(stale, (old, old))
+    cache.store(coordinates(20, 1), SETTINGS, {'distance': list(range(20))})
+    assert not orphan.exists() and not stale.exists() and fresh.exists()
+    (cache.folder / f"{key}.npz").write_bytes(b'broken')
+    assert cache.lookup(coords, SETTINGS) is None
+    assert not (cache.folder / f"{key}.json").exists()
+    cache.clear()
+    assert not list(cache.folder.iterdir())
@@ -0,0 +1,90 @@
+import itertools
+import numpy as np
+import pytest
+from scipy.spatial.distance import cdist
+from edmrn.tsp_solvers import (branch_and_bound_path, build_candidate_graph, held_karp_path, matrix_tour_length, solve_tsp_candidate,
+                               solve_tsp_exact, tour_length)
+
+VARIANTS = [
+    (True, None, None),
+    (False, None, None),
+    (False, 0, None),
+    (False, 0, -1),
+    (False, None, -2),
+]
+
+def distance_matrix(n, seed):
+    coords = np.random.default_rng(seed).random((n, 3)) * 100
+    return cdist(coords, coords)
+
+def brute_force(matrix, closed, start, end):
+    n = len(matrix)
+    best = np.inf
+    for tour in itertools.permutations(range(n)):
+        if closed and tour[0] != 0:
+            continue
+        if start is not None and tour[0] != start:
+            continue
+        if end is not None and tour[-1] != end:
+            continue
+        best = min(best, matrix_tour_length(matrix, tour, closed))
+    return best
+
+def check_tour(tour, n, closed, start, end):
+    assert sorted(tour) == list(range(n))
+    if not closed and start is not None:
+        assert tour[0] == start
+    if not closed and end is not None:
+        assert tour[-1] == end
+
+@pytest.mark.parametrize('n', range(3, 9))
+@pytest.mark.parametrize('closed,start,end', VARIANTS)
+@pytest.mark.parametrize('seed', range(3))
+def test_solve_tsp_exact_matches_brute_force(n, closed, start, end, seed):
+    matrix = distance_matrix(n, seed)
+    end = end % n if end is not None else None
+    tour, optimal = solve_tsp_exact(matrix, closed, start, end)
+    assert optimal
+    check_tour(tour, n, closed, start, end)
+    assert matrix_tour_length(matrix, tour, closed) == pytest.approx(brute_force(matrix, closed, start, end))
+
+@pytest.mark.parametrize('solver', ['held_karp', 'branch_and_bound'])
+@pytest.mark.parametrize('n', range(3, 9))
+@pytest.mark.parametrize('closed,end', [(True, None), (False, None), (False, -1)])
+def test_exact_path_solvers_match_brute_force(solver, n, closed, end):
+    matrix = distance_matrix(n, n)
+    end = end % n if end is not None else None
+    stop = 0 if closed else end
+    if solver == 'held_karp':
+        tour = held_karp_path(matrix, 0, stop)
+    else:
+        tour, optimal = branch_and_bound_path(matrix, 0, stop)
+        assert optimal
+    check_tour(tour, n, closed, 0, end)
+    assert matrix_tour_length(matrix, tour, closed) == pytest.approx(brute_force(matrix, closed, 0, end))
+
+@pytest.mark.parametrize('n', [3, 4, 9, 60, 500])
+@pytest.mark.parametrize('closed,start,end', VARIANTS)
+def test_candidate_solver_keeps_permutation_and_fixed_ends(n, closed, start, end):
+    coords = np.random.default_rng(n).random((n, 3)) * 1000
+    end = end % n if end is not None else None
+    tour = solve_tsp_candidate(coords, k=6, time_limit=2, closed=closed, start_index=start, end_index=end)
+    check_tour(tour, n, closed, start, end)
+    if closed:
+        assert tour[0] == 0
+
+def test_candidate_solver_improves_initial_tour():
+    coords = np.random.default_rng(1).random((300, 3)) * 1000
+    initial = np.random.default_rng(2).permutation(300)
+    tour = solve_tsp_candidate(coords, time_limit=2, initial_tour=initial, closed=False, start_index=int(initial[0]))
+    check_tour(tour, 300, False, int(initial[0]), None)
+    assert tour_length(coords, tour, False) < tour_length(coords, initial, False)
+
+def test_candidate_graph_lists_nearest_neighbors():
+    coords = np.random.default_rng(3).random((80, 3)) * 100
+    neighbors = build_candidate_graph(coords, 5)
+    matrix = cdist(coords, coords)
+    np.fill_diagonal(matrix, np.inf)
+    assert neighbors.shape == (80, 5)
+    for node in range(80):
+        assert set(neighbors[node]) == set(np.argsort(matrix[node])[:5])